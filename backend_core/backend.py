@@ -1,12 +1,23 @@
 #backend.py
 import asyncio
+import os
 import random
+import sys
+import time
+from collections import OrderedDict
 from datetime import datetime
 from typing import Dict, List, Optional
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from mcp_servers.tool_metrics import collect_tool_metrics, render_prometheus
+from mcp_servers.spans import SpanRecorder, start_span, instrument_session, waterfall
+from mcp_servers.trace_store import TraceStore, parse_time
+from backend_core.trace_hub import TraceHub
+
 # ===== Import Real Agents (WITHOUT NIH & Research) =====
 try:
     from hospital_agents.tracking_agent import tracking_agent, redact_pii
@@ -17,13 +28,8 @@ try:
     from hospital_agents.waste_agent import waste_agent
     from agents import Runner
 
-    # Import MCPs for connection (WITHOUT NIH & Research)
-    from hospital_agents.tracking_agent import orchestrator_mcp as tracking_orchestrator, domain_mcp as tracking_domain
-    from hospital_agents.maternal_agent import orchestrator_mcp as maternal_orchestrator, domain_mcp as maternal_domain
-    from hospital_agents.mental_health_agent import orchestrator_mcp as mental_orchestrator, domain_mcp as mental_domain
-    from hospital_agents.pharmacy_agent import orchestrator_mcp as pharmacy_orchestrator, domain_mcp as pharmacy_domain
-    from hospital_agents.criminal_agent import orchestrator_mcp as criminal_orchestrator, domain_mcp as criminal_domain
-    from hospital_agents.waste_agent import orchestrator_mcp as waste_orchestrator, domain_mcp as waste_domain
+    # MCP servers are pooled: the agents above share one process per server
+    from mcp_servers.mcp_pool import MCP_POOL
 
     AGENTS_AVAILABLE = True
     print("✅ Real hospital_agents imported successfully!")
@@ -64,6 +70,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ===== Request Tracing =====
+# One trace per request: this process records the HTTP/agent/MCP-client spans,
+# each MCP subprocess records its tool spans, waterfall() joins them by trace id
+SPANS = SpanRecorder("backend_core")
+RECENT_TRACES: Dict[str, tuple] = OrderedDict()   # trace_id -> (start, end)
+MAX_RECENT_TRACES = 1000
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    with start_span(f"{request.method} {request.url.path}", "backend_core", SPANS,
+                    traceparent=request.headers.get("traceparent")) as span:
+        response = await call_next(request)
+        span.attrs["status_code"] = response.status_code
+    RECENT_TRACES[span.trace_id] = (span.start, time.time())
+    if len(RECENT_TRACES) > MAX_RECENT_TRACES:
+        RECENT_TRACES.popitem(last=False)
+    response.headers["traceparent"] = span.traceparent()
+    return response
+
 # ===== Data Models =====
 class ChatMessage(BaseModel):
     agent_id: str
@@ -72,8 +98,8 @@ class ChatMessage(BaseModel):
 
 # ===== In-Memory Storage =====
 chat_histories: Dict[str, List[Dict]] = {}
-agent_traces: Dict[str, List[Dict]] = {}
-active_websockets: Dict[str, WebSocket] = {}
+TRACE_STORE = TraceStore(capacity_per_agent=1000)
+TRACE_HUB = TraceHub()
 mcp_connected = False
 
 # ===== Agent Registry (WITHOUT NIH & Research) =====
@@ -118,42 +144,30 @@ AGENTS = {
 
 # ===== MCP Connection Function (WITHOUT NIH & Research) =====
 async def connect_all_mcps():
-    """Connect all MCP servers (orchestrator + domain)"""
+    """Connect every pooled MCP server once (orchestrator, domain, waste)"""
     global mcp_connected
 
     if not AGENTS_AVAILABLE:
         print("⚠️  Skipping MCP connection - hospital_agents not available")
         return
 
-    mcp_pairs = [
-        (tracking_orchestrator, tracking_domain, "Tracking"),
-        (maternal_orchestrator, maternal_domain, "Maternal"),
-        (mental_orchestrator, mental_domain, "Mental"),
-        (pharmacy_orchestrator, pharmacy_domain, "Pharmacy"),
-        (criminal_orchestrator, criminal_domain, "Criminal"),
-        (waste_orchestrator, waste_domain, "Waste"),
-    ]
-
-    for orch, dom, name in mcp_pairs:
-        try:
-            # ✅ Enter context manager
-            await orch.__aenter__()
-            if dom != orch:  # Only if different objects
-                await dom.__aenter__()
-
-            # Connect with longer timeout
-            await asyncio.wait_for(orch.connect(), timeout=60.0)
-            if dom != orch:
-                await asyncio.wait_for(dom.connect(), timeout=60.0)
-
-            print(f"✅ {name} Agent MCPs connected")
-        except asyncio.TimeoutError:
-            print(f"⚠️  {name} Agent MCP timeout (60s) - check MCP script")
-        except Exception as e:
-            print(f"⚠️  {name} Agent MCP failed: {e}")
+    # Every tool call carries the request's traceparent in _meta (lazy servers too, when they start)
+    MCP_POOL.on_ready.append(lambda replica, session: instrument_session(session, "backend_core", SPANS, replica))
+
+    # All eager servers start concurrently; each is ready after a tools/list round-trip
+    results = await MCP_POOL.connect_all(timeout=60.0)
+    for name, server in MCP_POOL.servers.items():
+        if name not in results:
+            print(f"💤 {name} connects on first use")
+        elif isinstance(results[name], asyncio.TimeoutError):
+            print(f"⚠️  {name} MCP timeout (60s) - check MCP script")
+        elif results[name] is not None:
+            print(f"⚠️  {name} MCP failed: {results[name]}")
+        else:
+            print(f"✅ {name} connected ({len(server.sessions())}/{len(server.replicas)} replicas)")
 
     mcp_connected = True
-    print("🎉 MCP connection complete!")
+    print(f"🎉 MCP connection complete in {MCP_POOL.startup_s:.2f}s")
 # async def connect_all_mcps():
 #     """Connect all MCP servers (orchestrator + domain)"""
 #     global mcp_connected
@@ -185,19 +199,22 @@ async def connect_all_mcps():
 # ===== Helper Functions =====
 def add_trace(agent_id: str, trace_type: str, data: Dict):
     """Add trace entry for agent"""
-    if agent_id not in agent_traces:
-        agent_traces[agent_id] = []
-
     trace_entry = {
+        "agent_id": agent_id,
+        "agent_name": AGENTS[agent_id]["name"] if agent_id in AGENTS else agent_id,
         "timestamp": datetime.now().isoformat(),
         "trace_type": trace_type,
         "data": data
     }
+    TRACE_STORE.add(agent_id, trace_entry)
+    TRACE_HUB.publish(trace_entry)
 
-    agent_traces[agent_id].append(trace_entry)
-
-    if len(agent_traces[agent_id]) > 100:
-        agent_traces[agent_id] = agent_traces[agent_id][-100:]
+def trace_window(since, until) -> tuple:
+    """since/until query parameters as epoch seconds; 422 if either isn't a time"""
+    try:
+        return parse_time(since, "since"), parse_time(until, "until")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
 def get_chat_history(agent_id: str, user_id: str) -> List[Dict]:
     """Get chat history for agent and user"""
@@ -237,6 +254,13 @@ async def root():
         "real_agents": AGENTS_AVAILABLE
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Per-tool latency histograms from every connected MCP server (Prometheus text)"""
+    if not AGENTS_AVAILABLE:
+        return render_prometheus([])
+    return render_prometheus(await collect_tool_metrics(MCP_POOL.sessions())) + MCP_POOL.render_prometheus()
+
 @app.get("/api/hospital_agents")
 async def get_agents():
     """Get all available hospital_agents"""
@@ -254,7 +278,7 @@ async def get_agents():
 async def get_stats():
     """Get dashboard statistics"""
     total_messages = sum(len(history) for history in chat_histories.values())
-    total_traces = sum(len(traces) for traces in agent_traces.values())
+    total_traces = TRACE_STORE.count()
 
     return {
         "total_cases": 1247,
@@ -294,7 +318,8 @@ async def chat_with_agent(message: ChatMessage):
         })
 
         # Run agent (REAL AGENT NOW!)
-        result = await Runner.run(agent, message.message)
+        with start_span("agent.run", "backend_core", SPANS, agent=message.agent_id) as span:
+            result = await Runner.run(agent, message.message)
         agent_response = result.final_output if hasattr(result, "final_output") else str(result)
 
         # Apply privacy filter for sensitive hospital_agents
@@ -304,7 +329,8 @@ async def chat_with_agent(message: ChatMessage):
         # Add trace - processing completed
         add_trace(message.agent_id, "processing_completed", {
             "response_length": len(agent_response),
-            "status": "success"
+            "status": "success",
+            "trace_id": span.trace_id
         })
 
         # Add agent response to history
@@ -314,6 +340,7 @@ async def chat_with_agent(message: ChatMessage):
             "status": "success",
             "agent_id": message.agent_id,
             "response": agent_response,
+            "trace_id": span.trace_id,
             "timestamp": datetime.now().isoformat()
         }
 
@@ -348,36 +375,53 @@ async def get_chat_history_endpoint(agent_id: str, user_id: str = "user_001"):
     }
 
 @app.get("/api/traces/{agent_id}")
-async def get_agent_traces(agent_id: str, limit: int = 50):
-    """Get traces for specific agent"""
+async def get_agent_traces(agent_id: str, limit: int = 50, since: Optional[str] = None,
+                           until: Optional[str] = None, cursor: Optional[int] = None):
+    """Get traces for specific agent (oldest first; pass next_cursor to page back)"""
     if agent_id not in AGENTS:
         raise HTTPException(status_code=404, detail="Agent not found")
 
-    traces = agent_traces.get(agent_id, [])
+    since, until = trace_window(since, until)
+    page = TRACE_STORE.query(agent_id, since=since, until=until, cursor=cursor, limit=limit, oldest_first=True)
     return {
         "agent_id": agent_id,
         "agent_name": AGENTS[agent_id]["name"],
-        "total_traces": len(traces),
-        "traces": traces[-limit:]
+        "total_traces": TRACE_STORE.count(agent_id),
+        "traces": page["traces"],
+        "next_cursor": page["next_cursor"]
     }
 
 @app.get("/api/traces")
-async def get_all_traces(limit: int = 100):
-    """Get all traces from all hospital_agents"""
-    all_traces = []
-
-    for agent_id, traces in agent_traces.items():
-        for trace in traces[-limit:]:
-            all_traces.append({
-                "agent_id": agent_id,
-                "agent_name": AGENTS[agent_id]["name"],
-                **trace
-            })
-
-    all_traces.sort(key=lambda x: x["timestamp"], reverse=True)
+async def get_all_traces(limit: int = 100, since: Optional[str] = None,
+                         until: Optional[str] = None, cursor: Optional[int] = None):
+    """Get all traces from all hospital_agents, newest first (merged across agents)"""
+    since, until = trace_window(since, until)
+    page = TRACE_STORE.query(since=since, until=until, cursor=cursor, limit=limit)
+    return {
+        "total_traces": len(page["traces"]),
+        "traces": page["traces"],
+        "next_cursor": page["next_cursor"]
+    }
+
+@app.get("/api/traces/waterfall/{trace_id}")
+async def get_trace_waterfall(trace_id: str, since: Optional[float] = None, until: Optional[float] = None):
+    """
+    Every span of one request across the backend and the MCP subprocesses,
+    ordered by start (MCP processes flush their span logs about once a second)
+    """
+    window = RECENT_TRACES.get(trace_id)
+    if window is None and since is None:
+        raise HTTPException(status_code=404, detail="Unknown trace id, pass since/until")
+    since = since if since is not None else window[0]
+    until = until if until is not None else (window[1] if window else time.time())
+
+    SPANS.flush()
+    spans = await asyncio.to_thread(waterfall, trace_id, since, until)
     return {
-        "total_traces": len(all_traces),
-        "traces": all_traces[:limit]
+        "trace_id": trace_id,
+        "total_ms": round((max(s["end"] for s in spans) - spans[0]["start"]) * 1000, 3) if spans else 0,
+        "services": sorted({s["service"] for s in spans}),
+        "spans": spans
     }
 
 @app.delete("/api/chat/history/{agent_id}")
@@ -401,8 +445,8 @@ async def clear_agent_traces(agent_id: str):
     if agent_id not in AGENTS:
         raise HTTPException(status_code=404, detail="Agent not found")
 
-    if agent_id in agent_traces:
-        del agent_traces[agent_id]
+    TRACE_STORE.clear(agent_id)
+    TRACE_HUB.forget(agent_id)
 
     return {
         "status": "success",
@@ -410,41 +454,28 @@ async def clear_agent_traces(agent_id: str):
     }
 
 @app.websocket("/ws/traces")
-async def websocket_traces(websocket: WebSocket):
-    """WebSocket endpoint for real-time trace updates"""
+async def websocket_traces(websocket: WebSocket, since: Optional[int] = None):
+    """WebSocket endpoint for real-time trace updates (pushed as add_trace runs)"""
     await websocket.accept()
-    client_id = id(websocket)
-    active_websockets[str(client_id)] = websocket
+    await TRACE_HUB.serve(websocket, since=since)
 
-    try:
-        while True:
-            await asyncio.sleep(2)
-
-            latest_traces = []
-            for agent_id, traces in agent_traces.items():
-                if traces:
-                    latest_trace = traces[-1]
-                    latest_traces.append({
-                        "agent_id": agent_id,
-                        "agent_name": AGENTS[agent_id]["name"],
-                        **latest_trace
-                    })
-
-            await websocket.send_json({
-                "type": "trace_update",
-                "traces": latest_traces
-            })
-
-    except WebSocketDisconnect:
-        del active_websockets[str(client_id)]
+@app.get("/api/traces/stream/stats")
+async def trace_stream_stats():
+    """Subscribers, lag and skip/disconnect counters of the /ws/traces hub"""
+    return TRACE_HUB.summary()
+
+@app.get("/api/mcp/pool")
+async def mcp_pool_stats():
+    """Replicas, in-flight and call/error counters of the shared MCP servers"""
+    return MCP_POOL.summary() if AGENTS_AVAILABLE else {}
 
 @app.get("/api/notifications")
 async def get_notifications():
     """Get system notifications"""
     notifications = []
 
-    for agent_id, traces in agent_traces.items():
-        recent_traces = traces[-5:]
+    for agent_id in TRACE_STORE.agents():
+        recent_traces = TRACE_STORE.latest(agent_id, 5)
 
         for trace in recent_traces:
             if trace["trace_type"] == "error":
@@ -2,15 +2,18 @@
 import asyncio
 import json
 import os
+import sys
 import re
 import smtplib
 from datetime import datetime, timedelta
 from email.message import EmailMessage
 from openai import AsyncOpenAI
 from agents import Agent, Runner, OpenAIChatCompletionsModel
-from agents.mcp import MCPServerStdio
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, BASE_DIR)
+from mcp_servers.audit_writer import get_audit_writer
+from mcp_servers.mcp_pool import orchestrator_server, domain_server
 
 import random
 
@@ -64,8 +67,8 @@ def send_email_notification(receiver_email, subject, body):
 
 
 # ===== AUDIT LOGS =====
-AUDIT_LOG_FILE = "criminal_audit.json"
-audit_logs = []
+AUDIT_LOG_FILE = "criminal_audit.ndjson"
+AUDIT = get_audit_writer(AUDIT_LOG_FILE)
 
 
 def log_decision(agent_name, action, reasoning, data=None, consent_token=None):
@@ -78,9 +81,8 @@ def log_decision(agent_name, action, reasoning, data=None, consent_token=None):
         "data": data or {},
         "consent_token": consent_token or "N/A"
     }
-    audit_logs.append(entry)
-    with open(AUDIT_LOG_FILE, "w") as f:
-        json.dump(audit_logs, f, indent=2)
+    # Hash-chained and written by the background audit thread
+    AUDIT.write(entry)
     print(f"📝 [AUDIT] {agent_name} → {action}")
 
 
@@ -101,23 +103,9 @@ def redact_pii(text):
 
 
 # ===== MCP SERVERS =====
-orchestrator_mcp = MCPServerStdio(
-    params={
-        "command": "python",
-        "args": [os.path.join(BASE_DIR, "mcp_servers/orchestrator_mcp/agent_orchestrator_mcp.py")]
-    },
-    cache_tools_list=True,
-    name="OrchestratorMCP"
-)
+orchestrator_mcp = orchestrator_server()
 
-domain_mcp = MCPServerStdio(
-    params={
-        "command": "python",
-        "args": [os.path.join(BASE_DIR, "mcp_servers/core_agents_mcp/agents_mcp.py")]
-    },
-    cache_tools_list=True,
-    name="DomainMCP"
-)
+domain_mcp = domain_server()
 
 # ===== CRIMINAL CASE AGENT =====
 criminal_agent = Agent(
@@ -334,7 +322,8 @@ async def run_demo():
         print("\n📊 DEMO SUMMARY")
         print("-" * 70)
         print("✅ Total tests: 6")
-        print(f"📝 Audit logs: {len(audit_logs)}")
+        AUDIT.flush()
+        print(f"📝 Audit logs: {AUDIT.stats['written']}")
         print(f"💾 Logs saved: {AUDIT_LOG_FILE}")
         print("\n🎯 Features Tested:")
         print("   ✅ Case creation with auto follow-up scheduling")
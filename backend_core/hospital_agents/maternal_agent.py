@@ -1,12 +1,14 @@
 import asyncio
 import json
 import os
+import sys
 from datetime import datetime
 from openai import AsyncOpenAI
 from agents import Agent, Runner, OpenAIChatCompletionsModel
-from agents.mcp import MCPServerStdio
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, BASE_DIR)
+from mcp_servers.mcp_pool import orchestrator_server, domain_server
 
 from pymongo import MongoClient
 import matplotlib.pyplot as plt
@@ -40,17 +42,9 @@ gemini_model = OpenAIChatCompletionsModel(
 )
 
 # ===== MCP SERVERS =====
-orchestrator_mcp = MCPServerStdio(
-    params={"command": "python", "args": [os.path.join(BASE_DIR, "mcp_servers/orchestrator_mcp/agent_orchestrator_mcp.py")]},
-    cache_tools_list=True,
-    name="OrchestratorMCP"
-)
+orchestrator_mcp = orchestrator_server()
 
-domain_mcp = MCPServerStdio(
-    params={"command": "python", "args": [os.path.join(BASE_DIR, "mcp_servers/core_agents_mcp/agents_mcp.py")]},
-    cache_tools_list=True,
-    name="DomainMCP"
-)
+domain_mcp = domain_server()
 
 # ===== DATA ANALYSIS FUNCTIONS =====
 
@@ -2,15 +2,18 @@
 import asyncio
 import json
 import os
+import sys
 import re
 import smtplib
 from datetime import datetime, timedelta
 from email.message import EmailMessage
 from openai import AsyncOpenAI
 from agents import Agent, Runner, OpenAIChatCompletionsModel
-from agents.mcp import MCPServerStdio
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, BASE_DIR)
+from mcp_servers.audit_writer import get_audit_writer
+from mcp_servers.mcp_pool import orchestrator_server, domain_server
 
 
 # ===== LOAD ENV =====
@@ -62,8 +65,8 @@ def send_email_notification(receiver_email, subject, body):
         return False
 
 # ===== AUDIT LOGS =====
-AUDIT_LOG_FILE = "mental_audit.json"
-audit_logs = []
+AUDIT_LOG_FILE = "mental_audit.ndjson"
+AUDIT = get_audit_writer(AUDIT_LOG_FILE)
 
 def log_decision(agent_name, action, reasoning, data=None):
     """🧠 Audit logging"""
@@ -74,9 +77,8 @@ def log_decision(agent_name, action, reasoning, data=None):
         "reasoning": reasoning,
         "data": data or {}
     }
-    audit_logs.append(entry)
-    with open(AUDIT_LOG_FILE, "w") as f:
-        json.dump(audit_logs, f, indent=2)
+    # Hash-chained and written by the background audit thread
+    AUDIT.write(entry)
     print(f"📝 [AUDIT] {agent_name} → {action}")
 
 # ===== PRIVACY FILTER =====
@@ -140,24 +142,10 @@ def register_mental_case(patient_id, name, age, issue_type, email, phone, cnic=N
 # ===== MCP SERVERS (2 servers) =====
 
 # 1. Orchestrator MCP (for handoffs)
-orchestrator_mcp = MCPServerStdio(
-    params={
-        "command": "python",
-        "args": [os.path.join(BASE_DIR, "mcp_servers/orchestrator_mcp/agent_orchestrator_mcp.py")]
-    },
-    cache_tools_list=True,
-    name="OrchestratorMCP"
-)
+orchestrator_mcp = orchestrator_server()
 
 # 2. Domain MCP (for actual work)
-domain_mcp = MCPServerStdio(
-    params={
-        "command": "python",
-        "args": [os.path.join(BASE_DIR, "mcp_servers/core_agents_mcp/agents_mcp.py")]
-    },
-    cache_tools_list=True,
-    name="DomainMCP"
-)
+domain_mcp = domain_server()
 
 # ===== MENTAL HEALTH AGENT WITH HANDOFF =====
 mental_agent = Agent(
@@ -2,13 +2,16 @@
 import asyncio
 import json
 import os
+import sys
 import re
 from datetime import datetime
 from openai import AsyncOpenAI
 from agents import Agent, Runner, OpenAIChatCompletionsModel
-from agents.mcp import MCPServerStdio
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, BASE_DIR)
+from mcp_servers.audit_writer import get_audit_writer
+from mcp_servers.mcp_pool import orchestrator_server, domain_server
 
 
 # ===== LOAD ENV =====
@@ -31,8 +34,8 @@ gemini_model = OpenAIChatCompletionsModel(
 )
 
 # ===== AUDIT & TRACE LOGS =====
-AUDIT_LOG_FILE = "audit_trace.json"
-audit_logs = []
+AUDIT_LOG_FILE = "audit_trace.ndjson"
+AUDIT = get_audit_writer(AUDIT_LOG_FILE)
 
 def log_decision(agent_name, action, reasoning, data=None, consent_token=None):
     """🧠 Reasoning Trace + 🕵️ Audit Control"""
@@ -44,11 +47,8 @@ def log_decision(agent_name, action, reasoning, data=None, consent_token=None):
         "data": data or {},
         "consent_token": consent_token or "N/A"
     }
-    audit_logs.append(entry)
-
-    # Save to file
-    with open(AUDIT_LOG_FILE, "w") as f:
-        json.dump(audit_logs, f, indent=2)
+    # Hash-chained and written by the background audit thread
+    AUDIT.write(entry)
 
     print(f"📝 [AUDIT] {agent_name} → {action}")
 
@@ -100,24 +100,10 @@ async def connect_mcp_with_fallback(mcp_server):
 # ===== MCP SERVERS (2 servers for inter-agent communication) =====
 
 # 1. Orchestrator MCP (for handoffs)
-orchestrator_mcp = MCPServerStdio(
-    params={
-        "command": "python",
-        "args": [os.path.join(BASE_DIR, "mcp_servers/orchestrator_mcp/agent_orchestrator_mcp.py")]
-    },
-    cache_tools_list=True,
-    name="OrchestratorMCP"
-)
+orchestrator_mcp = orchestrator_server()
 
 # 2. Domain MCP (for actual work)
-domain_mcp = MCPServerStdio(
-    params={
-        "command": "python",
-        "args": [os.path.join(BASE_DIR, "mcp_servers/core_agents_mcp/agents_mcp.py")]
-    },
-    cache_tools_list=True,
-    name="DomainMCP"
-)
+domain_mcp = domain_server()
 #
 # # ===== TRACKING AGENT WITH ENHANCED INSTRUCTIONS =====
 # tracking_agent = Agent(
@@ -151,7 +137,9 @@ tracking_agent = Agent(
         "STEP 1: CHECK INCOMING TASKS\n"
         "→ ALWAYS call check_my_tasks('tracking') at the START of every conversation\n"
         "→ Process any pending handoffs from other hospital_agents BEFORE handling new user requests\n"
-        "→ If tasks found: complete them FIRST, then respond to user\n\n"
+        "→ If tasks found: complete them FIRST, then respond to user\n"
+        "→ When waiting on a handoff (e.g. a maternal emergency), call wait_for_tasks('tracking', timeout_s=30)\n"
+        "  ONCE instead of calling check_my_tasks repeatedly - it returns as soon as a handoff arrives\n\n"
 
         "STEP 2: DETECT IF YOU NEED ANOTHER AGENT\n"
         "Handoff triggers (MUST use handoff_to_agent if detected):\n\n"
@@ -404,7 +392,8 @@ async def run_demo():
         )
 
         print("=" * 60)
-        print(f"\n📊 Total audit logs: {len(audit_logs)}")
+        AUDIT.flush()
+        print(f"\n📊 Total audit logs: {AUDIT.stats['written']}")
         print(f"💾 Logs saved to: {AUDIT_LOG_FILE}")
 
         await orchestrator_mcp.cleanup()
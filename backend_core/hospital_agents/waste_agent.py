@@ -1,6 +1,7 @@
 # waste_agent.py - Intelligent Hospital Waste Management Agent
 import asyncio
 import os
+import sys
 
 # ✅ SET TIMEOUT BEFORE ALL IMPORTS
 os.environ['MCP_CLIENT_TIMEOUT'] = '300'
@@ -8,9 +9,10 @@ os.environ['MCP_CLIENT_TIMEOUT'] = '300'
 from datetime import datetime
 from openai import AsyncOpenAI
 from agents import Agent, Runner, OpenAIChatCompletionsModel
-from agents.mcp import MCPServerStdio
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, BASE_DIR)
+from mcp_servers.mcp_pool import orchestrator_server, domain_server, waste_server
 
 from dotenv import load_dotenv
 import json
@@ -90,32 +92,14 @@ gemini_model = OpenAIChatCompletionsModel(
 )
 
 #===== MCP SERVERS =====
-waste_mcp = MCPServerStdio(
-    params={"command": "python", "args": ["../mcp_servers/waste_mcp/waste_mcp_tools.py"]},
-    cache_tools_list=True,
-    name="WasteMCP"
-)
+waste_mcp = waste_server()
 
 
 
 # ===== MCP SERVERS =====
-orchestrator_mcp = MCPServerStdio(
-    params={
-        "command": "python",
-        "args": [os.path.join(BASE_DIR, "mcp_servers/orchestrator_mcp/agent_orchestrator_mcp.py")]
-    },
-    cache_tools_list=True,
-    name="OrchestratorMCP"
-)
+orchestrator_mcp = orchestrator_server()
 
-domain_mcp = MCPServerStdio(
-    params={
-        "command": "python",
-        "args": ["/mcp_servers/core_agents_mcp/agents_mcp.py"]
-    },
-    cache_tools_list=True,
-    name="DomainMCP"
-)
+domain_mcp = domain_server()
 # ===== INTELLIGENT WASTE BROKER AGENT =====
 smart_waste_agent = Agent(
     name="SmartWasteBroker",
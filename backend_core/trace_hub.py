@@ -0,0 +1,127 @@
+# trace_hub.py - Push-based fan-out of agent traces to /ws/traces clients
+"""
+add_trace() publishes once: the message is serialized a single time into a
+fixed ring of recent messages and every subscriber is woken. Each websocket
+has its own cursor (last seq sent) and drains the ring at its own pace:
+
+    - lagging more than max_lag messages -> skipped ahead, told via trace_gap
+    - a single send stuck longer than send_timeout_s -> disconnected
+
+so one slow dashboard never holds up the others or the publisher.
+"""
+
+import asyncio
+import json
+from datetime import datetime
+from typing import Dict, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+
+class _Subscriber:
+    __slots__ = ("cursor", "wake", "sent", "skipped")
+
+    def __init__(self, cursor: int):
+        self.cursor = cursor
+        self.wake = asyncio.Event()
+        self.sent = 0
+        self.skipped = 0
+
+
+class TraceHub:
+    def __init__(self, history: int = 1024, max_lag: int = 256, send_timeout_s: float = 5.0):
+        self.history = history
+        self.max_lag = min(max_lag, history)
+        self.send_timeout_s = send_timeout_s
+        self.seq = 0
+        self.latest: Dict[str, dict] = {}        # agent_id -> newest trace, for snapshots
+        self._ring = [None] * history            # seq % history -> serialized message
+        self._subscribers = set()
+        self.stats = {"published": 0, "skipped": 0, "disconnected_slow": 0}
+
+    # ===== PUBLISH =====
+    def publish(self, trace: dict) -> int:
+        """Fan out one trace ({agent_id, agent_name, ...}); call from the event loop"""
+        self.seq += 1
+        self.latest[trace["agent_id"]] = trace
+        self._ring[self.seq % self.history] = json.dumps({
+            "type": "trace_update",
+            "seq": self.seq,
+            "trace": trace,
+            # Latest per agent, same shape the polling endpoint used to send
+            "traces": list(self.latest.values())
+        }, default=str)
+        self.stats["published"] += 1
+        for sub in self._subscribers:
+            sub.wake.set()
+        return self.seq
+
+    def forget(self, agent_id: str):
+        self.latest.pop(agent_id, None)
+
+    def snapshot(self) -> dict:
+        return {"type": "trace_update", "seq": self.seq, "traces": list(self.latest.values())}
+
+    # ===== SUBSCRIBE =====
+    async def serve(self, websocket: WebSocket, since: Optional[int] = None):
+        """
+        Stream traces to an accepted websocket until it disconnects. A client
+        reconnecting with `since` (last seq it saw) gets what it missed.
+        """
+        resume = since is not None and 0 <= since <= self.seq
+        sub = _Subscriber(since if resume else self.seq)
+        self._subscribers.add(sub)
+        try:
+            if not resume:
+                await asyncio.wait_for(websocket.send_json(self.snapshot()), self.send_timeout_s)
+            sub.wake.set()
+            sender = asyncio.create_task(self._drain(websocket, sub))
+            receiver = asyncio.create_task(self._watch_disconnect(websocket))
+            await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            for task in (sender, receiver):
+                task.cancel()
+            # Collect both outcomes; a send racing the disconnect just fails
+            sent, _ = await asyncio.gather(sender, receiver, return_exceptions=True)
+            if isinstance(sent, asyncio.TimeoutError):
+                self.stats["disconnected_slow"] += 1
+                await websocket.close(code=1013)     # try again later
+        except (WebSocketDisconnect, RuntimeError, asyncio.TimeoutError):
+            pass
+        finally:
+            self._subscribers.discard(sub)
+
+    async def _drain(self, websocket: WebSocket, sub: _Subscriber):
+        while True:
+            await sub.wake.wait()
+            sub.wake.clear()
+            while sub.cursor < self.seq:
+                lag = self.seq - sub.cursor
+                if lag > self.max_lag:
+                    skipped = lag - self.max_lag
+                    sub.cursor += skipped
+                    sub.skipped += skipped
+                    self.stats["skipped"] += skipped
+                    await asyncio.wait_for(websocket.send_json({
+                        "type": "trace_gap", "skipped": skipped, "resume_seq": sub.cursor + 1,
+                        "timestamp": datetime.now().isoformat()
+                    }), self.send_timeout_s)
+                    continue
+                sub.cursor += 1
+                await asyncio.wait_for(websocket.send_text(self._ring[sub.cursor % self.history]),
+                                       self.send_timeout_s)
+                sub.sent += 1
+
+    @staticmethod
+    async def _watch_disconnect(websocket: WebSocket):
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    def summary(self) -> dict:
+        return {
+            "seq": self.seq,
+            "subscribers": len(self._subscribers),
+            "max_subscriber_lag": max((self.seq - s.cursor for s in self._subscribers), default=0),
+            **self.stats
+        }
@@ -53,15 +53,23 @@ app.add_middleware(
 
 
 # api_server.py - FIXED: MCP timeout increased + Report Generation MCP
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 import asyncio
+import os
+import sys
 import time
 from datetime import datetime
 import uvicorn
 from typing import List
 from contextlib import asynccontextmanager
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from mcp_servers.tool_metrics import collect_tool_metrics, render_prometheus
+from mcp_servers.trace_store import TraceStore, parse_time
+from backend_reporting.trace_broadcaster import TraceBroadcaster
+
 # ===== TIMEOUT WRAPPER =====
 async def run_with_timeout(coro, timeout=60, timeout_message="Operation timed out"):
     """
@@ -79,45 +87,47 @@ async def run_with_timeout(coro, timeout=60, timeout_message="Operation timed ou
         }
 
 # ===== MCP SERVERS WITH TIMEOUT =====
-from agents.mcp import MCPServerStdio
+from mcp_servers.mcp_pool import MCP_POOL, PooledMCPServer
 
 # Monkey-patch the timeout before creating MCP servers
 import os
 os.environ['MCP_TIMEOUT'] = '30'  # 30 seconds
 
-agents_mcp = MCPServerStdio(
+agents_mcp = MCP_POOL.add(PooledMCPServer(
+    "CoreAgentsMCP",
     params={"command": "python", "args": ["agents_mcp.py"]},
-    cache_tools_list=True,
-    name="CoreAgentsMCP"
-)
+    cache_tools_list=True
+))
 
-nih_mcp = MCPServerStdio(
+nih_mcp = MCP_POOL.add(PooledMCPServer(
+    "NIH_MCP",
     params={"command": "python", "args": ["nih_mcp.py"]},
     cache_tools_list=True,
-    name="NIH_MCP",
     client_session_timeout_seconds=120
-)
+))
 
-orchestrator_mcp = MCPServerStdio(
+orchestrator_mcp = MCP_POOL.add(PooledMCPServer(
+    "OrchestratorMCP",
     params={"command": "python", "args": ["agent_orchestrator_mcp.py"]},
-    cache_tools_list=True,
-    name="OrchestratorMCP"
-)
+    cache_tools_list=True
+))
 
-# NEW: Report Generation MCP for Word documents
-report_generation_mcp = MCPServerStdio(
+# NEW: Report Generation MCP for Word documents (only needed once a workflow reaches reporting)
+report_generation_mcp = MCP_POOL.add(PooledMCPServer(
+    "ReportGenerationMCP",
     params={"command": "python", "args": ["report_generation_mcp_tool.py"]},
+    lazy=True,
     cache_tools_list=True,
-    name="ReportGenerationMCP",
     client_session_timeout_seconds=360  # 3 minutes for document generation
-)
-# NEW: R&D MCP for university emails and WHO proposals
-rnd_mcp = MCPServerStdio(
+))
+# NEW: R&D MCP for university emails and WHO proposals (R&D step only)
+rnd_mcp = MCP_POOL.add(PooledMCPServer(
+    "RND_MCP",
     params={"command": "python", "args": ["rnd_mcp_tools.py"]},
+    lazy=True,
     cache_tools_list=True,
-    name="RND_MCP",
     client_session_timeout_seconds=180  # 3 minutes for email campaigns
-)
+))
 
 # ===== IMPORT AGENTS =====
 try:
@@ -137,37 +147,17 @@ except ImportError as e:
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("🔌 Connecting MCP servers...")
-    max_retries = 3
-    retry_delay = 2
-
-    async def connect_mcp(mcp, name):
-        for attempt in range(max_retries):
-            try:
-                print(f"🔄 Attempt {attempt + 1}/{max_retries} {name}...")
-                await mcp.connect()
-                print(f"✅ {name} connected")
-                return True
-            except Exception as e:
-                print(f"⚠️ {name} attempt {attempt + 1} failed: {e}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(retry_delay)
-        print(f"⚠️ {name} unavailable - continuing...")
-        return False
-
-    agents_connected = await connect_mcp(agents_mcp, "Core Agents MCP")
-    nih_connected = await connect_mcp(nih_mcp, "NIH MCP")
-    orchestrator_connected = await connect_mcp(orchestrator_mcp, "Orchestrator MCP")
-    report_connected = await connect_mcp(report_generation_mcp, "Report Generation MCP")
-    rnd_connected = await connect_mcp(rnd_mcp, "R&D MCP")
+
+    # Eager servers connect concurrently (ready = tools/list answered), 3 attempts each;
+    # report generation and R&D connect on their first tool call
+    results = await MCP_POOL.connect_all(timeout=60, retries=2, retry_delay=2)
+    for name, error in results.items():
+        print(f"✅ {name} connected" if error is None else f"⚠️ {name} unavailable ({error}) - continuing...")
+    print(f"⏱️ MCP startup: {MCP_POOL.startup_s:.2f}s")
 
     if AGENTS_AVAILABLE:
         print("🔗 Registering MCP sessions with hospital_agents...")
-        mcp_list = []
-        if agents_connected: mcp_list.append(agents_mcp)
-        if nih_connected: mcp_list.append(nih_mcp)
-        if orchestrator_connected: mcp_list.append(orchestrator_mcp)
-        if report_connected: mcp_list.append(report_generation_mcp)
-        if rnd_connected: mcp_list.append(rnd_mcp)
+        mcp_list = [server for name, server in MCP_POOL.servers.items() if results.get(name) is None]
 
         if len(mcp_list) > 0:
             hospital_central_agent.mcp_servers = mcp_list
@@ -180,11 +170,7 @@ async def lifespan(app: FastAPI):
 
     print("🔌 Disconnecting MCPs...")
     try:
-        await agents_mcp.cleanup()
-        await nih_mcp.cleanup()
-        await orchestrator_mcp.cleanup()
-        await report_generation_mcp.cleanup()
-        await rnd_mcp.cleanup()
+        await MCP_POOL.cleanup_all()
         print("✅ All MCPs disconnected")
     except Exception as e:
         print(f"⚠️ Cleanup error: {e}")
@@ -307,10 +293,10 @@ if __name__ == "__main__":
     )
 =======
 # WebSocket connections
-active_connections: List[WebSocket] = []
+TRACE_BROADCASTER = TraceBroadcaster()
 
-# Global trace storage
-traces = []
+# Global trace storage (fixed-size ring per agent)
+TRACE_STORE = TraceStore(capacity_per_agent=2000)
 reports = []
 
 
@@ -321,44 +307,58 @@ async def health_check():
         "status": "healthy",
         "agents_available": AGENTS_AVAILABLE,
         "mcp_status": {
-            "agents_mcp": "connected" if hasattr(agents_mcp, 'session') else "disconnected",
-            "nih_mcp": "connected" if hasattr(nih_mcp, 'session') else "disconnected",
-            "orchestrator_mcp": "connected" if hasattr(orchestrator_mcp, 'session') else "disconnected",
-            "report_generation_mcp": "connected" if hasattr(report_generation_mcp, 'session') else "disconnected"
+            key: "connected" if server.session is not None else "lazy" if server.lazy else "disconnected"
+            for key, server in [("agents_mcp", agents_mcp), ("nih_mcp", nih_mcp), ("orchestrator_mcp", orchestrator_mcp),
+                                ("report_generation_mcp", report_generation_mcp), ("rnd_mcp", rnd_mcp)]
         },
+        "mcp_startup_s": MCP_POOL.startup_s,
         "timestamp": datetime.now().isoformat()
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Per-tool latency histograms from the connected MCP servers (Prometheus text)"""
+    snapshots = await collect_tool_metrics({
+        "agents_mcp": agents_mcp,
+        "nih_mcp": nih_mcp,
+        "orchestrator_mcp": orchestrator_mcp,
+        "report_generation_mcp": report_generation_mcp,
+        "rnd_mcp": rnd_mcp
+    })
+    return render_prometheus(snapshots) + TRACE_BROADCASTER.render_prometheus() + MCP_POOL.render_prometheus()
+
+
 # ===== WEBSOCKET =====
 @app.websocket("/ws/traces")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    active_connections.append(websocket)
-    try:
-        while True:
-            await asyncio.sleep(1)
-    except WebSocketDisconnect:
-        active_connections.remove(websocket)
+    await TRACE_BROADCASTER.serve(websocket)
 
 
-async def broadcast_trace(trace_data: dict):
-    for connection in active_connections:
-        try:
-            await connection.send_json(trace_data)
-        except:
-            pass
+@app.get("/api/traces/broadcast/stats")
+async def trace_broadcast_stats():
+    """Connections, queue depths and drops of the /ws/traces broadcaster"""
+    return TRACE_BROADCASTER.metrics()
+
+
+def trace_window(since, until) -> tuple:
+    """since/until query parameters as epoch seconds; 422 if either isn't a time"""
+    try:
+        return parse_time(since, "since"), parse_time(until, "until")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
 
-def add_trace(agent_name: str, action: str, details: dict):
+def add_trace(agent_name: str, action: str, details: dict, timestamp: str = None):
     trace = {
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": timestamp or datetime.now().isoformat(),
         "agent": agent_name,
         "action": action,
         "details": details
     }
-    traces.append(trace)
-    asyncio.create_task(broadcast_trace(trace))
+    TRACE_STORE.add(agent_name, trace)
+    TRACE_BROADCASTER.publish(trace)
 
 
 # ===== STATS =====
@@ -395,8 +395,10 @@ async def get_agents():
 
 # ===== TRACES =====
 @app.get("/api/traces")
-async def get_traces(limit: int = 100):
-    return {"traces": traces[-limit:]}
+async def get_traces(limit: int = 100, since: str = None, until: str = None, cursor: int = None):
+    """Latest traces across agents, oldest first; pass next_cursor to page back"""
+    since, until = trace_window(since, until)
+    return TRACE_STORE.query(since=since, until=until, cursor=cursor, limit=limit, oldest_first=True)
 
 @app.post("/api/internal/broadcast-trace")
 async def internal_broadcast_trace(trace_data: dict):
@@ -412,10 +414,27 @@ async def internal_broadcast_trace(trace_data: dict):
     return {"status": "broadcasted"}
 
 
+@app.post("/api/internal/broadcast-traces")
+async def internal_broadcast_traces(payload: dict):
+    """
+    Batch variant for MCP trace shippers: {"traces": [{timestamp, agent, action, details}, ...]}
+    Keeps the sender's timestamps (what since/until filter on), which may be a few hundred ms old
+    """
+    batch = payload.get("traces") or []
+    for trace_data in batch:
+        add_trace(
+            agent_name=trace_data.get("agent", "system"),
+            action=trace_data.get("action", "unknown"),
+            details=trace_data.get("details", {}),
+            timestamp=trace_data.get("timestamp")
+        )
+    return {"status": "broadcasted", "count": len(batch)}
+
+
 @app.get("/api/traces/{agent_id}")
-async def get_agent_traces(agent_id: str, limit: int = 50):
-    agent_traces = [t for t in traces if t["agent"] == agent_id]
-    return {"traces": agent_traces[-limit:]}
+async def get_agent_traces(agent_id: str, limit: int = 50, since: str = None, until: str = None, cursor: int = None):
+    since, until = trace_window(since, until)
+    return TRACE_STORE.query(agent_id, since=since, until=until, cursor=cursor, limit=limit, oldest_first=True)
 @app.post("/api/workflow/rnd-emails-only")
 async def trigger_rnd_emails_only(
         research_area: str = "Maternal Health Crisis",
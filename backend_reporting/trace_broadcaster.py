@@ -0,0 +1,131 @@
+# trace_broadcaster.py - Concurrent /ws/traces fan-out for the reporting API
+"""
+publish() only appends to a pending list; bursts arriving within
+`coalesce_s` are flushed together by one loop callback (instead of a task
+per trace). A flush serializes each trace once and appends the text to
+every connection's bounded queue. Each connection has its own sender task,
+so sends run concurrently and a stalled tab only backs up its own queue:
+
+    - queue full        -> oldest queued trace dropped (counted per connection)
+    - send blocked past send_timeout_s -> connection closed
+"""
+
+import asyncio
+import json
+from collections import deque
+
+from fastapi import WebSocket
+
+
+class _Connection:
+    __slots__ = ("websocket", "queue", "wake", "sent", "dropped", "high_water")
+
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.queue = deque(maxlen=max_queue)
+        self.wake = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.high_water = 0
+
+
+class TraceBroadcaster:
+    def __init__(self, max_queue: int = 256, coalesce_s: float = 0.02, send_timeout_s: float = 5.0):
+        self.max_queue = max_queue
+        self.coalesce_s = coalesce_s
+        self.send_timeout_s = send_timeout_s
+        self._connections = set()
+        self._pending = []
+        self._flush_scheduled = False
+        self.stats = {"published": 0, "flushes": 0, "dropped": 0, "disconnected_slow": 0}
+
+    # ===== PUBLISH =====
+    def publish(self, trace: dict):
+        """Queue a trace for every connection; call from the event loop"""
+        self._pending.append(trace)
+        self.stats["published"] += 1
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_later(self.coalesce_s, self._flush)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        batch, self._pending = self._pending, []
+        if not batch or not self._connections:
+            return
+        texts = [json.dumps(trace, default=str) for trace in batch]
+        self.stats["flushes"] += 1
+        for conn in self._connections:
+            overflow = len(conn.queue) + len(texts) - self.max_queue
+            if overflow > 0:
+                conn.dropped += overflow
+                self.stats["dropped"] += overflow
+            conn.queue.extend(texts)            # deque(maxlen) evicts the oldest
+            conn.high_water = max(conn.high_water, len(conn.queue))
+            conn.wake.set()
+
+    # ===== CONNECTIONS =====
+    async def serve(self, websocket: WebSocket):
+        """Run an accepted websocket until the client goes away or stalls"""
+        conn = _Connection(websocket, self.max_queue)
+        self._connections.add(conn)
+        sender = asyncio.create_task(self._send_loop(conn))
+        receiver = asyncio.create_task(self._watch_disconnect(websocket))
+        try:
+            await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self._connections.discard(conn)
+            for task in (sender, receiver):
+                task.cancel()
+            sent, _ = await asyncio.gather(sender, receiver, return_exceptions=True)
+            if isinstance(sent, asyncio.TimeoutError):
+                self.stats["disconnected_slow"] += 1
+                try:
+                    await websocket.close(code=1013)
+                except RuntimeError:
+                    pass
+
+    async def _send_loop(self, conn: _Connection):
+        while True:
+            await conn.wake.wait()
+            conn.wake.clear()
+            while conn.queue:
+                await asyncio.wait_for(conn.websocket.send_text(conn.queue.popleft()), self.send_timeout_s)
+                conn.sent += 1
+
+    @staticmethod
+    async def _watch_disconnect(websocket: WebSocket):
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    # ===== METRICS =====
+    def metrics(self) -> dict:
+        depths = [len(conn.queue) for conn in self._connections]
+        return {
+            "connections": len(depths),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "queue_high_water": max((conn.high_water for conn in self._connections), default=0),
+            "pending": len(self._pending),
+            **self.stats
+        }
+
+    def render_prometheus(self) -> str:
+        m = self.metrics()
+        return "\n".join([
+            "# HELP trace_broadcast_connections Open /ws/traces connections",
+            "# TYPE trace_broadcast_connections gauge",
+            f"trace_broadcast_connections {m['connections']}",
+            "# HELP trace_broadcast_queue_depth Queued traces across connections",
+            "# TYPE trace_broadcast_queue_depth gauge",
+            f'trace_broadcast_queue_depth{{stat="total"}} {m["queue_depth_total"]}',
+            f'trace_broadcast_queue_depth{{stat="max"}} {m["queue_depth_max"]}',
+            "# HELP trace_broadcast_dropped_total Traces dropped from full connection queues",
+            "# TYPE trace_broadcast_dropped_total counter",
+            f"trace_broadcast_dropped_total {m['dropped']}",
+            "# HELP trace_broadcast_published_total Traces published",
+            "# TYPE trace_broadcast_published_total counter",
+            f"trace_broadcast_published_total {m['published']}",
+        ]) + "\n"
@@ -0,0 +1,256 @@
+# audit_writer.py - Tamper-evident audit log written off the request path
+"""
+Used by the hospital agents' log_decision. Stdlib only: the agents import it
+before load_dotenv(), so it must not pull in shared (whose package import
+builds Settings() and needs the app secrets) or loguru.
+"""
+
+import os
+import sys
+import json
+import queue
+import atexit
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+
+class AuditWriter:
+    """
+    Tamper-evident audit log written off the request path
+
+    Callers only enqueue; a background thread drains the bounded queue in
+    batches, appends one NDJSON line per event and fsyncs once per batch.
+    Every line carries `seq`, `prev_hash` and `hash` (sha256 over prev_hash
+    and the canonical event), so any edit, reorder or deletion breaks the
+    chain; the chain continues across rotated files and restarts.
+    """
+
+    GENESIS = "0" * 64
+
+    def __init__(
+        self,
+        path: str,
+        max_queue: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        max_bytes: int = 50 * 1024 * 1024,
+        put_timeout: float = 0.05
+    ):
+        """
+        Args:
+            path: Active audit file (rotated to <stem>.<first_seq>-<last_seq><suffix>)
+            max_queue: Events buffered before callers start waiting
+            batch_size: Max events per write + fsync
+            flush_interval: Max seconds an event waits before it is written
+            max_bytes: Rotate the active file past this size
+            put_timeout: Max seconds a caller blocks on a full queue before the event is dropped
+        """
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.put_timeout = put_timeout
+        self.stats = {"queued": 0, "written": 0, "dropped": 0, "batches": 0, "rotations": 0, "errors": 0}
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._dropped_unreported = 0
+        self._lock = threading.Lock()
+        self._seq, self._prev_hash = self._resume_chain()
+        self._file = None
+        self._first_seq = None
+        self._thread = threading.Thread(target=self._run, name=f"audit-{self.path.stem}", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def chain_hash(prev_hash: str, record: Dict[str, Any]) -> str:
+        body = json.dumps(record, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256((prev_hash + body).encode()).hexdigest()
+
+    def _resume_chain(self):
+        """Last (seq, hash) from the active file, else from the newest rotated file"""
+        candidates = [self.path] + list(reversed(self.rotated_files()))
+        for candidate in candidates:
+            last = self._last_line(candidate)
+            if last:
+                try:
+                    record = json.loads(last)
+                    return record["seq"], record["hash"]
+                except (ValueError, KeyError):
+                    continue
+        return 0, self.GENESIS
+
+    @staticmethod
+    def _last_line(path: Path) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                size = f.seek(0, os.SEEK_END)
+                f.seek(max(0, size - 65536))
+                lines = [line for line in f.read().splitlines() if line.strip()]
+        except OSError:
+            return None
+        return lines[-1] if lines else None
+
+    def rotated_files(self) -> list:
+        """Rotated files, oldest first"""
+        found = []
+        for candidate in self.path.parent.glob(f"{self.path.stem}.*{self.path.suffix}"):
+            try:
+                first = int(candidate.name[len(self.path.stem) + 1:].split("-")[0])
+            except ValueError:
+                continue
+            found.append((first, candidate))
+        return [candidate for _, candidate in sorted(found)]
+
+    # ===== PRODUCER SIDE =====
+    def write(self, event: Dict[str, Any]) -> bool:
+        """Enqueue an audit event; False if it had to be dropped (queue full)"""
+        try:
+            self._queue.put(event, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped"] += 1
+                self._dropped_unreported += 1
+            return False
+        with self._lock:
+            self.stats["queued"] += 1
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything enqueued so far is on disk"""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # ===== WRITER THREAD =====
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            waiters = [item for item in batch if isinstance(item, threading.Event)]
+            events = [item for item in batch if not isinstance(item, threading.Event)]
+            if events:
+                try:
+                    self._write_batch(events)
+                except OSError as e:
+                    self.stats["errors"] += 1
+                    print(f"Audit write failed ({self.path}): {e}", file=sys.stderr)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write_batch(self, events: list):
+        lines = []
+        seq, prev_hash = self._seq, self._prev_hash
+        with self._lock:
+            dropped, self._dropped_unreported = self._dropped_unreported, 0
+        for i, event in enumerate(events):
+            record = dict(event)
+            if dropped and i == 0:
+                # The gap is recorded inside the chain rather than hidden
+                record["dropped_before"] = dropped
+            record["seq"] = seq + 1
+            record["prev_hash"] = prev_hash
+            record["hash"] = self.chain_hash(prev_hash, record)
+            seq, prev_hash = record["seq"], record["hash"]
+            lines.append(json.dumps(record, default=str) + "\n")
+
+        with self._lock:
+            if self._file is None:
+                self._open()
+            if self._first_seq is None:
+                self._first_seq = self._seq + 1
+            self._file.write("".join(lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            # Only advance the chain once the batch is durable
+            self._seq, self._prev_hash = seq, prev_hash
+            self.stats["written"] += len(lines)
+            self.stats["batches"] += 1
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._first_seq = None
+        if self._file.tell():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._first_seq = json.loads(f.readline())["seq"]
+            except (ValueError, KeyError):
+                pass
+
+    def _rotate(self):
+        """Caller holds the lock. Rotated files are kept (retention is an ops decision)"""
+        self._file.close()
+        self._file = None
+        target = self.path.with_name(f"{self.path.stem}.{self._first_seq}-{self._seq}{self.path.suffix}")
+        os.replace(self.path, target)
+        self._first_seq = None
+        self.stats["rotations"] += 1
+
+    # ===== VERIFICATION =====
+    def verify(self) -> Dict[str, Any]:
+        """Re-walk the chain over rotated + active files; reports the first break"""
+        self.flush()
+        prev_hash, expected_seq, checked = self.GENESIS, None, 0
+        for candidate in self.rotated_files() + [self.path]:
+            try:
+                f = open(candidate, "r", encoding="utf-8")
+            except OSError:
+                continue
+            with f:
+                for line_no, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                        claimed = record.pop("hash")
+                    except (ValueError, KeyError):
+                        return {"ok": False, "checked": checked, "file": str(candidate), "line": line_no, "error": "unreadable record"}
+                    if expected_seq is None:
+                        # Oldest surviving file may start mid-chain if older ones were archived
+                        prev_hash, expected_seq = record.get("prev_hash"), record.get("seq")
+                    if record.get("seq") != expected_seq or record.get("prev_hash") != prev_hash \
+                            or self.chain_hash(prev_hash, record) != claimed:
+                        return {"ok": False, "checked": checked, "file": str(candidate), "line": line_no, "seq": record.get("seq")}
+                    prev_hash, expected_seq = claimed, expected_seq + 1
+                    checked += 1
+        return {"ok": True, "checked": checked, "last_seq": (expected_seq or 1) - 1, "head": prev_hash}
+
+
+_audit_writers: Dict[str, AuditWriter] = {}
+_audit_writers_lock = threading.Lock()
+
+
+def get_audit_writer(path: str, **kwargs) -> AuditWriter:
+    """
+    Shared AuditWriter per file (one writer thread + one hash chain per path),
+    drained at interpreter exit
+    """
+    key = os.path.abspath(path)
+    with _audit_writers_lock:
+        writer = _audit_writers.get(key)
+        if writer is None:
+            writer = _audit_writers[key] = AuditWriter(key, **kwargs)
+            atexit.register(writer.close)
+        return writer
@@ -1,10 +1,19 @@
 # agents_mcp.py - FIXED VERSION (Silent - No STDOUT pollution)
 import json, time, os, random, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from mcp_servers import startup_profile    # first: MCP_STARTUP_PROFILE times every import below
 from functools import wraps
 from datetime import datetime, timedelta
 from mcp.server.fastmcp import FastMCP
 from threading import Lock
 
+from mcp_servers.core_agents_mcp.fleet_index import AmbulanceIndex, FleetState, haversine_matrix
+from mcp_servers.core_agents_mcp.catchment import CatchmentGrid
+from mcp_servers.core_agents_mcp.telemetry import TelemetryBuffer
+from mcp_servers.trace_log import TraceLog, DEFAULT_TRACE_DIR
+from mcp_servers.tool_metrics import ToolMetrics
+from mcp_servers.spans import SpanRecorder, start_span, incoming_traceparent
+
 
 import math
 
@@ -20,18 +29,13 @@ def haversine(lat1, lon1, lat2, lon2):
     return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
 os.environ['MCP_CLIENT_TIMEOUT'] = '10'
-TRACE_FILE = "data/ local_traces.json"
-_lock = Lock()
+TRACE_WRITER = TraceLog(DEFAULT_TRACE_DIR, name="agents_mcp")
+TOOL_METRICS = ToolMetrics("agents_mcp")
+SPANS = SpanRecorder("agents_mcp", log=TRACE_WRITER)
 
 def append_trace(event: dict):
-    event.setdefault("timestamp", time.time())
-    with _lock:
-        try:
-            with open(TRACE_FILE, "a") as f:
-                f.write(json.dumps(event, indent=2) + ",\n")
-        except Exception:
-            # best-effort logging
-            pass
+    """Persist a trace event (buffered, batched fsync, indexed by time and tool)"""
+    TRACE_WRITER.append(event)
 
 # ===== REDIRECT DEBUG OUTPUT TO STDERR =====
 def debug_log(msg):
@@ -89,8 +93,55 @@ def get_plotting():
     return pd, plt, matplotlib, io, base64
 
 
+_eta_lock = Lock()
+
+
+def get_eta_engine():
+    """Lazy road-network ETA engine (None when no graph extract is on disk)"""
+    global ETA_ENGINE
+    if 'ETA_ENGINE' not in globals():
+        if not _eta_lock.acquire(blocking=False):
+            return None  # still being built: rank by straight-line meanwhile
+        try:
+            if 'ETA_ENGINE' not in globals():
+                ETA_ENGINE = _build_eta_engine()
+        finally:
+            _eta_lock.release()
+    return ETA_ENGINE
+
+
+def _build_eta_engine():
+    if not os.path.exists(ROAD_GRAPH_FILE):
+        return None
+    try:
+        from mcp_servers.core_agents_mcp.eta_engine import EtaEngine
+        engine = EtaEngine.from_file(ROAD_GRAPH_FILE)
+        if os.getenv("ETA_TRAFFIC_FROM_MONGO") == "1":
+            mongo_client, db = get_mongo()
+            if db is not None:
+                loaded = engine.set_traffic(db["traffic_data"].find({"hour": {"$exists": True}}))
+                debug_log(f"✅ Traffic factors loaded for {loaded} edge-hours")
+        debug_log(f"✅ ETA engine ready: {engine.summary()}")
+        return engine
+    except Exception as e:
+        debug_log(f"⚠️ ETA engine unavailable, using straight-line distance: {e}")
+        return None
+
+
+def get_assignment():
+    """Lazy numpy/scipy imports for batch dispatch"""
+    global np, linear_sum_assignment
+    if 'linear_sum_assignment' not in globals():
+        import numpy as np
+        from scipy.optimize import linear_sum_assignment
+    return np, linear_sum_assignment
+
+
 # ===== LOAD MOCK DATA =====
-DATA_FILE = os.path.join(os.path.dirname(__file__), "hospitals_lhr.json")
+DATA_FILE = os.getenv("HOSPITALS_DATA_FILE", os.path.join(os.path.dirname(__file__), "hospitals_lhr.json"))
+ROAD_GRAPH_FILE = os.getenv(
+    "ROAD_GRAPH_FILE", os.path.join(os.path.dirname(__file__), "lahore_roads.json")
+)
 try:
     with open(DATA_FILE, "r") as f:
         DATA = json.load(f)
@@ -102,6 +153,28 @@ except Exception as e:
     HOSPITALS = []
     RESCUE_ORGS = []
 
+# ===== FLEET SPATIAL INDEX + RESERVATIONS =====
+FLEET_INDEX = AmbulanceIndex()
+FLEET = FleetState(FLEET_INDEX, lease_s=30.0)
+FLEET.build([HOSPITALS, RESCUE_ORGS])
+debug_log(f"✅ Fleet index built: {FLEET_INDEX.stats()}")
+
+# Live GPS: last N fixes per unit, each accepted ping moves the unit in the index
+TELEMETRY = TelemetryBuffer(depth=int(os.getenv("TELEMETRY_DEPTH", "32")), on_position=FLEET.move)
+
+# ===== HOSPITAL CATCHMENT (degraded-mode lookup) =====
+CATCHMENT_FILE = os.getenv(
+    "HOSPITAL_CATCHMENT_FILE", os.path.join(os.path.dirname(__file__), "hospital_catchment.json")
+)
+HOSPITAL_CATCHMENT, catchment_source = CatchmentGrid.load_or_build(CATCHMENT_FILE, HOSPITALS)
+debug_log(f"✅ Hospital catchment: {catchment_source}")
+
+# Landmark precompute takes a few seconds on a city graph, so warm it off the
+# request path; dispatches rank by straight-line distance until it is ready
+if os.path.exists(ROAD_GRAPH_FILE):
+    import threading
+    threading.Thread(target=get_eta_engine, name="eta-warmup", daemon=True).start()
+
 # ===== TRACE LOG =====
 TRACE_LOG = []
 LAST_DISPATCH_LOG = []
@@ -115,6 +188,7 @@ def log_trace(action: str, details: dict):
         "details": details
     }
     TRACE_LOG.append(entry)
+    append_trace({"timestamp": time.time(), "action": action, "details": details})
     debug_log(f"[TRACE] {action}: {str(details)[:100]}")
 
 
@@ -123,50 +197,95 @@ def traced_tool(func):
 
     @wraps(func)
     def wrapper(*args, **kwargs):
-        call_id = f"{func.__name__}-{int(time.time() * 1000)}"
-        log_trace("tool_call_start", {
-            "tool": func.__name__,
-            "call_id": call_id
-        })
-        try:
-            result = func(*args, **kwargs)
-            log_trace("tool_call_end", {
-                "tool": func.__name__,
-                "call_id": call_id,
-                "status": "success"
-            })
-            return result
-        except Exception as e:
-            log_trace("tool_call_error", {
+        # Continue the caller's trace when the request carries a traceparent
+        parent = incoming_traceparent()
+        with start_span(func.__name__, "agents_mcp", SPANS if parent else None, traceparent=parent) as span:
+            call_id = f"{func.__name__}-{span.span_id}"
+            log_trace("tool_call_start", {
                 "tool": func.__name__,
                 "call_id": call_id,
-                "error": str(e)
+                "trace_id": span.trace_id
             })
-            raise
+            TOOL_METRICS.start(func.__name__)
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                TOOL_METRICS.finish(func.__name__, time.perf_counter() - started)
+                log_trace("tool_call_end", {
+                    "tool": func.__name__,
+                    "call_id": call_id,
+                    "status": "success"
+                })
+                return result
+            except Exception as e:
+                TOOL_METRICS.finish(func.__name__, time.perf_counter() - started, error=True)
+                log_trace("tool_call_error", {
+                    "tool": func.__name__,
+                    "call_id": call_id,
+                    "error": str(e)
+                })
+                raise
 
     return wrapper
 
 
 # ===== COGNITIVE LOGIC =====
+def ranked_ambulances(lat, lon, k=1):
+    """
+    k best available ambulances as (distance_km, unit, amb): by road ETA when
+    a road graph is loaded, otherwise by straight-line distance
+    """
+    engine = get_eta_engine()
+    if engine is None:
+        return FLEET_INDEX.nearest(lat, lon, k)
+    return [(dist, unit, amb) for _, dist, unit, amb in engine.rank(lat, lon, FLEET_INDEX.nearest, k)]
+
+
+def estimate_eta_min(unit, lat, lon, distance_km):
+    """Road ETA in minutes, or the old 30 km/h straight-line estimate"""
+    engine = get_eta_engine()
+    if engine is not None:
+        eta_s = engine.eta_seconds(unit["lat"], unit["lon"], lat, lon)
+        if eta_s != float("inf"):
+            return round(eta_s / 60, 1)
+    return round(distance_km / 0.5, 1)
+
+
+def find_nearest_ambulances(lat, lon, k=1):
+    """k best available ambulances (grid index lookup, ETA-ranked if possible)"""
+    return [
+        {
+            "service": unit["name"],
+            "ambulance_id": amb["id"],
+            "contact": unit["contact"],
+            "distance_km": round(dist, 2),
+            "unit_ref": unit,
+            "amb_ref": amb
+        }
+        for dist, unit, amb in ranked_ambulances(lat, lon, k)
+    ]
+
+
 def find_nearest_ambulance(lat, lon):
-    best = None
-    min_dist = 9999
-    for group in [HOSPITALS, RESCUE_ORGS]:
-        for unit in group:
-            for amb in unit["ambulances"]:
-                if amb["status"] == "available":
-                    dist = haversine(lat, lon, unit["lat"], unit["lon"])
-                    if dist < min_dist:
-                        min_dist = dist
-                        best = {
-                            "service": unit["name"],
-                            "ambulance_id": amb["id"],
-                            "contact": unit["contact"],
-                            "distance_km": round(dist, 2),
-                            "unit_ref": unit,
-                            "amb_ref": amb
-                        }
-    return best
+    matches = find_nearest_ambulances(lat, lon, k=1)
+    return matches[0] if matches else None
+
+
+def reserve_nearest_ambulance(lat, lon):
+    """Claim the nearest unit no concurrent dispatch has already taken"""
+    reserved = FLEET.reserve_nearest(lat, lon, nearest=ranked_ambulances)
+    if reserved is None:
+        return None
+    dist, unit, amb, token = reserved
+    return {
+        "service": unit["name"],
+        "ambulance_id": amb["id"],
+        "contact": unit["contact"],
+        "distance_km": round(dist, 2),
+        "unit_ref": unit,
+        "amb_ref": amb,
+        "lease_token": token
+    }
 
 
 # ===== TRACKING AGENT TOOLS =====
@@ -175,51 +294,186 @@ def find_nearest_ambulance(lat, lon):
 @traced_tool
 def dispatch_nearest_ambulance(lat: float, lon: float) -> dict:
     """Dispatch nearest available ambulance"""
-    amb_info = find_nearest_ambulance(lat, lon)
+    FLEET.expire_leases()
+    amb_info = reserve_nearest_ambulance(lat, lon)
     if not amb_info:
         return {"status": "failed", "message": "No ambulance available nearby"}
 
-    amb_info["amb_ref"]["status"] = "dispatched"
+    if not FLEET.confirm(amb_info["ambulance_id"], amb_info["lease_token"]):
+        return {"status": "failed", "message": "Ambulance reservation expired, please retry"}
     dispatch_record = {
         "service": amb_info["service"],
         "ambulance_id": amb_info["ambulance_id"],
         "contact": amb_info["contact"],
         "distance_km": amb_info["distance_km"],
-        "eta_min": round(amb_info["distance_km"] / 0.5, 1),
+        "eta_min": estimate_eta_min(amb_info["unit_ref"], lat, lon, amb_info["distance_km"]),
         "timestamp": time.time()
     }
     LAST_DISPATCH_LOG.append(dispatch_record)
     return dispatch_record
 
 
+@mcp.tool()
+@traced_tool
+def dispatch_batch(incidents: list) -> dict:
+    """
+    Dispatch ambulances to many incidents at once (mass-casualty mode)
+
+    Args:
+        incidents: List of {"lat": float, "lon": float, "incident_id": str (optional)}
+
+    Returns:
+        One dispatch per incident, chosen to minimise total travel distance
+    """
+    if not incidents:
+        return {"status": "failed", "message": "No incidents provided"}
+
+    np, linear_sum_assignment = get_assignment()
+    FLEET.expire_leases()
+
+    # Each incident's optimal unit is always among its len(incidents) nearest,
+    # so the candidate set comes from the spatial index instead of the full fleet
+    candidates = {}
+    for inc in incidents:
+        for match in find_nearest_ambulances(inc["lat"], inc["lon"], k=len(incidents)):
+            candidates.setdefault(match["ambulance_id"], match)
+    if not candidates:
+        return {"status": "failed", "message": "No ambulance available nearby"}
+
+    pool = list(candidates.values())
+    distances = haversine_matrix(
+        np,
+        [inc["lat"] for inc in incidents], [inc["lon"] for inc in incidents],
+        [m["unit_ref"]["lat"] for m in pool], [m["unit_ref"]["lon"] for m in pool]
+    )
+    engine = get_eta_engine()
+    if engine is not None:
+        # Optimise total road time; unreachable pairs get a large finite cost
+        costs = np.array([
+            [engine.eta_seconds(m["unit_ref"]["lat"], m["unit_ref"]["lon"], inc["lat"], inc["lon"])
+             for m in pool]
+            for inc in incidents
+        ])
+        costs[~np.isfinite(costs)] = 1e9
+    else:
+        costs = distances
+    rows, cols = linear_sum_assignment(costs)
+
+    now = time.time()
+    dispatches = []
+    assigned_rows = set()
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        match = pool[col]
+        distance_km = round(float(distances[row, col]), 2)
+        token = FLEET.reserve(match["ambulance_id"])
+        if token is None:
+            # Taken by a concurrent dispatch since the matrix was built
+            match = reserve_nearest_ambulance(incidents[row]["lat"], incidents[row]["lon"])
+            if match is None:
+                continue
+            distance_km, token = match["distance_km"], match["lease_token"]
+        if not FLEET.confirm(match["ambulance_id"], token):
+            continue
+        dispatch_record = {
+            "incident_id": incidents[row].get("incident_id", f"INC-{row}"),
+            "service": match["service"],
+            "ambulance_id": match["ambulance_id"],
+            "contact": match["contact"],
+            "distance_km": distance_km,
+            "eta_min": estimate_eta_min(match["unit_ref"], incidents[row]["lat"], incidents[row]["lon"], distance_km),
+            "timestamp": now
+        }
+        LAST_DISPATCH_LOG.append(dispatch_record)
+        dispatches.append(dispatch_record)
+        assigned_rows.add(row)
+
+    unassigned = [
+        incidents[i].get("incident_id", f"INC-{i}")
+        for i in range(len(incidents)) if i not in assigned_rows
+    ]
+    return {
+        "status": "success" if not unassigned else "partial",
+        "assigned": len(dispatches),
+        "unassigned": unassigned,
+        "total_distance_km": round(sum(d["distance_km"] for d in dispatches), 2),
+        "dispatches": dispatches
+    }
+
+
 @mcp.tool()
 @traced_tool
 def release_ambulance(ambulance_id: str) -> dict:
     """Release ambulance back to available pool"""
-    for group in [HOSPITALS, RESCUE_ORGS]:
-        for unit in group:
-            for amb in unit["ambulances"]:
-                if amb["id"] == ambulance_id:
-                    amb["status"] = "available"
-                    return {
-                        "status": "success",
-                        "ambulance_id": ambulance_id,
-                        "message": "Ambulance is now available"
-                    }
-    return {"status": "failed", "message": "Ambulance not found"}
+    if not FLEET.release(ambulance_id):
+        return {"status": "failed", "message": "Ambulance not found"}
+
+    return {
+        "status": "success",
+        "ambulance_id": ambulance_id,
+        "message": "Ambulance is now available"
+    }
+
+
+@mcp.tool()
+def ingest_telemetry(pings: list) -> dict:
+    """
+    Ingest a batch of ambulance GPS pings (not traced per call: high rate)
+
+    Args:
+        pings: List of {"ambulance_id": str, "lat": float, "lon": float, "ts": float (optional)}
+
+    Returns:
+        How many pings were accepted and why the rest were dropped
+    """
+    return {"status": "success", **TELEMETRY.ingest(pings)}
+
+
+@mcp.tool()
+@traced_tool
+def ambulance_track(ambulance_id: str, limit: int = 10) -> dict:
+    """Recent GPS positions of an ambulance, oldest first"""
+    entry = FLEET_INDEX.lookup(ambulance_id)
+    if entry is None:
+        return {"status": "failed", "message": "Ambulance not found"}
+    unit, amb = entry
+    return {
+        "status": "success",
+        "ambulance_id": ambulance_id,
+        "ambulance_status": amb["status"],
+        "service": unit["name"],
+        "positions": TELEMETRY.track(ambulance_id, limit)
+    }
 
 
 @mcp.tool()
 @traced_tool
 def nearest_hospital_fallback(lat: float, lon: float) -> dict:
     """Degraded mode - find nearest hospital"""
-    best = None
-    min_dist = 9999
-    for hosp in HOSPITALS:
-        dist = haversine(lat, lon, hosp["lat"], hosp["lon"])
-        if dist < min_dist:
-            min_dist = dist
-            best = hosp
+    if not HOSPITALS:
+        return {"status": "failed", "message": "No hospital data loaded"}
+
+    # O(1) catchment cell lookup, then exact distances over its short list
+    candidates = HOSPITAL_CATCHMENT.candidates(lat, lon) if HOSPITAL_CATCHMENT else None
+    pool = [HOSPITALS[idx] for idx in candidates] if candidates else HOSPITALS
+
+    best = min(pool, key=lambda hosp: haversine(lat, lon, hosp["lat"], hosp["lon"]))
+    min_dist = haversine(lat, lon, best["lat"], best["lon"])
+
+    engine = get_eta_engine()
+    if engine is not None:
+        best_eta = float("inf")
+        for hosp in pool:
+            eta_s = engine.eta_seconds(lat, lon, hosp["lat"], hosp["lon"], into_cell=False)
+            if eta_s < best_eta:
+                best_eta, best = eta_s, hosp
+        if best_eta != float("inf"):
+            return {
+                "hospital_name": best["name"],
+                "contact": best["contact"],
+                "distance_km": round(haversine(lat, lon, best["lat"], best["lon"]), 2),
+                "eta_min": round(best_eta / 60, 1)
+            }
+
     return {
         "hospital_name": best["name"],
         "contact": best["contact"],
@@ -1162,10 +1416,19 @@ def last_mental_case():
     return {"info": "Last recorded mental case trace (mock)"}
 
 
+@mcp.resource("metrics://tools")
+def tool_metrics():
+    """Per-tool latency histograms, error counts and in-flight calls"""
+    return json.dumps(TOOL_METRICS.snapshot())
+
+
 def debug_log(msg):
     print(msg, file=sys.stderr, flush=True)
 
 
+# Keep the dispatch/maternal/pharmacy server: its tools are merged into the
+# criminal server below, which is the one `__main__` actually runs
+dispatch_mcp = mcp
 mcp = FastMCP("Criminal Forensics Agent")
 debug_log("✅ Criminal MCP initialized")
 
@@ -1198,32 +1461,41 @@ def log_trace(action: str, details: dict):
         "details": details
     }
     TRACE_LOG.append(entry)
+    append_trace({"timestamp": time.time(), "action": action, "details": details})
     debug_log(f"[TRACE] {action}: {str(details)[:100]}")
 
 
 def traced_tool(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        call_id = f"{func.__name__}-{int(time.time() * 1000)}"
-        log_trace("tool_call_start", {
-            "tool": func.__name__,
-            "call_id": call_id
-        })
-        try:
-            result = func(*args, **kwargs)
-            log_trace("tool_call_end", {
+        # Continue the caller's trace when the request carries a traceparent
+        parent = incoming_traceparent()
+        with start_span(func.__name__, "agents_mcp", SPANS if parent else None, traceparent=parent) as span:
+            call_id = f"{func.__name__}-{span.span_id}"
+            log_trace("tool_call_start", {
                 "tool": func.__name__,
                 "call_id": call_id,
-                "status": "success"
+                "trace_id": span.trace_id
             })
-            return result
-        except Exception as e:
-            log_trace("tool_call_error", {
-                "tool": func.__name__,
-                "call_id": call_id,
-                "error": str(e)
-            })
-            raise
+            TOOL_METRICS.start(func.__name__)
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                TOOL_METRICS.finish(func.__name__, time.perf_counter() - started)
+                log_trace("tool_call_end", {
+                    "tool": func.__name__,
+                    "call_id": call_id,
+                    "status": "success"
+                })
+                return result
+            except Exception as e:
+                TOOL_METRICS.finish(func.__name__, time.perf_counter() - started, error=True)
+                log_trace("tool_call_error", {
+                    "tool": func.__name__,
+                    "call_id": call_id,
+                    "error": str(e)
+                })
+                raise
 
     return wrapper
 
@@ -1851,7 +2123,16 @@ def schedule_waste_pickup(hospital_id: str, company_id: str, pickup_time: str, w
         "driver_contact": "0300-" + str(random.randint(1000000, 9999999)),
         "scheduled_at": datetime.now().isoformat()
     }
+# ===== MERGE DISPATCH TOOLS INTO THE SERVED MCP =====
+# Criminal definitions win on name clashes, so what was already served is unchanged
+for _tool in dispatch_mcp._tool_manager.list_tools():
+    if mcp._tool_manager.get_tool(_tool.name) is None:
+        mcp.add_tool(_tool.fn, name=_tool.name, description=_tool.description)
+for _resource in dispatch_mcp._resource_manager.list_resources():
+    mcp._resource_manager.add_resource(_resource)
+
 # ===== RUN SERVER =====
 if __name__ == "__main__":
     debug_log("🚀 Starting agents_mcp.py...")
+    startup_profile.mark_ready("agents_mcp")
     mcp.run()
@@ -0,0 +1,148 @@
+# catchment.py - Precomputed hospital catchment grid for degraded-mode lookups
+"""
+Voronoi-style lookup table over a lat/lon grid covering the service area.
+
+Each cell stores every hospital that can be the nearest one for *some*
+point inside the cell (d(centre, h) <= d(centre, best) + cell diameter),
+plus the next few closest so road-ETA refinement has options. A query is
+a cell lookup followed by exact distances over that short list.
+
+The table is persisted as JSON with a fingerprint of the hospital list,
+so an MCP restart reuses it unless hospitals or grid settings changed.
+"""
+
+import hashlib
+import json
+import math
+import os
+
+from mcp_servers.core_agents_mcp.fleet_index import AmbulanceIndex, haversine
+
+MAX_CELLS = 40_000
+SCAN_LIMIT = 100    # below this many hospitals a plain scan beats the grid
+
+
+def fingerprint(hospitals: list, cell_deg: float, margin_deg: float, extra: int) -> str:
+    digest = hashlib.sha1()
+    digest.update(f"{cell_deg}|{margin_deg}|{extra}".encode())
+    for hosp in hospitals:
+        digest.update(f"|{hosp['name']}|{hosp['lat']:.6f}|{hosp['lon']:.6f}".encode())
+    return digest.hexdigest()
+
+
+class CatchmentGrid:
+    """Cell -> candidate hospital indices (into the hospital list it was built from)"""
+
+    def __init__(self, cell_deg, origin, rows, cols, cells, fingerprint):
+        self.cell_deg = cell_deg
+        self.origin = origin
+        self.rows = rows
+        self.cols = cols
+        self.cells = cells
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, hospitals: list, cell_deg: float = 0.005,
+              margin_deg: float = 0.1, extra: int = 2) -> "CatchmentGrid":
+        if not hospitals:
+            return None
+
+        lat0 = min(h["lat"] for h in hospitals) - margin_deg
+        lon0 = min(h["lon"] for h in hospitals) - margin_deg
+        lat1 = max(h["lat"] for h in hospitals) + margin_deg
+        lon1 = max(h["lon"] for h in hospitals) + margin_deg
+        requested = cell_deg
+        while math.ceil((lat1 - lat0) / cell_deg) * math.ceil((lon1 - lon0) / cell_deg) > MAX_CELLS:
+            cell_deg *= 1.5   # keep the table small for province-wide hospital lists
+        rows = math.ceil((lat1 - lat0) / cell_deg)
+        cols = math.ceil((lon1 - lon0) / cell_deg)
+
+        if len(hospitals) > SCAN_LIMIT:
+            # k-nearest queries through the fleet grid keep the build near
+            # O(cells) instead of O(cells x hospitals)
+            index = AmbulanceIndex(cell_deg=max(cell_deg * 4, 0.02))
+            index.build([[
+                {"lat": h["lat"], "lon": h["lon"], "ambulances": [{"id": idx, "status": "available"}]}
+                for idx, h in enumerate(hospitals)
+            ]])
+            nearest = index.nearest
+        else:
+            def nearest(lat, lon, k):
+                # Full ordering: one sort per cell answers every k
+                return sorted(
+                    (haversine(lat, lon, h["lat"], h["lon"]), idx, {"id": idx})
+                    for idx, h in enumerate(hospitals)
+                )
+
+        cells = []
+        k = extra + 1
+        for i in range(rows):
+            c_lat = lat0 + (i + 0.5) * cell_deg
+            # Cell diameter at this latitude bounds how far the nearest can move
+            diameter_km = haversine(c_lat - cell_deg / 2, lon0, c_lat + cell_deg / 2, lon0 + cell_deg)
+            for j in range(cols):
+                c_lon = lon0 + (j + 0.5) * cell_deg
+                while True:
+                    near = nearest(c_lat, c_lon, k)
+                    limit = near[0][0] + diameter_km
+                    must = [amb["id"] for d, _, amb in near if d <= limit]
+                    if len(near) < k or len(near) == len(hospitals) or (near[-1][0] > limit and len(near) - len(must) >= extra):
+                        break
+                    k *= 2
+                cells.append(must + [amb["id"] for _, _, amb in near[len(must):len(must) + extra]])
+                k = max(extra + 1, len(must) + extra)
+
+        return cls(cell_deg, (lat0, lon0), rows, cols, cells,
+                   fingerprint(hospitals, requested, margin_deg, extra))
+
+    # ===== PERSISTENCE =====
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "fingerprint": self.fingerprint,
+                "cell_deg": self.cell_deg,
+                "origin": list(self.origin),
+                "rows": self.rows,
+                "cols": self.cols,
+                "cells": self.cells
+            }, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, expected_fingerprint: str):
+        """Load a saved table, or None if missing/stale"""
+        try:
+            with open(path, "r") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if raw.get("fingerprint") != expected_fingerprint:
+            return None
+        return cls(raw["cell_deg"], tuple(raw["origin"]), raw["rows"], raw["cols"],
+                   raw["cells"], raw["fingerprint"])
+
+    @classmethod
+    def load_or_build(cls, path: str, hospitals: list, cell_deg: float = 0.005,
+                      margin_deg: float = 0.1, extra: int = 2):
+        """Reuse the table on disk when it matches the hospital list, else rebuild and save"""
+        if not hospitals:
+            return None, "empty"
+        grid = cls.load(path, fingerprint(hospitals, cell_deg, margin_deg, extra))
+        if grid is not None:
+            return grid, "loaded"
+        grid = cls.build(hospitals, cell_deg, margin_deg, extra)
+        try:
+            grid.save(path)
+        except OSError:
+            return grid, "built (not persisted)"
+        return grid, "built"
+
+    # ===== QUERIES =====
+    def candidates(self, lat: float, lon: float):
+        """Candidate hospital indices for a point, or None outside the service area"""
+        i = math.floor((lat - self.origin[0]) / self.cell_deg)
+        j = math.floor((lon - self.origin[1]) / self.cell_deg)
+        if not (0 <= i < self.rows and 0 <= j < self.cols):
+            return None
+        return self.cells[i * self.cols + j]
@@ -0,0 +1,296 @@
+# eta_engine.py - Offline road-network ETA engine for dispatch ranking
+"""
+Travel-time estimates over a local road-graph extract (no network calls).
+
+Graph file (JSON):
+    {
+      "nodes": [[node_id, lat, lon], ...],
+      "edges": [{"u": node_id, "v": node_id, "length_m": 420.0,
+                 "speed_kmh": 40, "oneway": false}, ...]
+    }
+
+Point-to-point queries run A* with ALT (landmark + triangle inequality)
+bounds precomputed from a handful of landmarks. Results are cached as an
+ETA matrix keyed by (origin node, destination grid cell, hour), so repeat
+queries from the same stations into the same neighbourhood are a dict hit.
+
+Optional time-of-day traffic factors (e.g. from the `traffic_data` Mongo
+collection) only ever slow edges down (factor >= 1), which keeps the
+free-flow landmark bounds admissible.
+"""
+
+import heapq
+import json
+import math
+import time
+from collections import OrderedDict
+
+from mcp_servers.core_agents_mcp.fleet_index import haversine, KM_PER_DEG_LAT
+
+# Speed used for the straight-line leg between a point and its snapped node
+ACCESS_SPEED_KMH = 15.0
+
+
+class RoadGraph:
+    """Directed road graph with compact integer node ids"""
+
+    def __init__(self):
+        self.ids = []        # idx -> external node id
+        self.lat = []
+        self.lon = []
+        self.adj = []        # idx -> [(idx, free-flow seconds)]
+        self.radj = []       # reverse adjacency for backward searches
+        self.max_speed_kmh = ACCESS_SPEED_KMH
+        self._grid = {}      # coarse cell -> [idx] for snapping
+        self._grid_deg = 0.01
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        with open(path, "r") as f:
+            raw = json.load(f)
+
+        graph = cls()
+        index = {}
+        for node_id, lat, lon in raw["nodes"]:
+            index[node_id] = len(graph.ids)
+            graph.ids.append(node_id)
+            graph.lat.append(float(lat))
+            graph.lon.append(float(lon))
+            graph.adj.append([])
+            graph.radj.append([])
+            cell = (math.floor(lat / graph._grid_deg), math.floor(lon / graph._grid_deg))
+            graph._grid.setdefault(cell, []).append(index[node_id])
+
+        for edge in raw["edges"]:
+            u, v = index[edge["u"]], index[edge["v"]]
+            speed = float(edge.get("speed_kmh", 30))
+            length_m = edge.get("length_m")
+            if length_m is None:
+                length_m = haversine(graph.lat[u], graph.lon[u], graph.lat[v], graph.lon[v]) * 1000
+            seconds = length_m / 1000 / speed * 3600
+            graph.max_speed_kmh = max(graph.max_speed_kmh, speed)
+            graph.adj[u].append((v, seconds))
+            graph.radj[v].append((u, seconds))
+            if not edge.get("oneway", False):
+                graph.adj[v].append((u, seconds))
+                graph.radj[u].append((v, seconds))
+        return graph
+
+    def __len__(self):
+        return len(self.ids)
+
+    def snap(self, lat: float, lon: float):
+        """Nearest node to a point -> (idx, distance_km), or (None, inf)"""
+        ci, cj = math.floor(lat / self._grid_deg), math.floor(lon / self._grid_deg)
+        cell_km = self._grid_deg * KM_PER_DEG_LAT * math.cos(math.radians(min(abs(lat) + 1, 89)))
+        best, best_km = None, math.inf
+        for r in range(0, 50):
+            if best is not None and (r - 1) * cell_km > best_km:
+                break   # every node in ring r is at least r - 1 whole cells away
+            for di in range(-r, r + 1):
+                for dj in range(-r, r + 1):
+                    if max(abs(di), abs(dj)) != r:
+                        continue
+                    for idx in self._grid.get((ci + di, cj + dj), ()):
+                        km = haversine(lat, lon, self.lat[idx], self.lon[idx])
+                        if km < best_km:
+                            best, best_km = idx, km
+        return best, best_km
+
+    def dijkstra(self, source: int, reverse: bool = False) -> list:
+        """Free-flow seconds from source to every node (to source if reverse)"""
+        adj = self.radj if reverse else self.adj
+        dist = [math.inf] * len(self.ids)
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for v, w in adj[u]:
+                nd = d + w
+                if nd < dist[v]:
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return dist
+
+
+class EtaEngine:
+    """ALT-accelerated ETAs with a bounded (origin, cell, hour) cache"""
+
+    def __init__(self, graph: RoadGraph, landmarks: int = 8,
+                 cell_deg: float = 0.005, cache_size: int = 200_000):
+        self.graph = graph
+        self.cell_deg = cell_deg
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._snap_cache = {}
+        self._traffic = {}          # (u, v) -> [24 hourly factors >= 1]
+        self.stats = {"queries": 0, "cache_hits": 0, "searches": 0}
+
+        started = time.perf_counter()
+        self._landmarks = self._pick_landmarks(landmarks)
+        self._from_lm = [graph.dijkstra(lm) for lm in self._landmarks]
+        self._to_lm = [graph.dijkstra(lm, reverse=True) for lm in self._landmarks]
+        self.precompute_s = round(time.perf_counter() - started, 3)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "EtaEngine":
+        return cls(RoadGraph.load(path), **kwargs)
+
+    # ===== PRECOMPUTE =====
+    def _pick_landmarks(self, count: int) -> list:
+        """Farthest-point landmarks (spread towards the edges of the network)"""
+        if not len(self.graph):
+            return []
+        landmarks = [0]
+        closest = self.graph.dijkstra(0)
+        for _ in range(count - 1):
+            reachable = [(d, i) for i, d in enumerate(closest) if d != math.inf]
+            if not reachable:
+                break
+            _, far = max(reachable)
+            if far in landmarks:
+                break
+            landmarks.append(far)
+            closest = [min(a, b) for a, b in zip(closest, self.graph.dijkstra(far))]
+        return landmarks
+
+    def set_traffic(self, records) -> int:
+        """
+        Load time-of-day edge factors.
+        records: iterable of {"source": u, "dest": v, "hour": 0-23, "speed_factor": f}
+        """
+        index = {node_id: i for i, node_id in enumerate(self.graph.ids)}
+        self._traffic = {}
+        loaded = 0
+        for rec in records:
+            u, v = index.get(rec.get("source")), index.get(rec.get("dest"))
+            if u is None or v is None:
+                continue
+            factors = self._traffic.setdefault((u, v), [1.0] * 24)
+            factors[int(rec.get("hour", 0)) % 24] = max(1.0, float(rec.get("speed_factor", 1.0)))
+            loaded += 1
+        self._cache.clear()
+        return loaded
+
+    # ===== QUERIES =====
+    def _heuristic(self, v: int, target: int) -> float:
+        best = 0.0
+        for from_lm, to_lm in zip(self._from_lm, self._to_lm):
+            a = from_lm[target] - from_lm[v]
+            b = to_lm[v] - to_lm[target]
+            if a > best and a != math.inf:
+                best = a
+            if b > best and b != math.inf:
+                best = b
+        return best
+
+    def route_seconds(self, source: int, target: int, hour: int = None) -> float:
+        """A* (ALT) travel time between two node indices"""
+        if source == target:
+            return 0.0
+        self.stats["searches"] += 1
+        traffic = self._traffic
+        dist = {source: 0.0}
+        heap = [(self._heuristic(source, target), 0.0, source)]
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if u == target:
+                return d
+            if d > dist.get(u, math.inf):
+                continue
+            for v, w in self.graph.adj[u]:
+                if traffic and hour is not None:
+                    factors = traffic.get((u, v))
+                    if factors:
+                        w *= factors[hour]
+                nd = d + w
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd + self._heuristic(v, target), nd, v))
+        return math.inf
+
+    def _snap(self, lat, lon):
+        key = (round(lat, 6), round(lon, 6))
+        hit = self._snap_cache.get(key)
+        if hit is None:
+            hit = self.graph.snap(lat, lon)
+            if len(self._snap_cache) < self.cache_size:
+                self._snap_cache[key] = hit
+        return hit
+
+    def _cell_centre(self, lat, lon):
+        return ((math.floor(lat / self.cell_deg) + 0.5) * self.cell_deg,
+                (math.floor(lon / self.cell_deg) + 0.5) * self.cell_deg)
+
+    def eta_seconds(self, from_lat, from_lon, to_lat, to_lon,
+                    hour: int = None, into_cell: bool = True) -> float:
+        """
+        Travel time between two points. The incident side is quantised to its
+        grid cell so the cache behaves like a station x cell ETA matrix:
+        into_cell=True for station -> incident, False for incident -> hospital.
+        `hour` selects traffic factors (defaults to the current hour).
+        """
+        self.stats["queries"] += 1
+        if hour is None:
+            hour = time.localtime().tm_hour if self._traffic else None
+        if into_cell:
+            src, src_km = self._snap(from_lat, from_lon)
+            dst, dst_km = self._snap(*self._cell_centre(to_lat, to_lon))
+        else:
+            src, src_km = self._snap(*self._cell_centre(from_lat, from_lon))
+            dst, dst_km = self._snap(to_lat, to_lon)
+        if src is None or dst is None:
+            return math.inf
+
+        key = (src, dst, hour)
+        cached = self._cache.get(key)
+        if cached is None:
+            cached = self.route_seconds(src, dst, hour)
+            self._cache[key] = cached
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self.stats["cache_hits"] += 1
+            self._cache.move_to_end(key)
+
+        access_km = src_km + dst_km
+        return cached + access_km / ACCESS_SPEED_KMH * 3600
+
+    def rank(self, lat: float, lon: float, nearest, k: int = 1,
+             probe: int = 8, max_probe: int = 512) -> list:
+        """
+        k best units by ETA to (lat, lon).
+
+        nearest(lat, lon, n) must return [(distance_km, unit, ...)] in
+        straight-line order. Candidates are widened until no unit further out
+        could still beat the k-th ETA (nothing drives faster than the fastest
+        road), so a station across the river never wins just by being close.
+        Returns [(eta_s, distance_km, unit, *rest)] sorted by ETA.
+        """
+        n = max(probe, k)
+        while True:
+            candidates = nearest(lat, lon, n)
+            scored = sorted(
+                ((self.eta_seconds(c[1]["lat"], c[1]["lon"], lat, lon),) + tuple(c) for c in candidates),
+                key=lambda item: (item[0], item[1])
+            )
+            if len(candidates) < n or len(scored) < k or n >= max_probe:
+                return scored[:k]
+            kth_eta = scored[k - 1][0]
+            # ETAs are measured to the cell centre, so allow one cell of slack
+            reach_km = max(0.0, candidates[-1][0] - self.cell_deg * KM_PER_DEG_LAT)
+            if reach_km / self.graph.max_speed_kmh * 3600 >= kth_eta:
+                return scored[:k]
+            n *= 2
+
+    def summary(self) -> dict:
+        return {
+            "nodes": len(self.graph),
+            "landmarks": len(self._landmarks),
+            "precompute_s": self.precompute_s,
+            "cached_etas": len(self._cache),
+            "traffic_edges": len(self._traffic),
+            **self.stats
+        }
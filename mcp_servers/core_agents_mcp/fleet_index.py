@@ -0,0 +1,386 @@
+# fleet_index.py - Spatial index over ambulance stations
+"""
+Uniform lat/lon grid over ambulance stations for nearest-available lookups.
+
+Only stations with at least one available ambulance are kept in the grid
+buckets, so a query walks outward ring by ring from the incident cell and
+stops as soon as no unvisited cell can hold anything closer than what was
+already found. Status changes are applied incrementally with `refresh()`,
+and live GPS positions with `move()`: the first ping detaches an ambulance
+from its home station into its own single-unit entry that follows it.
+
+FleetState sits on top of the index and owns every status change: one lock
+per station plus compare-and-set reservations with a lease, so concurrent
+dispatches never hand out the same unit and never wait on a global lock.
+"""
+
+import heapq
+import itertools
+import math
+import time
+from threading import Lock
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Calculate the great-circle distance in km between two points
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
+    return 2 * EARTH_RADIUS_KM * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+class AmbulanceIndex:
+    """Grid index of stations keyed by (lat cell, lon cell)"""
+
+    def __init__(self, cell_deg: float = 0.02):
+        # 0.02° is roughly 2.2 km N-S and 1.9 km E-W around Lahore
+        self.cell_deg = cell_deg
+        self._stations = []         # [{"unit", "cell", "available", "ambs", "mobile"}]
+        self._cells = {}            # cell -> set(station_idx) with available > 0
+        self._amb = {}              # ambulance_id -> (station_idx, amb dict)
+        self._max_abs_lat = 0.0
+        self._cell_bounds = None    # (min_i, max_i, min_j, max_j)
+        self._bucket_lock = Lock()  # held only while a bucket set is edited
+
+    # ===== BUILD / UPDATE =====
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def build(self, groups):
+        """Index every unit in the given groups (e.g. [HOSPITALS, RESCUE_ORGS])"""
+        self.__init__(self.cell_deg)
+        for group in groups:
+            for unit in group:
+                self.add_station(unit)
+
+    def add_station(self, unit: dict, mobile: bool = False):
+        """Add a station and all of its ambulances"""
+        idx = len(self._stations)
+        cell = self._cell(unit["lat"], unit["lon"])
+        station = {"unit": unit, "cell": cell, "available": 0,
+                   "ambs": list(unit["ambulances"]), "mobile": mobile}
+        self._stations.append(station)
+
+        for amb in station["ambs"]:
+            self._amb[amb["id"]] = (idx, amb)
+            if amb["status"] == "available":
+                station["available"] += 1
+        if station["available"]:
+            with self._bucket_lock:
+                self._cells.setdefault(cell, set()).add(idx)
+
+        self._extend_bounds(unit["lat"], cell)
+        return idx
+
+    def _extend_bounds(self, lat, cell):
+        self._max_abs_lat = max(self._max_abs_lat, abs(lat))
+        i, j = cell
+        if self._cell_bounds is None:
+            self._cell_bounds = (i, i, j, j)
+        else:
+            lo_i, hi_i, lo_j, hi_j = self._cell_bounds
+            self._cell_bounds = (min(lo_i, i), max(hi_i, i), min(lo_j, j), max(hi_j, j))
+
+    def lookup(self, ambulance_id: str):
+        """Return (unit, amb) for an ambulance id, or None"""
+        entry = self._amb.get(ambulance_id)
+        if entry is None:
+            return None
+        idx, amb = entry
+        return self._stations[idx]["unit"], amb
+
+    def refresh(self, ambulance_id: str) -> bool:
+        """Re-sync the index after an ambulance's status changed"""
+        entry = self._amb.get(ambulance_id)
+        if entry is None:
+            return False
+        idx, _ = entry
+        station = self._stations[idx]
+        available = sum(1 for a in station["ambs"] if a["status"] == "available")
+        if available == station["available"]:
+            return True
+
+        station["available"] = available
+        with self._bucket_lock:
+            bucket = self._cells.setdefault(station["cell"], set())
+            if available:
+                bucket.add(idx)
+            else:
+                bucket.discard(idx)
+                if not bucket:
+                    del self._cells[station["cell"]]
+        return True
+
+    def move(self, ambulance_id: str, lat: float, lon: float) -> bool:
+        """
+        Record a live position. The caller must hold the ambulance's station
+        lock (FleetState.move does). Same-cell updates touch no buckets.
+        """
+        entry = self._amb.get(ambulance_id)
+        if entry is None:
+            return False
+        idx, amb = entry
+        station = self._stations[idx]
+
+        if not station["mobile"]:
+            # First ping: the unit leaves its home station's entry for good
+            home = station["unit"]
+            station["ambs"].remove(amb)
+            self.refresh_station(idx)
+            unit = dict(home, lat=lat, lon=lon, ambulances=[amb], home_station=home["name"])
+            self.add_station(unit, mobile=True)
+            return True
+
+        unit = station["unit"]
+        unit["lat"] = lat
+        unit["lon"] = lon
+        cell = self._cell(lat, lon)
+        if cell == station["cell"]:
+            return True
+        if station["available"]:
+            with self._bucket_lock:
+                old = self._cells.get(station["cell"])
+                if old is not None:
+                    old.discard(idx)
+                    if not old:
+                        del self._cells[station["cell"]]
+                self._cells.setdefault(cell, set()).add(idx)
+        station["cell"] = cell
+        self._extend_bounds(lat, cell)
+        return True
+
+    def refresh_station(self, idx: int):
+        station = self._stations[idx]
+        if station["ambs"]:
+            self.refresh(station["ambs"][0]["id"])
+        elif station["available"]:
+            station["available"] = 0
+            with self._bucket_lock:
+                bucket = self._cells.get(station["cell"])
+                if bucket is not None:
+                    bucket.discard(idx)
+                    if not bucket:
+                        del self._cells[station["cell"]]
+
+    # ===== QUERIES =====
+    def _min_cell_km(self, lat):
+        """Smallest cell side in km anywhere between the query and the stations"""
+        widest_lat = max(self._max_abs_lat, abs(lat)) + self.cell_deg
+        lon_km = KM_PER_DEG_LAT * math.cos(math.radians(min(widest_lat, 89.0))) * self.cell_deg
+        # 1% slack covers the gap between parallel arcs and great circles
+        return min(KM_PER_DEG_LAT * self.cell_deg, lon_km) * 0.99
+
+    def _ring(self, ci, cj, r):
+        if r == 0:
+            yield (ci, cj)
+            return
+        for dj in range(-r, r + 1):
+            yield (ci - r, cj + dj)
+            yield (ci + r, cj + dj)
+        for di in range(-r + 1, r):
+            yield (ci + di, cj - r)
+            yield (ci + di, cj + r)
+
+    def nearest(self, lat: float, lon: float, k: int = 1) -> list:
+        """
+        k nearest available ambulances as (distance_km, unit, amb), closest first
+        """
+        if k <= 0 or not self._cells:
+            return []
+
+        ci, cj = self._cell(lat, lon)
+        lo_i, hi_i, lo_j, hi_j = self._cell_bounds
+        max_ring = max(abs(ci - lo_i), abs(ci - hi_i), abs(cj - lo_j), abs(cj - hi_j))
+        cell_km = self._min_cell_km(lat)
+
+        pending = []   # heap of (dist, station_idx) not yet known to be closest
+        settled = []   # stations provably closer than anything unvisited, in order
+        settled_available = 0
+        for r in range(max_ring + 1):
+            if (2 * r + 1) ** 2 > 4 * len(self._cells):
+                # Query far from the fleet: walking empty rings costs more than a scan
+                seen = {idx for _, idx in settled}
+                pending = [
+                    (haversine(lat, lon, self._stations[idx]["unit"]["lat"],
+                               self._stations[idx]["unit"]["lon"]), idx)
+                    for bucket in list(self._cells.values()) for idx in tuple(bucket) if idx not in seen
+                ]
+                heapq.heapify(pending)
+                break
+            for cell in self._ring(ci, cj, r):
+                for idx in tuple(self._cells.get(cell, ())):
+                    unit = self._stations[idx]["unit"]
+                    heapq.heappush(pending, (haversine(lat, lon, unit["lat"], unit["lon"]), idx))
+
+            # Anything in ring r+1 or beyond is at least r whole cells away
+            bound = r * cell_km
+            while pending and pending[0][0] <= bound:
+                item = heapq.heappop(pending)
+                settled.append(item)
+                settled_available += self._stations[item[1]]["available"]
+            if settled_available >= k:
+                break
+
+        results = []
+        ordered = itertools.chain(settled, (heapq.heappop(pending) for _ in range(len(pending))))
+        for dist, idx in ordered:
+            station = self._stations[idx]
+            unit = station["unit"]
+            for amb in tuple(station["ambs"]):
+                if amb["status"] == "available":
+                    results.append((dist, unit, amb))
+                    if len(results) == k:
+                        return results
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "stations": len(self._stations),
+            "ambulances": len(self._amb),
+            "occupied_cells": len(self._cells),
+            "available": sum(s["available"] for s in self._stations),
+            "mobile": sum(1 for s in self._stations if s["mobile"]),
+            "cell_deg": self.cell_deg
+        }
+
+
+class FleetState:
+    """
+    Owns ambulance status changes: per-station locks + leased reservations
+
+    Status flow: available -> reserved (leased) -> dispatched -> available.
+    A reservation that is not confirmed before its lease runs out goes back
+    to the pool, so a caller that dies mid-dispatch cannot strand a unit.
+    """
+
+    def __init__(self, index: AmbulanceIndex, lease_s: float = 30.0):
+        self.index = index
+        self.lease_s = lease_s
+        self._locks = {}    # ambulance_id -> its station's Lock
+        self._leases = {}   # ambulance_id -> (token, expires_at)
+        self._tokens = itertools.count(1)
+
+    def build(self, groups):
+        """(Re)build the index and one lock per station"""
+        self.index.build(groups)
+        self._locks = {}
+        self._leases = {}
+        for group in groups:
+            for unit in group:
+                lock = Lock()
+                for amb in unit["ambulances"]:
+                    self._locks[amb["id"]] = lock
+
+    def add_station(self, unit: dict):
+        self.index.add_station(unit)
+        lock = Lock()
+        for amb in unit["ambulances"]:
+            self._locks[amb["id"]] = lock
+
+    def move(self, ambulance_id: str, lat: float, lon: float) -> bool:
+        """Apply a GPS position under the unit's station lock"""
+        lock = self._locks.get(ambulance_id)
+        if lock is None:
+            return False
+        with lock:
+            return self.index.move(ambulance_id, lat, lon)
+
+    def _expire_locked(self, ambulance_id, amb, now):
+        lease = self._leases.get(ambulance_id)
+        if lease and lease[1] <= now and amb["status"] == "reserved":
+            del self._leases[ambulance_id]
+            amb["status"] = "available"
+            self.index.refresh(ambulance_id)
+
+    def reserve(self, ambulance_id: str, lease_s: float = None):
+        """Compare-and-set available -> reserved. Returns a lease token or None"""
+        entry = self.index.lookup(ambulance_id)
+        if entry is None:
+            return None
+        _, amb = entry
+        now = time.time()
+        with self._locks[ambulance_id]:
+            self._expire_locked(ambulance_id, amb, now)
+            if amb["status"] != "available":
+                return None
+            token = next(self._tokens)
+            amb["status"] = "reserved"
+            self._leases[ambulance_id] = (token, now + (lease_s or self.lease_s))
+            self.index.refresh(ambulance_id)
+        return token
+
+    def confirm(self, ambulance_id: str, token) -> bool:
+        """reserved -> dispatched, only for the holder of a live lease"""
+        entry = self.index.lookup(ambulance_id)
+        if entry is None:
+            return False
+        _, amb = entry
+        with self._locks[ambulance_id]:
+            self._expire_locked(ambulance_id, amb, time.time())
+            lease = self._leases.get(ambulance_id)
+            if not lease or lease[0] != token:
+                return False
+            del self._leases[ambulance_id]
+            amb["status"] = "dispatched"
+        return True
+
+    def release(self, ambulance_id: str) -> bool:
+        """Any status -> available (mission finished or reservation abandoned)"""
+        entry = self.index.lookup(ambulance_id)
+        if entry is None:
+            return False
+        _, amb = entry
+        with self._locks[ambulance_id]:
+            self._leases.pop(ambulance_id, None)
+            amb["status"] = "available"
+            self.index.refresh(ambulance_id)
+        return True
+
+    def expire_leases(self) -> int:
+        """Return every expired reservation to the pool"""
+        now = time.time()
+        expired = 0
+        for ambulance_id, (_, expires_at) in list(self._leases.items()):
+            if expires_at > now:
+                continue
+            _, amb = self.index.lookup(ambulance_id)
+            with self._locks[ambulance_id]:
+                if ambulance_id in self._leases:
+                    self._expire_locked(ambulance_id, amb, now)
+                    expired += 1
+        return expired
+
+    def reserve_nearest(self, lat: float, lon: float, k: int = 4, attempts: int = 3, nearest=None):
+        """
+        Reserve the best unit that can still be claimed. `nearest(lat, lon, n)`
+        supplies candidates in preference order (defaults to straight-line).
+        Returns (distance_km, unit, amb, token) or None
+        """
+        nearest = nearest or self.index.nearest
+        for attempt in range(attempts):
+            candidates = nearest(lat, lon, k * (attempt + 1))
+            if not candidates:
+                return None
+            for dist, unit, amb in candidates:
+                token = self.reserve(amb["id"])
+                if token is not None:
+                    return dist, unit, amb, token
+        return None
+
+
+def haversine_matrix(np, lats1, lons1, lats2, lons2):
+    """
+    Vectorized great-circle distances in km, shape (len(lats1), len(lats2))
+    """
+    phi1 = np.radians(np.asarray(lats1, dtype=float))[:, None]
+    phi2 = np.radians(np.asarray(lats2, dtype=float))[None, :]
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lons2, dtype=float))[None, :] - np.radians(np.asarray(lons1, dtype=float))[:, None]
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
@@ -0,0 +1,119 @@
+# telemetry.py - Ring-buffered GPS telemetry for ambulances
+"""
+Fixed-size position history per ambulance, stored in flat preallocated
+arrays: unit slot s owns entries [s * depth, (s + 1) * depth) of the lat,
+lon and timestamp arrays, and a ping just overwrites the oldest entry.
+Slots are handed out on a unit's first ping and the arrays grow in chunks,
+so steady-state ingestion builds no per-ping containers.
+
+Every accepted ping is forwarded to `on_position(ambulance_id, lat, lon)`
+(FleetState.move) so the dispatch index follows the unit.
+"""
+
+import time
+from array import array
+from threading import Lock
+
+
+class TelemetryBuffer:
+    """Last `depth` positions per ambulance"""
+
+    def __init__(self, depth: int = 32, on_position=None, chunk_units: int = 256):
+        self.depth = depth
+        self.on_position = on_position
+        self.chunk_units = chunk_units
+        self._slots = {}                 # ambulance_id -> slot
+        self._lat = array("d")
+        self._lon = array("d")
+        self._ts = array("d")
+        self._head = array("l")          # slot -> next write position
+        self._count = array("l")         # slot -> filled entries (<= depth)
+        self._lock = Lock()
+        self.stats = {"pings": 0, "stale": 0, "unknown": 0}
+
+    def _slot(self, ambulance_id):
+        slot = self._slots.get(ambulance_id)
+        if slot is None:
+            slot = len(self._slots)
+            if slot == len(self._head):
+                # Grow a chunk of units at a time, never per ping
+                entries = self.depth * self.chunk_units
+                self._lat.extend(array("d", bytes(8 * entries)))
+                self._lon.extend(array("d", bytes(8 * entries)))
+                self._ts.extend(array("d", bytes(8 * entries)))
+                self._head.extend([0] * self.chunk_units)
+                self._count.extend([0] * self.chunk_units)
+            self._slots[ambulance_id] = slot
+        return slot
+
+    # ===== INGEST =====
+    def _is_stale(self, slot, ts) -> bool:
+        if not self._count[slot]:
+            return False
+        last = slot * self.depth + (self._head[slot] - 1) % self.depth
+        return ts < self._ts[last]
+
+    def _record(self, slot, lat, lon, ts):
+        pos = slot * self.depth + self._head[slot]
+        self._lat[pos] = lat
+        self._lon[pos] = lon
+        self._ts[pos] = ts
+        self._head[slot] = (self._head[slot] + 1) % self.depth
+        if self._count[slot] < self.depth:
+            self._count[slot] += 1
+
+    def ingest(self, pings) -> dict:
+        """
+        Record a batch of pings: {"ambulance_id", "lat", "lon", "ts" (optional)}.
+        Returns accepted / stale / unknown counts for the batch.
+        """
+        accepted = stale = unknown = 0
+        now = time.time()
+        on_position = self.on_position
+        with self._lock:
+            for ping in pings:
+                ambulance_id = ping["ambulance_id"]
+                lat, lon = float(ping["lat"]), float(ping["lon"])
+                ts = float(ping.get("ts") or now)
+                slot = self._slots.get(ambulance_id)
+                if slot is not None and self._is_stale(slot, ts):
+                    stale += 1      # out-of-order ping, keep the newer fix
+                    continue
+                if on_position is not None and not on_position(ambulance_id, lat, lon):
+                    unknown += 1
+                    continue
+                self._record(self._slot(ambulance_id) if slot is None else slot, lat, lon, ts)
+                accepted += 1
+            self.stats["pings"] += accepted
+            self.stats["stale"] += stale
+            self.stats["unknown"] += unknown
+        return {"accepted": accepted, "stale": stale, "unknown": unknown}
+
+    # ===== QUERIES =====
+    def track(self, ambulance_id: str, limit: int = None) -> list:
+        """Recent positions as [{"lat", "lon", "ts"}], oldest first"""
+        with self._lock:
+            slot = self._slots.get(ambulance_id)
+            if slot is None:
+                return []
+            count = self._count[slot]
+            if limit is not None:
+                count = min(count, limit)
+            base, head = slot * self.depth, self._head[slot]
+            positions = []
+            for back in range(count, 0, -1):
+                pos = base + (head - back) % self.depth
+                positions.append({"lat": self._lat[pos], "lon": self._lon[pos], "ts": self._ts[pos]})
+        return positions
+
+    def last(self, ambulance_id: str):
+        track = self.track(ambulance_id, limit=1)
+        return track[0] if track else None
+
+    def summary(self) -> dict:
+        return {
+            "units": len(self._slots),
+            "depth": self.depth,
+            "buffer_kb": round((len(self._lat) * 3 * 8 + len(self._head) * 2 * 8) / 1024, 1),
+            **self.stats
+        }
@@ -0,0 +1,76 @@
+# inprocess.py - Run an MCP server script's FastMCP inside the calling process
+"""
+Over stdio every tool call is JSON-RPC written to a pipe, read by the
+subprocess, dispatched, and the result written back. When the backend and
+the tool modules live on the same host the server can run in the
+backend's own event loop instead:
+
+    server = load_server("mcp_servers/core_agents_mcp/agents_mcp.py")
+    async with memory_transport(server) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+
+load_server() imports the script as a module (its `if __name__ ==
+"__main__"` block doesn't run) and returns its FastMCP. memory_transport()
+runs that FastMCP's low-level server on in-memory streams, exactly as
+run_stdio_async() runs it on stdin/stdout, so requests go through the same
+dispatch, argument validation and error handling; only the pipe and the
+JSON text encoding are gone. Tool errors come back as isError results,
+the same as over stdio.
+
+Differences from a subprocess:
+    - one module per script: state is shared by every session, and a
+      script can't be run as several replicas
+    - sync tools run on the caller's event loop, so a tool that blocks
+      (SMTP, a Mongo timeout) stalls the caller for that long
+    - the module's stdout/stderr and working directory are the caller's
+
+mcp_pool.InProcessMCPServer wraps this as an agents SDK MCPServer;
+scripts/transport_benchmark.py compares it with stdio.
+"""
+
+import importlib
+import os
+import sys
+from contextlib import asynccontextmanager
+
+import anyio
+from mcp.server.fastmcp import FastMCP
+from mcp.shared.memory import create_client_server_memory_streams
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def module_name(script: str) -> str:
+    """mcp_servers/core_agents_mcp/agents_mcp.py -> mcp_servers.core_agents_mcp.agents_mcp"""
+    path = os.path.abspath(script if os.path.isabs(script) else os.path.join(BASE_DIR, script))
+    relative = os.path.relpath(path, BASE_DIR)
+    if relative.startswith("..") or not relative.endswith(".py"):
+        raise ValueError(f"{script}: in-process servers must be .py files under {BASE_DIR}")
+    return relative[:-3].replace(os.sep, ".")
+
+
+def load_server(script: str) -> FastMCP:
+    """Import the script (once per process) and return its FastMCP instance"""
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    module = importlib.import_module(module_name(script))
+    server = getattr(module, "mcp", None)
+    if not isinstance(server, FastMCP):
+        server = next((v for v in vars(module).values() if isinstance(v, FastMCP)), None)
+    if server is None:
+        raise ValueError(f"{script}: no FastMCP instance found")
+    return server
+
+
+@asynccontextmanager
+async def memory_transport(server: FastMCP):
+    """(read, write) client streams connected to `server`, which runs until the block exits"""
+    lowlevel = server._mcp_server
+    async with create_client_server_memory_streams() as (client_streams, server_streams):
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(lambda: lowlevel.run(*server_streams, lowlevel.create_initialization_options()))
+            try:
+                yield client_streams
+            finally:
+                tg.cancel_scope.cancel()
@@ -0,0 +1,419 @@
+# mcp_pool.py - One set of MCP server processes shared by every agent
+"""
+Each hospital agent used to build its own MCPServerStdio for the
+orchestrator and for agents_mcp.py, so the backend ran ~12 subprocesses
+that loaded the same data and kept separate ambulance/queue state.
+
+MCP_POOL.get(name, script, replicas=N) returns one PooledMCPServer per
+name. It is an agents SDK MCPServer, so it goes straight into
+Agent(mcp_servers=[...]); every agent that asks for the name shares it.
+
+    - a replica is one MCPServerStdio subprocess; one ClientSession already
+      multiplexes concurrent calls, so replicas are only for CPU-bound
+      servers (state is per replica unless the server shares it, as the
+      orchestrator does through its SQLite queue)
+    - call_tool goes to the replica with the fewest calls in flight
+      (ties round-robin); replicas that failed to connect are skipped
+    - each replica is connected and cleaned up by its own task, so
+      connect() can be awaited from any task, any number of times
+
+Startup: connect_all() connects every non-lazy server concurrently. A
+replica counts as ready after a tools/list round-trip (the readiness
+probe), not just after the process answered initialize. lazy=True servers
+are connected by the first list_tools/call_tool instead. Connect and
+probe times are kept per replica and exported by render_prometheus().
+
+Health: a replica stops counting as healthy when a call to it fails with
+a transport error (closed stream, connection closed) or when its periodic
+ping (every health_interval_s) fails, e.g. because the process exited.
+Its connection is cleaned up and the server reconnects it in the
+background, backing off from reconnect_delay_s to 60 s while it fails.
+
+Transport: "stdio" (a subprocess per replica) or "inprocess" (the script's
+FastMCP imported into this process and served over memory streams, see
+mcp_servers/inprocess.py; always one replica). Chosen per server with
+transport=..., else MCP_TRANSPORT_<NAME> (e.g. MCP_TRANSPORT_DOMAINMCP),
+else MCP_TRANSPORT, else stdio.
+"""
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from itertools import count
+
+import anyio
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+from agents.mcp import MCPServer, MCPServerStdio
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+TRANSPORTS = ("stdio", "inprocess")
+
+
+class InProcessMCPServer(MCPServerStdio):
+    """
+    MCPServerStdio whose streams lead to the script's FastMCP running in
+    this process instead of to a subprocess. Same constructor; params
+    "args"[0] is the script. The ClientSession side is untouched, so
+    schemas, timeouts and error results are the stdio ones.
+    """
+
+    @asynccontextmanager
+    async def _memory_streams(self):
+        from mcp_servers.inprocess import load_server, memory_transport
+        script = self.params.args[0]
+        # Importing a server module can take a second; keep it off the event loop
+        server = await asyncio.to_thread(load_server, script)
+        async with memory_transport(server) as streams:
+            yield streams
+
+    def create_streams(self):
+        return self._memory_streams()
+
+
+def is_transport_error(error: BaseException) -> bool:
+    """The session to the server is gone (as opposed to a tool or timeout error)"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream,
+                              BrokenPipeError, ConnectionError)):
+            return True
+        if isinstance(error, McpError) and error.error.code == CONNECTION_CLOSED:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def transport_for(name: str) -> str:
+    return os.getenv(f"MCP_TRANSPORT_{name.upper()}") or os.getenv("MCP_TRANSPORT") or "stdio"
+
+
+class _Replica:
+    __slots__ = ("server", "in_flight", "calls", "errors", "task", "ready", "stop", "error",
+                 "connect_s", "probe_s", "tools", "failures")
+
+    def __init__(self, server: MCPServerStdio):
+        self.server = server
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.task = None
+        self.ready = None
+        self.stop = None
+        self.error = None
+        self.connect_s = None       # spawn + initialize
+        self.probe_s = None         # readiness probe (tools/list round-trip)
+        self.tools = None
+        self.failures = 0           # times it was found dead after being ready
+
+    @property
+    def healthy(self) -> bool:
+        return self.task is not None and self.ready.is_set() and self.error is None and not self.task.done()
+
+
+class PooledMCPServer(MCPServer):
+    def __init__(self, name: str, params: dict, replicas: int = 1, lazy: bool = False,
+                 probe_timeout_s: float = 30.0, transport: str = None, health_interval_s: float = 15.0,
+                 reconnect_delay_s: float = 1.0, **server_kwargs):
+        super().__init__()
+        self._name = name
+        self.params = params
+        self.lazy = lazy
+        self.transport = transport or transport_for(name)
+        if self.transport not in TRANSPORTS:
+            raise ValueError(f"{name}: unknown MCP transport {self.transport!r} (expected one of {TRANSPORTS})")
+        server_class = InProcessMCPServer if self.transport == "inprocess" else MCPServerStdio
+        if self.transport == "inprocess":
+            replicas = 1        # one imported module per process
+        self.probe_timeout_s = probe_timeout_s
+        self.health_interval_s = health_interval_s
+        self.reconnect_delay_s = reconnect_delay_s
+        self.on_ready = None        # on_ready(replica name, session) after a replica passes the probe
+        self.replicas = [
+            _Replica(server_class(params=params, name=name if replicas == 1 else f"{name}#{i}", **server_kwargs))
+            for i in range(max(1, replicas))
+        ]
+        self._turn = count()
+        self._lock = None
+        self._reconnecting = None
+        self._closing = False
+        self.reconnects = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    # ===== LIFECYCLE =====
+    async def connect(self):
+        """Start every replica that isn't running; raises only if none is usable"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        self._closing = False
+        async with self._lock:
+            starting = [r for r in self.replicas if r.task is None or r.task.done()]
+            for replica in starting:
+                replica.ready, replica.stop, replica.error = asyncio.Event(), asyncio.Event(), None
+                replica.task = asyncio.create_task(self._own(replica), name=f"mcp-{replica.server.name}")
+            await asyncio.gather(*(r.ready.wait() for r in starting))
+            if not any(r.healthy for r in self.replicas):
+                raise next((r.error for r in self.replicas if r.error), RuntimeError(f"{self._name}: no replica connected"))
+
+    async def _own(self, replica: _Replica):
+        """Owns one replica's connection for its whole life (the SDK wants connect/cleanup in one task)"""
+        started = time.perf_counter()
+        try:
+            await replica.server.connect()
+            connected = time.perf_counter()
+            replica.connect_s = connected - started
+            listed = await asyncio.wait_for(replica.server.session.list_tools(), self.probe_timeout_s)
+            replica.probe_s = time.perf_counter() - connected
+            replica.tools = len(listed.tools)
+            if self.on_ready is not None:
+                self.on_ready(replica.server.name, replica.server.session)
+        except Exception as e:
+            replica.error = e
+            replica.ready.set()
+            await replica.server.cleanup()
+            return
+        replica.ready.set()
+        try:
+            while not replica.stop.is_set():
+                try:
+                    await asyncio.wait_for(replica.stop.wait(), self.health_interval_s)
+                except asyncio.TimeoutError:
+                    try:
+                        await asyncio.wait_for(replica.server.session.send_ping(), self.probe_timeout_s)
+                    except Exception as e:
+                        self._mark_dead(replica, e)
+        finally:
+            await replica.server.cleanup()
+
+    def _mark_dead(self, replica: _Replica, error: BaseException):
+        """Take a replica out of rotation, let its owner clean up, and reconnect it in the background"""
+        if replica.error is not None:
+            return
+        replica.error = error
+        replica.failures += 1
+        replica.stop.set()
+        if not self._closing and (self._reconnecting is None or self._reconnecting.done()):
+            self._reconnecting = asyncio.create_task(self._reconnect(), name=f"mcp-{self._name}-reconnect")
+
+    async def _reconnect(self):
+        delay = self.reconnect_delay_s
+        while not self._closing and not all(r.healthy for r in self.replicas):
+            await asyncio.sleep(delay)
+            # Owners of dead replicas finish their cleanup before they are restarted
+            await asyncio.gather(*(r.task for r in self.replicas if r.error is not None and r.task is not None),
+                                 return_exceptions=True)
+            if self._closing:
+                return
+            try:
+                await self.connect()
+            except Exception:
+                pass
+            if all(r.healthy for r in self.replicas):
+                self.reconnects += 1
+                return
+            delay = min(60.0, delay * 2)
+
+    async def _ensure_connected(self):
+        if not any(r.healthy for r in self.replicas):
+            await self.connect()
+
+    async def cleanup(self):
+        self._closing = True
+        if self._reconnecting is not None:
+            self._reconnecting.cancel()
+        running = [r for r in self.replicas if r.task is not None and not r.task.done()]
+        for replica in running:
+            replica.stop.set()
+        await asyncio.gather(*(r.task for r in running), return_exceptions=True)
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        # Shared by every agent: one agent leaving doesn't stop the processes
+        pass
+
+    # ===== CALLS =====
+    def _pick(self) -> _Replica:
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            raise RuntimeError(f"Server {self._name} not initialized. Make sure you call `connect()` first.")
+        if len(healthy) == 1:
+            return healthy[0]
+        turn = next(self._turn)
+        return min(enumerate(healthy), key=lambda e: (e[1].in_flight, (e[0] - turn) % len(healthy)))[1]
+
+    async def _on_replica(self, method: str, *args, **kwargs):
+        """Run one session call on a picked replica; a transport failure takes the replica out"""
+        await self._ensure_connected()
+        replica = self._pick()
+        replica.in_flight += 1
+        replica.calls += 1
+        try:
+            return await getattr(replica.server, method)(*args, **kwargs)
+        except Exception as e:
+            replica.errors += 1
+            if is_transport_error(e):
+                self._mark_dead(replica, e)
+            raise
+        finally:
+            replica.in_flight -= 1
+
+    async def list_tools(self, *args, **kwargs):
+        return await self._on_replica("list_tools", *args, **kwargs)
+
+    async def call_tool(self, tool_name: str, arguments: dict = None, *args, **kwargs):
+        return await self._on_replica("call_tool", tool_name, arguments, *args, **kwargs)
+
+    async def list_prompts(self, *args, **kwargs):
+        return await self._on_replica("list_prompts", *args, **kwargs)
+
+    async def get_prompt(self, *args, **kwargs):
+        return await self._on_replica("get_prompt", *args, **kwargs)
+
+    def invalidate_tools_cache(self):
+        for replica in self.replicas:
+            replica.server.invalidate_tools_cache()
+
+    # ===== INTROSPECTION =====
+    @property
+    def session(self):
+        """First healthy replica's ClientSession (what single-server callers expect)"""
+        healthy = [r for r in self.replicas if r.healthy]
+        return healthy[0].server.session if healthy else None
+
+    def sessions(self) -> dict:
+        """{replica name: ClientSession} of connected replicas"""
+        return {r.server.name: r.server.session for r in self.replicas if r.healthy}
+
+    def summary(self) -> dict:
+        return {
+            "transport": self.transport,
+            "lazy": self.lazy,
+            "replicas": len(self.replicas),
+            "healthy": sum(r.healthy for r in self.replicas),
+            "connect_s": [r.connect_s and round(r.connect_s, 3) for r in self.replicas],
+            "probe_s": [r.probe_s and round(r.probe_s, 3) for r in self.replicas],
+            "tools": [r.tools for r in self.replicas],
+            "in_flight": [r.in_flight for r in self.replicas],
+            "calls": [r.calls for r in self.replicas],
+            "errors": [r.errors for r in self.replicas],
+            "failures": [r.failures for r in self.replicas],
+            "reconnects": self.reconnects,
+            "connect_errors": [repr(r.error) for r in self.replicas if r.error]
+        }
+
+
+class MCPServerPool:
+    def __init__(self):
+        self.servers = {}
+        self.on_ready = []          # callbacks(replica name, session), e.g. span instrumentation
+        self.startup_s = None
+
+    def add(self, server: PooledMCPServer) -> PooledMCPServer:
+        server.on_ready = self._replica_ready
+        self.servers[server.name] = server
+        return server
+
+    def get(self, name: str, script: str, replicas: int = 1, **server_kwargs) -> PooledMCPServer:
+        """
+        The shared server for `name`, created on first use. Later callers get
+        the same object; their replicas/server_kwargs are ignored.
+        """
+        server = self.servers.get(name)
+        if server is None:
+            params = {"command": "python", "args": [script if os.path.isabs(script) else os.path.join(BASE_DIR, script)]}
+            server = self.add(PooledMCPServer(name, params, replicas=replicas, **server_kwargs))
+        return server
+
+    def _replica_ready(self, replica: str, session):
+        for callback in self.on_ready:
+            callback(replica, session)
+
+    async def connect_all(self, timeout: float = 60.0, retries: int = 0, retry_delay: float = 2.0) -> dict:
+        """
+        Connect every non-lazy server concurrently; {name: None or the last
+        connect error}. Lazy servers are left for their first use.
+        """
+        async def connect(server):
+            for attempt in range(retries + 1):
+                try:
+                    await asyncio.wait_for(server.connect(), timeout)
+                    return None
+                except Exception as e:
+                    error = e
+                if attempt < retries:
+                    await asyncio.sleep(retry_delay)
+            return error
+
+        started = time.perf_counter()
+        eager = {name: s for name, s in self.servers.items() if not s.lazy}
+        results = await asyncio.gather(*(connect(s) for s in eager.values()))
+        self.startup_s = time.perf_counter() - started
+        return dict(zip(eager, results))
+
+    async def cleanup_all(self):
+        await asyncio.gather(*(s.cleanup() for s in self.servers.values()), return_exceptions=True)
+
+    def sessions(self) -> dict:
+        """{replica name: ClientSession} across the pool (for metrics and span instrumentation)"""
+        out = {}
+        for server in self.servers.values():
+            out.update(server.sessions())
+        return out
+
+    def summary(self) -> dict:
+        return {
+            "startup_s": self.startup_s and round(self.startup_s, 3),
+            "servers": {name: server.summary() for name, server in self.servers.items()}
+        }
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP mcp_pool_startup_seconds Wall time of the concurrent connect of all eager MCP servers",
+            "# TYPE mcp_pool_startup_seconds gauge",
+            f"mcp_pool_startup_seconds {self.startup_s or 0}",
+            "# HELP mcp_replica_startup_seconds Replica spawn + initialize (connect) and tools/list probe time",
+            "# TYPE mcp_replica_startup_seconds gauge",
+        ]
+        ready = ["# HELP mcp_replica_ready Replica passed its readiness probe",
+                 "# TYPE mcp_replica_ready gauge"]
+        for name, server in self.servers.items():
+            for replica in server.replicas:
+                labels = f'server="{name}",replica="{replica.server.name}",transport="{server.transport}"'
+                if replica.connect_s is not None:
+                    lines.append(f'mcp_replica_startup_seconds{{{labels},phase="connect"}} {replica.connect_s:.6f}')
+                if replica.probe_s is not None:
+                    lines.append(f'mcp_replica_startup_seconds{{{labels},phase="probe"}} {replica.probe_s:.6f}')
+                ready.append(f"mcp_replica_ready{{{labels}}} {int(replica.healthy)}")
+        return "\n".join(lines + ready) + "\n"
+
+
+MCP_POOL = MCPServerPool()
+
+
+# ===== SHARED SERVERS =====
+def orchestrator_server() -> PooledMCPServer:
+    """Orchestrator MCP; replicas share handoffs through the SQLite queue"""
+    return MCP_POOL.get(
+        "OrchestratorMCP", "mcp_servers/orchestrator_mcp/agent_orchestrator_mcp.py",
+        replicas=int(os.getenv("ORCHESTRATOR_MCP_REPLICAS", "1")),
+        cache_tools_list=True,
+        client_session_timeout_seconds=60      # wait_for_tasks long-polls up to timeout_s
+    )
+
+
+def domain_server() -> PooledMCPServer:
+    """agents_mcp.py; one process so ambulance and queue state is the same for every agent"""
+    return MCP_POOL.get("DomainMCP", "mcp_servers/core_agents_mcp/agents_mcp.py", cache_tools_list=True)
+
+
+def waste_server() -> PooledMCPServer:
+    """waste_mcp_tools.py; only the waste agent uses it, so it starts on first use"""
+    return MCP_POOL.get("WasteMCP", "mcp_servers/waste_mcp/waste_mcp_tools.py", lazy=True, cache_tools_list=True)
@@ -7,18 +7,21 @@ Reports: Delegated to report_generation_mcp_tool.py
 
 import os
 import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from mcp_servers import startup_profile    # first: MCP_STARTUP_PROFILE times every import below
 import json
 import time
 from datetime import datetime
 from functools import wraps
-from email.message import EmailMessage
-import smtplib
-import threading
 import asyncio
 
 # ===== MCP Server =====
 from mcp.server.fastmcp import FastMCP
 
+from mcp_servers.tool_metrics import ToolMetrics
+from mcp_servers.tool_cache import ToolCache
+from mcp_servers.spans import SpanRecorder, start_span, incoming_traceparent
+
 os.environ['MCP_CLIENT_TIMEOUT'] = '10'
 
 
@@ -42,6 +45,15 @@ def get_mongo():
     return mongo_client, db
 
 
+def get_docx():
+    global Document, Inches, Pt, RGBColor, WD_ALIGN_PARAGRAPH
+    if 'Document' not in globals():
+        from docx import Document
+        from docx.shared import Inches, Pt, RGBColor
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+    return Document, Inches, Pt, RGBColor, WD_ALIGN_PARAGRAPH
+
+
 def get_plotting():
     global pd, plt, matplotlib, io, base64
     if 'pd' not in globals():
@@ -72,6 +84,9 @@ debug_log("✅ NIH MCP initialized (Reports delegated to external tool)")
 
 # ===== TRACE LOG =====
 TRACE_LOG = []
+TOOL_METRICS = ToolMetrics("nih_mcp")
+TOOL_CACHE = ToolCache("nih_mcp")
+SPANS = SpanRecorder("nih_mcp")
 
 
 def log_trace(action: str, details: dict):
@@ -87,15 +102,22 @@ def log_trace(action: str, details: dict):
 def traced_tool(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        call_id = f"{func.__name__}-{int(time.time() * 1000)}"
-        log_trace("tool_start", {"tool": func.__name__, "call_id": call_id})
-        try:
-            result = func(*args, **kwargs)
-            log_trace("tool_success", {"tool": func.__name__, "call_id": call_id})
-            return result
-        except Exception as e:
-            log_trace("tool_error", {"tool": func.__name__, "error": str(e)})
-            raise
+        # Continue the caller's trace when the request carries a traceparent
+        parent = incoming_traceparent()
+        with start_span(func.__name__, "nih_mcp", SPANS if parent else None, traceparent=parent) as span:
+            call_id = f"{func.__name__}-{span.span_id}"
+            log_trace("tool_start", {"tool": func.__name__, "call_id": call_id, "trace_id": span.trace_id})
+            TOOL_METRICS.start(func.__name__)
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                TOOL_METRICS.finish(func.__name__, time.perf_counter() - started)
+                log_trace("tool_success", {"tool": func.__name__, "call_id": call_id})
+                return result
+            except Exception as e:
+                TOOL_METRICS.finish(func.__name__, time.perf_counter() - started, error=True)
+                log_trace("tool_error", {"tool": func.__name__, "error": str(e)})
+                raise
 
     return wrapper
 
@@ -711,6 +733,7 @@ def generate_who_proposal(research_area: str, national_data: dict) -> dict:
 
 @mcp.tool()
 @traced_tool
+@TOOL_CACHE.cached(ttl_s=3600)
 def list_nih_hospitals() -> dict:
     """List all hospitals in the system"""
     return {
@@ -724,6 +747,7 @@ def list_nih_hospitals() -> dict:
 
 @mcp.tool()
 @traced_tool
+@TOOL_CACHE.cached(ttl_s=3600)
 def list_nih_departments() -> dict:
     """List all departments in the system"""
     return {
@@ -929,11 +953,8 @@ def generate_who_funding_proposal(
     Returns:
         dict with file path and proposal details
     """
-    from docx import Document
-    from docx.shared import Inches, Pt, RGBColor
-    from docx.enum.text import WD_ALIGN_PARAGRAPH
-    import matplotlib.pyplot as plt
-    import io
+    Document, Inches, Pt, RGBColor, WD_ALIGN_PARAGRAPH = get_docx()
+    pd, plt, matplotlib, io, base64 = get_plotting()
 
     # Create document
     doc = Document()
@@ -1171,10 +1192,23 @@ def generate_who_funding_proposal(
     }
 
 
+@mcp.resource("metrics://tools")
+def tool_metrics():
+    """Per-tool latency histograms, error counts and in-flight calls"""
+    return json.dumps(TOOL_METRICS.snapshot())
+
+
+@mcp.resource("metrics://cache")
+def cache_metrics():
+    """Cached tool results: size, hits, misses and evictions per tool"""
+    return json.dumps(TOOL_CACHE.snapshot())
+
+
 if __name__ == "__main__":
     debug_log("🚀 NIH MCP Server Starting...")
     debug_log(f"✅ {len(HOSPITALS_LIST)} hospitals configured")
     debug_log(f"✅ {len(DEPARTMENTS)} departments configured")
     debug_log("📝 Reports delegated to: report_generation_mcp_tool.py")
+    startup_profile.mark_ready("nih_mcp")
     mcp.run()
 
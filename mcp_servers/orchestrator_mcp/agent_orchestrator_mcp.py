@@ -1,6 +1,9 @@
 # agent_orchestrator_mcp.py - Inter-Agent Communication Hub
+import asyncio
+import inspect
 import json
 import time
+from collections import deque
 from functools import wraps
 from datetime import datetime
 from mcp.server.fastmcp import FastMCP
@@ -8,6 +11,14 @@ import os
 # Add at top of EVERY MCP file:
 import sys
 os.environ['MCP_CLIENT_TIMEOUT'] = '10'
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from mcp_servers.spans import SpanRecorder, start_span, incoming_traceparent
+from mcp_servers.orchestrator_mcp.journal import ActionJournal
+from mcp_servers.orchestrator_mcp.handoff_queue import HandoffQueue
+from mcp_servers.orchestrator_mcp.handoff_store import HandoffStore
+from mcp_servers.orchestrator_mcp.capability_router import CapabilityRouter
+from mcp_servers.tool_cache import ToolCache
 def debug_log(msg):
     """Log to STDERR only (STDOUT reserved for MCP)"""
     print(msg, file=sys.stderr, flush=True)
@@ -139,15 +150,62 @@ AGENT_REGISTRY = {
     }
 }
 
-# ===== MESSAGE QUEUE =====
-MESSAGE_QUEUE = []
+# Reverse index capability -> agents; picks targets by live queue depth and handoff latency
+ROUTER = CapabilityRouter(AGENT_REGISTRY)
+# Registry lookups; a registry change must call ROUTER.rebuild() and TOOL_CACHE.invalidate()
+TOOL_CACHE = ToolCache("orchestrator_mcp")
+
+
+def record_handoff_latency(msg):
+    if msg.get("completed_at") and msg.get("created_at"):
+        ROUTER.record_completion(msg["to_agent"], msg["completed_at"] - msg["created_at"])
 
-# ===== HANDOFF HISTORY (for audit) =====
-HANDOFF_HISTORY = []
+
+# ===== MESSAGE QUEUE =====
+# Handoffs: per-agent priority heaps + id index + expiry wheel (see handoff_queue.py),
+# persisted to SQLite so pending handoffs survive restarts of this server
+HANDOFF_DB = os.getenv("ORCHESTRATOR_QUEUE_DB", "orchestrator_queue.db")
+HANDOFFS = HandoffQueue(store=HandoffStore(HANDOFF_DB), on_handoff=lambda msg: notify_task_waiters(msg),
+                        on_complete=record_handoff_latency,
+                        on_expire=lambda msg: log_orchestrator_action("handoff_expired", {
+                            "handoff_id": msg["handoff_id"],
+                            "from": msg["from_agent"],
+                            "to": msg["to_agent"],
+                            "task": msg["task_type"]
+                        }))
+debug_log(f"📦 Handoff queue: {HANDOFFS.stats['restored']} open handoffs restored from {HANDOFF_DB}")
+# Latest handoffs and direct/broadcast messages, for the queue resource
+MESSAGE_QUEUE = deque(maxlen=1000)
+MESSAGE_TOTALS = {"total": 0, "completed": 0, "handoffs": 0}
+
+# ===== HANDOFF HISTORY (for audit; full record is in the journal) =====
+HANDOFF_HISTORY = deque(maxlen=1000)
+
+
+def enqueue_message(message):
+    MESSAGE_QUEUE.append(message)
+    MESSAGE_TOTALS["total"] += 1
+
+
+# ===== TASK WAITERS (wait_for_tasks long-poll) =====
+TASK_WAITERS = {}          # agent -> futures of wait_for_tasks calls blocked on it
+WAIT_POLL_S = 0.025        # how often waiters look for handoffs written by other agents' orchestrators
+WAIT_POLL_MAX_S = 0.4      # ...backing off to this while the store doesn't change
+MAX_WAIT_S = 120
+
+
+def notify_task_waiters(msg):
+    """Wake wait_for_tasks calls for the handoff's target agent"""
+    for waiter in TASK_WAITERS.pop(msg["to_agent"], ()):
+        if not waiter.done():
+            waiter.set_result(None)
 
 # ===== TRACE LOGGING =====
-TRACE_LOG_FILE = "orchestrator_trace.json"
-trace_logs = []
+# Append-only journal (group commit + periodic compaction) instead of
+# rewriting the whole history on every action
+TRACE_LOG_PREFIX = "orchestrator_trace"
+JOURNAL = ActionJournal(TRACE_LOG_PREFIX, tail_size=500)
+trace_logs = JOURNAL.tail   # bounded in-memory view of the latest actions
 
 
 def log_orchestrator_action(action_type, data):
@@ -157,15 +215,41 @@ def log_orchestrator_action(action_type, data):
         "action_type": action_type,
         "data": data
     }
-    trace_logs.append(entry)
+    JOURNAL.append(entry)
+
+
+SPANS = SpanRecorder("orchestrator_mcp")
+
+
+def traced_tool(func):
+    """Record a span for tool calls that arrive with a traceparent"""
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            parent = incoming_traceparent()
+            if parent is None:
+                return await func(*args, **kwargs)
+            with start_span(func.__name__, "orchestrator_mcp", SPANS, traceparent=parent):
+                return await func(*args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        parent = incoming_traceparent()
+        if parent is None:
+            return func(*args, **kwargs)
+        with start_span(func.__name__, "orchestrator_mcp", SPANS, traceparent=parent):
+            return func(*args, **kwargs)
 
-    with open(TRACE_LOG_FILE, "w") as f:
-        json.dump(trace_logs, f, indent=2)
+    return wrapper
 
 
 # ===== INTER-AGENT COMMUNICATION TOOLS =====
 
 @mcp.tool()
+@traced_tool
 def handoff_to_agent(
         from_agent: str,
         to_agent: str,
@@ -201,7 +285,8 @@ def handoff_to_agent(
         }
 
     # Create handoff
-    handoff_id = f"HANDOFF-{int(time.time() * 1000)}"
+    # pid keeps ids unique across the agents' orchestrator processes (shared store)
+    handoff_id = f"HANDOFF-{int(time.time() * 1000)}-{os.getpid()}"
 
     handoff_message = {
         "handoff_id": handoff_id,
@@ -217,8 +302,11 @@ def handoff_to_agent(
     }
 
     # Add to queue
-    MESSAGE_QUEUE.append(handoff_message)
+    HANDOFFS.add(handoff_message)
+    handoff_id = handoff_message["handoff_id"]
+    enqueue_message(handoff_message)
     HANDOFF_HISTORY.append(handoff_message)
+    MESSAGE_TOTALS["handoffs"] += 1
 
     # Log action
     log_orchestrator_action("handoff_created", {
@@ -238,11 +326,12 @@ def handoff_to_agent(
         "to_agent_capabilities": AGENT_REGISTRY[to_agent]["capabilities"],
         "priority": priority,
         "message": f"Task handed off to {AGENT_REGISTRY[to_agent]['name']}",
-        "queue_position": len([m for m in MESSAGE_QUEUE if m["status"] == "pending"])
+        "queue_position": HANDOFFS.pending_count()
     }
 
 
 @mcp.tool()
+@traced_tool
 def check_my_tasks(agent_name: str) -> dict:
     """
     📥 Check pending handoffs for an agent
@@ -254,15 +343,8 @@ def check_my_tasks(agent_name: str) -> dict:
         List of pending handoffs
     """
 
-    # Get pending tasks
-    pending = [
-        msg for msg in MESSAGE_QUEUE
-        if msg["to_agent"] == agent_name and msg["status"] == "pending"
-    ]
-
-    # Sort by priority
-    priority_order = {"urgent": 0, "high": 1, "normal": 2, "low": 3}
-    pending.sort(key=lambda x: priority_order.get(x["priority"], 2))
+    # Get pending tasks, by priority then arrival
+    pending = HANDOFFS.pending_for(agent_name)
 
     # Log action
     log_orchestrator_action("tasks_checked", {
@@ -281,6 +363,107 @@ def check_my_tasks(agent_name: str) -> dict:
 
 
 @mcp.tool()
+@traced_tool
+def claim_tasks(agent_name: str, max_tasks: int = 5, visibility_timeout: int = 300) -> dict:
+    """
+    📬 Claim pending handoffs to work on (at-least-once delivery)
+
+    Claimed handoffs are hidden from other claims for visibility_timeout
+    seconds. Call complete_task when done; otherwise they become claimable
+    again and are delivered once more.
+
+    Args:
+        agent_name: Agent name (tracking, maternal, mental, etc.)
+        max_tasks: Maximum handoffs to claim
+        visibility_timeout: Seconds before an unfinished claim is released
+
+    Returns:
+        Claimed handoffs, highest priority first
+    """
+
+    claimed = HANDOFFS.claim(agent_name, max_tasks=max_tasks, visibility_s=visibility_timeout)
+
+    # Log action
+    log_orchestrator_action("tasks_claimed", {
+        "agent": agent_name,
+        "handoff_ids": [msg["handoff_id"] for msg in claimed]
+    })
+
+    return {
+        "agent": agent_name,
+        "claimed_count": len(claimed),
+        "tasks": claimed,
+        "visibility_timeout": visibility_timeout,
+        "claimed_at_iso": datetime.now().isoformat()
+    }
+
+
+@mcp.tool()
+@traced_tool
+async def wait_for_tasks(agent_name: str, timeout_s: float = 20, max_items: int = 5,
+                         visibility_timeout: int = 300) -> dict:
+    """
+    ⏳ Wait for handoffs instead of polling check_my_tasks
+
+    Returns as soon as a handoff for the agent is available (claimed as in
+    claim_tasks), or with no tasks after timeout_s. Keep timeout_s below
+    the client's MCP session timeout.
+
+    Args:
+        agent_name: Agent name (tracking, maternal, mental, etc.)
+        timeout_s: Maximum seconds to wait (capped at 120)
+        max_items: Maximum handoffs to return
+        visibility_timeout: Seconds before an unfinished claim is released
+
+    Returns:
+        Claimed handoffs, highest priority first, and how long the call waited
+    """
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + max(0.0, min(timeout_s, MAX_WAIT_S))
+
+    poll = WAIT_POLL_S
+    while True:
+        changed = HANDOFFS.refresh()
+        claimed = HANDOFFS.claim(agent_name, max_tasks=max_items, visibility_s=visibility_timeout)
+        remaining = deadline - loop.time()
+        if claimed or remaining <= 0:
+            break
+        waiter = loop.create_future()
+        TASK_WAITERS.setdefault(agent_name, set()).add(waiter)
+        try:
+            # Handoffs created in this process resolve the waiter at once;
+            # ones from other agents' orchestrators show up on the next poll
+            await asyncio.wait_for(waiter, min(remaining, poll))
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            TASK_WAITERS.get(agent_name, set()).discard(waiter)
+        # Nothing written to the store (PRAGMA data_version unchanged): look less often
+        poll = WAIT_POLL_S if changed else min(poll * 2, WAIT_POLL_MAX_S)
+
+    waited_ms = round((loop.time() - started) * 1000, 1)
+
+    # Log action
+    log_orchestrator_action("tasks_waited", {
+        "agent": agent_name,
+        "handoff_ids": [msg["handoff_id"] for msg in claimed],
+        "waited_ms": waited_ms
+    })
+
+    return {
+        "agent": agent_name,
+        "claimed_count": len(claimed),
+        "tasks": claimed,
+        "waited_ms": waited_ms,
+        "timed_out": not claimed,
+        "visibility_timeout": visibility_timeout
+    }
+
+
+@mcp.tool()
+@traced_tool
 def complete_task(handoff_id: str, result: dict, completed_by: str) -> dict:
     """
     ✅ Mark handoff as completed
@@ -295,39 +478,42 @@ def complete_task(handoff_id: str, result: dict, completed_by: str) -> dict:
     """
 
     # Find handoff
-    for msg in MESSAGE_QUEUE:
-        if msg["handoff_id"] == handoff_id:
-            msg["status"] = "completed"
-            msg["result"] = result
-            msg["completed_at"] = time.time()
-            msg["completed_at_iso"] = datetime.now().isoformat()
-            msg["completed_by"] = completed_by
-
-            # Log action
-            log_orchestrator_action("task_completed", {
-                "handoff_id": handoff_id,
-                "completed_by": completed_by,
-                "from_agent": msg["from_agent"],
-                "to_agent": msg["to_agent"]
-            })
+    msg = HANDOFFS.complete(
+        handoff_id,
+        result=result,
+        completed_at=time.time(),
+        completed_at_iso=datetime.now().isoformat(),
+        completed_by=completed_by
+    )
+    if msg is None:
+        return {
+            "status": "error",
+            "message": f"Handoff {handoff_id} not found"
+        }
+    MESSAGE_TOTALS["completed"] += 1
 
-            return {
-                "status": "success",
-                "handoff_id": handoff_id,
-                "completed_at": msg["completed_at"],
-                "completed_at_iso": msg["completed_at_iso"],
-                "completed_by": completed_by,
-                "result": result,
-                "message": f"Task completed by {AGENT_REGISTRY.get(completed_by, {}).get('name', completed_by)}"
-            }
+    # Log action
+    log_orchestrator_action("task_completed", {
+        "handoff_id": handoff_id,
+        "completed_by": completed_by,
+        "from_agent": msg["from_agent"],
+        "to_agent": msg["to_agent"]
+    })
 
     return {
-        "status": "error",
-        "message": f"Handoff {handoff_id} not found"
+        "status": "success",
+        "handoff_id": handoff_id,
+        "completed_at": msg["completed_at"],
+        "completed_at_iso": msg["completed_at_iso"],
+        "completed_by": completed_by,
+        "result": result,
+        "message": f"Task completed by {AGENT_REGISTRY.get(completed_by, {}).get('name', completed_by)}"
     }
 
 
 @mcp.tool()
+@traced_tool
+@TOOL_CACHE.cached(ttl_s=300)
 def query_agent_capabilities(agent_name: str) -> dict:
     """
     🔍 Check what an agent can do
@@ -352,6 +538,8 @@ def query_agent_capabilities(agent_name: str) -> dict:
         "agent_name": agent_name,
         "full_name": agent["name"],
         "capabilities": agent["capabilities"],
+        "shared_with": {cap: [a for a in ROUTER.agents_for(cap, active_only=False) if a != agent_name]
+                        for cap in agent["capabilities"] if len(ROUTER.index.get(cap, [])) > 1},
         "status": agent["status"],
         "available": agent["status"] == "active",
         "registered_at": agent.get("registered_at")
@@ -359,6 +547,53 @@ def query_agent_capabilities(agent_name: str) -> dict:
 
 
 @mcp.tool()
+@traced_tool
+def route_by_capability(
+        from_agent: str,
+        capability: str,
+        context: dict,
+        task_type: str = None,
+        priority: str = "normal"
+) -> dict:
+    """
+    🧭 Handoff a task to whichever agent serves a capability, least loaded first
+
+    Args:
+        from_agent: Source agent
+        capability: Required capability (e.g. dispatch_nearest_ambulance)
+        context: Task context (patient_id, location, emergency_type, etc.)
+        task_type: Type of task (defaults to the capability)
+        priority: urgent, high, normal, low
+
+    Returns:
+        Handoff confirmation plus the scored candidates
+    """
+
+    HANDOFFS.refresh()      # queue depths include other agents' orchestrators
+    target, candidates = ROUTER.pick(capability, HANDOFFS.pending_count)
+    if target is None:
+        return {
+            "status": "error",
+            "message": f"No active agent offers capability '{capability}'",
+            "available_capabilities": sorted(ROUTER.index)
+        }
+
+    result = handoff_to_agent(from_agent, target, task_type or capability, context, priority)
+    result["routing"] = {"capability": capability, "selected": target, "candidates": candidates}
+
+    # Log action
+    log_orchestrator_action("handoff_routed", {
+        "handoff_id": result.get("handoff_id"),
+        "capability": capability,
+        "to": target,
+        "candidates": len(candidates)
+    })
+
+    return result
+
+
+@mcp.tool()
+@traced_tool
 def get_agent_status(agent_name: str = None) -> dict:
     """
     📊 Get status of one or all hospital_agents
@@ -388,6 +623,7 @@ def get_agent_status(agent_name: str = None) -> dict:
 
 
 @mcp.tool()
+@traced_tool
 def send_agent_message(
         from_agent: str,
         to_agent: str,
@@ -426,7 +662,7 @@ def send_agent_message(
         "created_at_iso": datetime.now().isoformat()
     }
 
-    MESSAGE_QUEUE.append(agent_message)
+    enqueue_message(agent_message)
 
     # Log action
     log_orchestrator_action("message_sent", {
@@ -445,6 +681,7 @@ def send_agent_message(
 
 
 @mcp.tool()
+@traced_tool
 def broadcast_message(
         from_agent: str,
         message: str,
@@ -472,7 +709,7 @@ def broadcast_message(
     sent_count = 0
     for agent in target_agents:
         if agent in AGENT_REGISTRY and agent != from_agent:
-            MESSAGE_QUEUE.append({
+            enqueue_message({
                 "message_id": f"{broadcast_id}-{agent}",
                 "broadcast_id": broadcast_id,
                 "from_agent": from_agent,
@@ -507,10 +744,11 @@ def broadcast_message(
 def message_queue_resource():
     """📨 View current message queue"""
     return {
-        "total_messages": len(MESSAGE_QUEUE),
-        "pending": len([m for m in MESSAGE_QUEUE if m.get("status") == "pending"]),
-        "completed": len([m for m in MESSAGE_QUEUE if m.get("status") == "completed"]),
-        "recent_messages": MESSAGE_QUEUE[-10:]  # Last 10
+        "total_messages": MESSAGE_TOTALS["total"],
+        "pending": HANDOFFS.pending_count(),
+        "completed": MESSAGE_TOTALS["completed"],
+        "handoffs": HANDOFFS.summary(),
+        "recent_messages": list(MESSAGE_QUEUE)[-10:]  # Last 10
     }
 
 
@@ -518,11 +756,35 @@ def message_queue_resource():
 def handoff_history_resource():
     """📜 View handoff history"""
     return {
-        "total_handoffs": len(HANDOFF_HISTORY),
-        "recent_handoffs": HANDOFF_HISTORY[-20:]  # Last 20
+        "total_handoffs": MESSAGE_TOTALS["handoffs"],
+        "recent_handoffs": list(HANDOFF_HISTORY)[-20:]  # Last 20
+    }
+
+
+@mcp.resource("trace://orchestrator/journal")
+def journal_resource():
+    """🧾 Orchestrator action journal: counters and latest actions"""
+    return {
+        **JOURNAL.summary(),
+        "recent_actions": list(trace_logs)[-20:]
     }
 
 
+@mcp.resource("trace://orchestrator/capabilities")
+def capabilities_resource():
+    """🧭 Capability -> agents index and routing load estimates"""
+    return {
+        **ROUTER.summary(),
+        "index": ROUTER.index
+    }
+
+
+@mcp.resource("metrics://cache")
+def cache_resource():
+    """🗃️ Cached tool results: size, hits, misses and evictions per tool"""
+    return TOOL_CACHE.snapshot()
+
+
 @mcp.resource("trace://orchestrator/hospital_agents")
 def agents_registry_resource():
     """👥 View agent registry"""
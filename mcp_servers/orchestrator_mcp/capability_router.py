@@ -0,0 +1,95 @@
+# capability_router.py - Capability -> agents index with load-aware target selection
+"""
+AGENT_REGISTRY is keyed by agent; this keeps the reverse index
+(capability -> agents that list it) so a caller can ask for a capability
+instead of naming the target.
+
+When several active agents serve a capability, pick() takes the one with
+the lowest expected wait:
+
+    (pending handoffs + 1) * recent handoff latency
+
+Latency is an EWMA of created -> completed time per agent, fed by
+record_completion(). Agents with no completions yet use the mean of the
+known estimates (or default_latency_s). Ties go round-robin, so equally
+idle agents share the work.
+"""
+
+from itertools import count
+
+
+class CapabilityRouter:
+    def __init__(self, registry: dict, alpha: float = 0.2, default_latency_s: float = 30.0):
+        self.registry = registry
+        self.alpha = alpha
+        self.default_latency_s = default_latency_s
+        self.latency = {}          # agent -> EWMA seconds from handoff created to completed
+        self.index = {}
+        self._turn = count()
+        self.stats = {"routed": 0, "unroutable": 0, "latency_samples": 0}
+        self.rebuild()
+
+    # ===== INDEX =====
+    def rebuild(self):
+        """Re-derive the capability index (call after the registry changes)"""
+        index = {}
+        for agent, info in self.registry.items():
+            for capability in info.get("capabilities", []):
+                index.setdefault(capability, []).append(agent)
+        self.index = index
+
+    def agents_for(self, capability: str, active_only: bool = True) -> list:
+        agents = self.index.get(capability, [])
+        if not active_only:
+            return list(agents)
+        return [agent for agent in agents if self.registry[agent]["status"] == "active"]
+
+    # ===== LOAD =====
+    def record_completion(self, agent: str, latency_s: float):
+        if latency_s < 0:
+            return
+        previous = self.latency.get(agent)
+        self.latency[agent] = latency_s if previous is None else previous + self.alpha * (latency_s - previous)
+        self.stats["latency_samples"] += 1
+
+    def expected_latency(self, agent: str) -> float:
+        if agent in self.latency:
+            return self.latency[agent]
+        if self.latency:
+            return sum(self.latency.values()) / len(self.latency)
+        return self.default_latency_s
+
+    def pick(self, capability: str, pending_count) -> tuple:
+        """
+        (agent or None, candidates) for a capability. pending_count(agent)
+        gives the live queue depth; candidates are scored, best first.
+        """
+        agents = self.agents_for(capability)
+        if not agents:
+            self.stats["unroutable"] += 1
+            return None, []
+
+        turn = next(self._turn)
+        scored = []
+        for i, agent in enumerate(agents):
+            pending = pending_count(agent)
+            latency = self.expected_latency(agent)
+            wait = (pending + 1) * latency
+            scored.append((wait, (i - turn) % len(agents), {
+                "agent": agent,
+                "pending": pending,
+                "latency_s": round(latency, 3),
+                "expected_wait_s": round(wait, 3)
+            }))
+        scored.sort(key=lambda entry: entry[:2])
+        candidates = [entry[2] for entry in scored]
+        self.stats["routed"] += 1
+        return candidates[0]["agent"], candidates
+
+    def summary(self) -> dict:
+        return {
+            "capabilities": len(self.index),
+            "shared_capabilities": {cap: agents for cap, agents in self.index.items() if len(agents) > 1},
+            "latency_s": {agent: round(v, 3) for agent, v in self.latency.items()},
+            **self.stats
+        }
@@ -0,0 +1,313 @@
+# handoff_queue.py - Indexed handoff queue for the orchestrator MCP
+"""
+Replaces scanning the whole MESSAGE_QUEUE list on every call:
+
+    by_id      dict handoff_id -> message            complete_task in O(1)
+    heaps      agent -> [(rank, seq, handoff_id)]    check_my_tasks in O(k log n) for that agent only
+    visible    agent -> [(rank, seq, handoff_id)]    claim() pops unleased handoffs without copying
+    leases     agent -> [(lease_until, rank, seq, id)] leased ones, back to `visible` when the lease runs out
+    counters   pending per agent + total             queue_position in O(1)
+    wheel      slot -> handoff ids expiring there    expiry without scanning
+
+Heaps use lazy deletion: completed/expired entries stay in the heap until
+they surface or until stale entries outnumber live ones, then the heap is
+rebuilt. An idle claim() (nothing visible, no lease run out) touches no
+heap entries at all. Finished handoffs stay addressable in `by_id` for the last
+`keep_finished` completions/expiries, then are forgotten (the journal has
+the full record).
+
+claim() leases visible handoffs for a visibility timeout (at-least-once:
+a lease that runs out without complete() makes the handoff claimable
+again). With a HandoffStore every state change is persisted and open
+handoffs are restored on start, and the lease itself is taken in the
+database (HandoffStore.lease), so another process holding the same
+handoff can't lease it too.
+
+Every agent has its own orchestrator process, so refresh() also merges
+handoffs written to the store by the other processes. States only move
+forward: unknown pending rows are indexed, a finished row retires a
+local pending one, and leases keep the latest expiry. on_complete fires
+for completions made here or synced from another process.
+"""
+
+import heapq
+import time
+from collections import deque
+
+PRIORITY_RANK = {"urgent": 0, "high": 1, "normal": 2, "low": 3}
+
+
+class HandoffQueue:
+    def __init__(self, slot_s: float = 1.0, slots: int = 4096, keep_finished: int = 1000,
+                 on_expire=None, on_handoff=None, on_complete=None, store=None):
+        self.slot_s = slot_s
+        self.slots = slots
+        self.on_expire = on_expire
+        self.on_handoff = on_handoff
+        self.on_complete = on_complete
+        self.store = store
+        self.by_id = {}
+        self.seq = 0
+        self.pending_total = 0
+        self.stats = {"created": 0, "completed": 0, "expired": 0, "claimed": 0, "redelivered": 0, "restored": 0, "synced": 0}
+
+        self._heaps = {}
+        self._visible = {}
+        self._leases = {}
+        self._pending = {}           # agent -> live pending count
+        self._stale = {}             # agent -> finished entries still in its heap
+        self._wheel = [[] for _ in range(slots)]
+        self._tick = int(time.time() / slot_s)
+        self._finished = deque()
+        self._keep_finished = keep_finished
+        self._seq_of = {}            # handoff_id -> arrival seq (persisted with the row)
+        if store is not None:
+            self.restore()
+
+    # ===== ENQUEUE =====
+    def add(self, msg: dict) -> dict:
+        """Index a pending handoff (needs handoff_id, to_agent, priority, expires_at)"""
+        self.refresh()
+        self.seq += 1
+        if msg["handoff_id"] in self.by_id:
+            msg["handoff_id"] = f"{msg['handoff_id']}-{self.seq}"    # same-millisecond ids
+        self._index(msg, self.seq)
+        self.stats["created"] += 1
+        if self.store is not None:
+            # Durable before the caller reports the handoff as created
+            self.store.put(msg, self.seq, wait=True)
+        if self.on_handoff is not None:
+            self.on_handoff(msg)
+        return msg
+
+    def _index(self, msg: dict, seq: int):
+        agent = msg["to_agent"]
+        self.by_id[msg["handoff_id"]] = msg
+        self._seq_of[msg["handoff_id"]] = seq
+        entry = (PRIORITY_RANK.get(msg.get("priority"), 2), seq, msg["handoff_id"])
+        heapq.heappush(self._heaps.setdefault(agent, []), entry)
+        # A restored/synced lease is noticed when the entry surfaces in claim()
+        heapq.heappush(self._visible.setdefault(agent, []), entry)
+        self._pending[agent] = self._pending.get(agent, 0) + 1
+        self.pending_total += 1
+
+        expires_at = msg.get("expires_at")
+        if expires_at is not None:
+            due = max(int(expires_at / self.slot_s), self._tick + 1)
+            self._wheel[due % self.slots].append(msg["handoff_id"])
+
+    def restore(self):
+        """Re-index open handoffs from the store (leases are kept as persisted)"""
+        self.seq = max(self.seq, self.store.max_seq())
+        for seq, msg in self.store.load_open():
+            if msg["handoff_id"] not in self.by_id:
+                self._index(msg, seq)
+                self.stats["restored"] += 1
+        self.advance()
+
+    def refresh(self) -> bool:
+        """Pull handoff changes made by other processes, then run expiry; True if the store changed"""
+        changed = False
+        if self.store is not None:
+            for seq, row in self.store.changes():
+                self._merge(row, seq)
+                changed = True
+        self.advance()
+        return changed
+
+    def _merge(self, row: dict, seq: int):
+        local = self.by_id.get(row["handoff_id"])
+        if local is None:
+            if row["status"] == "pending":
+                self.seq = max(self.seq, seq)
+                self._index(row, seq)
+                self.stats["synced"] += 1
+                if self.on_handoff is not None:
+                    self.on_handoff(row)
+            return
+        if local["status"] != "pending":
+            return
+        if row["status"] != "pending":
+            local.update(row)
+            self._retire(local)
+            if local["status"] == "completed" and self.on_complete is not None:
+                self.on_complete(local)
+            return
+        if row.get("lease_until", 0) > local.get("lease_until", 0):
+            local["lease_until"] = row["lease_until"]
+        local["deliveries"] = max(local.get("deliveries", 0), row.get("deliveries", 0))
+
+    def _persist(self, msg: dict):
+        if self.store is not None:
+            self.store.put(msg, self._seq_of.get(msg["handoff_id"], 0))
+
+    # ===== READ =====
+    def get(self, handoff_id: str):
+        return self.by_id.get(handoff_id)
+
+    def pending_count(self, agent: str = None) -> int:
+        return self.pending_total if agent is None else self._pending.get(agent, 0)
+
+    def pending_for(self, agent: str, limit: int = None) -> list:
+        """Pending handoffs for an agent by priority, then arrival (leased ones included)"""
+        self.refresh()
+        heap = self._heaps.get(agent)
+        if not heap:
+            return []
+        live = self._pending.get(agent, 0)
+        want = live if limit is None else min(limit, live)
+        # At most `stale` of the smallest entries can be dead ones
+        entries = heapq.nsmallest(want + self._stale.get(agent, 0), heap)
+        out = []
+        for _, _, handoff_id in entries:
+            msg = self.by_id.get(handoff_id)
+            if msg is not None and msg["status"] == "pending":
+                out.append(msg)
+                if len(out) >= want:
+                    break
+        return out
+
+    def claim(self, agent: str, max_tasks: int = 1, visibility_s: float = 300.0, now: float = None) -> list:
+        """
+        Lease up to max_tasks visible handoffs (highest priority first) for
+        visibility_s seconds; they are hidden from other claims until the
+        lease runs out or complete() is called
+        """
+        now = time.time() if now is None else now
+        self.refresh()
+        visible = self._take_visible(agent, max_tasks, now)
+        if not visible:
+            return []
+        if self.store is not None:
+            # The local copy may be behind another process's lease; the database decides
+            rows = self.store.lease([msg["handoff_id"] for msg in visible], now + visibility_s, now, max_tasks)
+            claimed = []
+            for row in rows:
+                msg = self.by_id[row["handoff_id"]]
+                msg["lease_until"], msg["deliveries"] = row["lease_until"], row["deliveries"]
+                claimed.append(msg)
+            # Lost to another process: back in line until its lease is synced
+            won = {msg["handoff_id"] for msg in claimed}
+            for msg in visible:
+                if msg["handoff_id"] not in won:
+                    heapq.heappush(self._visible[agent], self._entry(msg))
+        else:
+            claimed = visible
+            for msg in claimed:
+                msg["deliveries"] = msg.get("deliveries", 0) + 1
+                msg["lease_until"] = now + visibility_s
+        for msg in claimed:
+            heapq.heappush(self._leases.setdefault(agent, []), (msg["lease_until"],) + self._entry(msg))
+        self.stats["redelivered"] += sum(1 for msg in claimed if msg["deliveries"] > 1)
+        self.stats["claimed"] += len(claimed)
+        return claimed
+
+    def _entry(self, msg: dict) -> tuple:
+        return PRIORITY_RANK.get(msg.get("priority"), 2), self._seq_of.get(msg["handoff_id"], 0), msg["handoff_id"]
+
+    def _take_visible(self, agent: str, limit: int, now: float) -> list:
+        """Pop up to `limit` pending, unleased handoffs (best first) off the agent's claim heap"""
+        visible = self._visible.setdefault(agent, [])
+        leases = self._leases.get(agent)
+        while leases and leases[0][0] <= now:
+            _, rank, seq, handoff_id = heapq.heappop(leases)
+            msg = self.by_id.get(handoff_id)
+            if msg is None or msg["status"] != "pending":
+                continue
+            if msg.get("lease_until", 0) > now:
+                heapq.heappush(leases, (msg["lease_until"], rank, seq, handoff_id))    # lease was extended
+            else:
+                heapq.heappush(visible, (rank, seq, handoff_id))
+
+        out = []
+        while visible and len(out) < limit:
+            rank, seq, handoff_id = heapq.heappop(visible)
+            msg = self.by_id.get(handoff_id)
+            if msg is None or msg["status"] != "pending":
+                continue
+            if msg.get("lease_until", 0) > now:
+                heapq.heappush(self._leases.setdefault(agent, []), (msg["lease_until"], rank, seq, handoff_id))
+                continue
+            out.append(msg)
+        return out
+
+    # ===== FINISH =====
+    def complete(self, handoff_id: str, **fields):
+        """Mark a handoff completed; returns the message or None if unknown"""
+        self.refresh()
+        msg = self.by_id.get(handoff_id)
+        if msg is None:
+            return None
+        was_pending = msg["status"] == "pending"
+        msg.update(fields)
+        msg["status"] = "completed"
+        msg.pop("lease_until", None)
+        self._persist(msg)
+        if was_pending:
+            self._retire(msg)
+            if self.on_complete is not None:
+                self.on_complete(msg)
+        self.stats["completed"] += 1
+        return msg
+
+    def _retire(self, msg: dict):
+        """A pending message just finished: update counters, schedule its heap entry for cleanup"""
+        agent = msg["to_agent"]
+        self._pending[agent] -= 1
+        self.pending_total -= 1
+        self._stale[agent] = self._stale.get(agent, 0) + 1
+        if self._stale[agent] > self._pending[agent] + 16:
+            live = lambda handoff_id: self.by_id.get(handoff_id, {}).get("status") == "pending"
+            self._heaps[agent] = [e for e in self._heaps[agent] if live(e[2])]
+            self._visible[agent] = [e for e in self._visible.get(agent, []) if live(e[2])]
+            self._leases[agent] = [e for e in self._leases.get(agent, []) if live(e[3])]
+            for heap in (self._heaps[agent], self._visible[agent], self._leases[agent]):
+                heapq.heapify(heap)
+            self._stale[agent] = 0
+
+        self._finished.append(msg["handoff_id"])
+        if len(self._finished) > self._keep_finished:
+            forgotten = self._finished.popleft()
+            self.by_id.pop(forgotten, None)
+            self._seq_of.pop(forgotten, None)
+
+    # ===== EXPIRY =====
+    def advance(self, now: float = None):
+        """Expire handoffs whose expires_at has passed; only visits elapsed wheel slots"""
+        now = time.time() if now is None else now
+        tick = int(now / self.slot_s)
+        if tick <= self._tick:
+            return
+        # More than one revolution behind: every slot is due once
+        start = max(self._tick + 1, tick - self.slots + 1)
+        for t in range(start, tick + 1):
+            slot = self._wheel[t % self.slots]
+            if not slot:
+                continue
+            keep = []
+            for handoff_id in slot:
+                msg = self.by_id.get(handoff_id)
+                if msg is None or msg["status"] != "pending":
+                    continue
+                if msg["expires_at"] > now:
+                    keep.append(handoff_id)     # due on a later revolution
+                    continue
+                msg["status"] = "expired"
+                msg["expired_at"] = now
+                msg.pop("lease_until", None)
+                self._persist(msg)
+                self._retire(msg)
+                self.stats["expired"] += 1
+                if self.on_expire is not None:
+                    self.on_expire(msg)
+            self._wheel[t % self.slots] = keep
+        self._tick = tick
+
+    def summary(self) -> dict:
+        return {
+            "pending": self.pending_total,
+            "pending_by_agent": {agent: n for agent, n in self._pending.items() if n},
+            "indexed": len(self.by_id),
+            **self.stats,
+            **({"store": self.store.summary()} if self.store is not None else {})
+        }
@@ -0,0 +1,227 @@
+# handoff_store.py - SQLite (WAL) persistence for the orchestrator handoff queue
+"""
+HandoffQueue stays the in-memory index; this store makes it survive
+restarts of agent_orchestrator_mcp.py (MCPServerStdio restarts it with
+the parent process).
+
+Every state change is an upsert of the full handoff row (finished rows are
+not reopened). Writes are queued
+and a single writer thread commits everything queued since its last pass
+in one transaction (executemany on one prepared statement), so concurrent
+callers share a commit. put(..., wait=True) blocks until its row is
+committed; the queue uses that for new handoffs, so a handoff reported as
+created is on disk. Completions and leases are committed without waiting:
+losing one to a crash means the handoff is delivered again (at-least-once).
+
+journal_mode=WAL + synchronous=NORMAL: committed rows survive a process
+crash; an OS crash can lose the last few commits.
+
+Each agent runs its own orchestrator subprocess on the same database, so
+every upsert also takes the next `change_seq` (under BEGIN IMMEDIATE, so
+it is unique across processes). changes() returns the rows upserted by
+any process since the last call; it costs one `PRAGMA data_version` when
+nothing changed.
+
+Leases don't go through the writer queue: lease() is one conditional
+UPDATE per handoff (still pending, lease_until passed) under BEGIN
+IMMEDIATE, committed before it returns, so two processes can't both lease
+the same handoff.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS handoffs (
+    handoff_id  TEXT PRIMARY KEY,
+    queue_seq   INTEGER NOT NULL,
+    to_agent    TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    expires_at  REAL,
+    updated_at  REAL NOT NULL,
+    body        TEXT NOT NULL,
+    change_seq  INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS handoffs_status ON handoffs (status, updated_at);
+"""
+
+# Finished rows are final: a late lease from another process can't reopen them
+UPSERT = ("INSERT INTO handoffs (handoff_id, queue_seq, to_agent, status, expires_at, updated_at, body, change_seq, lease_until) "
+          "VALUES (?, ?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(change_seq), 0) + 1 FROM handoffs), ?) "
+          "ON CONFLICT(handoff_id) DO UPDATE SET status = excluded.status, expires_at = excluded.expires_at, "
+          "updated_at = excluded.updated_at, body = excluded.body, change_seq = excluded.change_seq, "
+          "lease_until = excluded.lease_until "
+          "WHERE handoffs.status = 'pending'")
+
+# Only one process can win a lease: the row must still be pending and unleased at commit time
+LEASE = ("UPDATE handoffs SET lease_until = ?1, updated_at = ?2, "
+         "body = json_set(body, '$.lease_until', ?1, "
+         "'$.deliveries', COALESCE(json_extract(body, '$.deliveries'), 0) + 1), "
+         "change_seq = (SELECT COALESCE(MAX(change_seq), 0) + 1 FROM handoffs) "
+         "WHERE handoff_id = ?3 AND status = 'pending' AND COALESCE(lease_until, 0) <= ?2 "
+         "RETURNING body")
+
+
+class HandoffStore:
+    def __init__(self, path: str, retention_s: float = 7 * 86400, prune_every: int = 1000):
+        self.path = path
+        self.retention_s = retention_s
+        self.prune_every = prune_every
+        self.stats = {"commits": 0, "rows_written": 0, "leases": 0, "pruned": 0, "errors": 0}
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(handoffs)")}
+        if "change_seq" not in columns:
+            self._conn.execute("ALTER TABLE handoffs ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0")
+        if "lease_until" not in columns:
+            self._conn.execute("ALTER TABLE handoffs ADD COLUMN lease_until REAL")
+            self._conn.execute("UPDATE handoffs SET lease_until = json_extract(body, '$.lease_until') "
+                               "WHERE status = 'pending'")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS handoffs_change ON handoffs (change_seq)")
+        # Readers get their own connection; the writer thread owns self._conn
+        self._read = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._lease = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._lease_lock = threading.Lock()
+        self._data_version = None
+        self._last_change = 0
+
+        self._cond = threading.Condition()
+        self._pending = {}           # handoff_id -> row (later state supersedes earlier)
+        self._queued = 0             # put() calls so far
+        self._committed = 0          # put() calls covered by a commit
+        self._writer = threading.Thread(target=self._commit_loop, name="handoff-store", daemon=True)
+        self._writer.start()
+
+    # ===== LOAD =====
+    def load_open(self) -> list:
+        """Pending handoffs (leased or not) in arrival order, for HandoffQueue.restore"""
+        self._data_version = self._read.execute("PRAGMA data_version").fetchone()[0]
+        self._last_change = self._read.execute("SELECT COALESCE(MAX(change_seq), 0) FROM handoffs").fetchone()[0]
+        rows = self._read.execute(
+            "SELECT queue_seq, body FROM handoffs WHERE status = 'pending' ORDER BY queue_seq"
+        ).fetchall()
+        return [(seq, json.loads(body)) for seq, body in rows]
+
+    def max_seq(self) -> int:
+        return self._read.execute("SELECT COALESCE(MAX(queue_seq), 0) FROM handoffs").fetchone()[0]
+
+    def changes(self) -> list:
+        """[(queue_seq, handoff)] upserted since the last call (ours included), oldest change first"""
+        version = self._read.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return []
+        self._data_version = version
+        rows = self._read.execute(
+            "SELECT change_seq, queue_seq, body FROM handoffs WHERE change_seq > ? ORDER BY change_seq",
+            (self._last_change,)
+        ).fetchall()
+        if rows:
+            self._last_change = rows[-1][0]
+        return [(seq, json.loads(body)) for _, seq, body in rows]
+
+    # ===== WRITE =====
+    def put(self, msg: dict, queue_seq: int, wait: bool = False, timeout: float = 5.0) -> bool:
+        """Queue an upsert of the handoff's current state; wait=True blocks until committed"""
+        row = (msg["handoff_id"], queue_seq, msg["to_agent"], msg["status"], msg.get("expires_at"),
+               time.time(), json.dumps(msg, default=str), msg.get("lease_until"))
+        with self._cond:
+            self._pending[msg["handoff_id"]] = row
+            self._queued += 1
+            ticket = self._queued
+            self._cond.notify_all()
+            if not wait:
+                return True
+            deadline = time.monotonic() + timeout
+            while self._committed < ticket:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def lease(self, handoff_ids: list, lease_until: float, now: float, limit: int) -> list:
+        """
+        Lease up to `limit` of the given handoffs (in order) that are still
+        pending and unleased in the database; returns their committed rows
+        """
+        leased = []
+        with self._lease_lock:
+            try:
+                self._lease.execute("BEGIN IMMEDIATE")
+                for handoff_id in handoff_ids:
+                    row = self._lease.execute(LEASE, (lease_until, now, handoff_id)).fetchone()
+                    if row is not None:
+                        leased.append(json.loads(row[0]))
+                        if len(leased) >= limit:
+                            break
+                self._lease.execute("COMMIT")
+            except sqlite3.Error:
+                self.stats["errors"] += 1
+                try:
+                    self._lease.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                return []
+        self.stats["leases"] += len(leased)
+        return leased
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        with self._cond:
+            ticket = self._queued
+            deadline = time.monotonic() + timeout
+            while self._committed < ticket:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _commit_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                rows, self._pending = list(self._pending.values()), {}
+                ticket = self._queued
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.executemany(UPSERT, rows)
+                self._conn.execute("COMMIT")
+                self.stats["commits"] += 1
+                self.stats["rows_written"] += len(rows)
+                if self.stats["commits"] % self.prune_every == 0:
+                    self._prune()
+            except sqlite3.Error:
+                self.stats["errors"] += 1
+                try:
+                    self._conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                # Put the rows back unless a newer state was queued meanwhile
+                with self._cond:
+                    for row in rows:
+                        self._pending.setdefault(row[0], row)
+                time.sleep(0.1)
+                continue
+            with self._cond:
+                self._committed = ticket
+                self._cond.notify_all()
+
+    def _prune(self):
+        """Drop finished handoffs past retention (the action journal keeps the full record)"""
+        cursor = self._conn.execute(
+            "DELETE FROM handoffs WHERE status != 'pending' AND updated_at < ?",
+            (time.time() - self.retention_s,)
+        )
+        self.stats["pruned"] += cursor.rowcount
+
+    def summary(self) -> dict:
+        with self._cond:
+            backlog = len(self._pending)
+        return {"path": self.path, "backlog": backlog, **self.stats}
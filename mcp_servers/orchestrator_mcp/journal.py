@@ -0,0 +1,269 @@
+# journal.py - Append-only action journal for the orchestrator MCP
+"""
+Replaces rewriting the whole orchestrator trace file on every action.
+
+    <prefix>.journal          NDJSON, one action per line (append only)
+    <prefix>.snapshot.json    compacted state: last seq, counts, recent tail
+    <prefix>.<a>-<b>.ndjson   archived journal segments (never rewritten)
+    <prefix>.lock             flock'd by writers; holds the last seq and the
+                              first seq still in the journal
+
+append() is O(1): it updates the in-memory tail and counters and queues
+the line. A background thread group-commits everything queued since its
+last pass with one write + fsync. Every `compact_every` journal lines the
+snapshot is rewritten (its size is bounded by the tail) and the journal is
+moved to an archive segment, so restart cost and per-call cost stay flat
+however long the history gets.
+
+Several orchestrator processes share these files (one per agent, plus
+pool replicas). Commits, compaction and recovery run under an exclusive
+flock on the lock file: sequence numbers are assigned there, at commit
+time, so they are unique across processes; compaction folds the journal
+on disk (every process's lines) into the snapshot; a process whose
+journal was archived by another reopens the new one before writing. The
+in-memory tail and counts are this process's view: what it recovered at
+start plus its own actions.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:         # no flock (Windows): only safe with a single writer process
+    fcntl = None
+
+
+class ActionJournal:
+    def __init__(self, prefix: str, tail_size: int = 500, commit_interval_s: float = 0.05,
+                 compact_every: int = 10_000, keep_archives: int = 50):
+        prefix = os.path.abspath(prefix)
+        self.journal_path = prefix + ".journal"
+        self.snapshot_path = prefix + ".snapshot.json"
+        self.lock_path = prefix + ".lock"
+        self.prefix = prefix
+        self.commit_interval_s = commit_interval_s
+        self.compact_every = compact_every
+        self.keep_archives = keep_archives
+
+        self.tail = deque(maxlen=tail_size)
+        self.counts = {}
+        self.seq = 0                 # highest seq this process has seen (recovered or committed)
+        self.stats = {"commits": 0, "committed": 0, "compactions": 0, "recovered": 0}
+
+        self._pending = []
+        self._cond = threading.Condition()
+        self._appended = 0
+        self._committed = 0
+        self._lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._file = None
+        with self._locked():
+            self._recover()
+        self._writer = threading.Thread(target=self._commit_loop, name="journal-writer", daemon=True)
+        self._writer.start()
+
+    # ===== CROSS-PROCESS LOCK =====
+    @contextmanager
+    def _locked(self):
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _read_counters(self):
+        """(last seq, first seq in the journal or None) from the lock file; None if unreadable"""
+        raw = os.pread(self._lock_fd, 256, 0)
+        try:
+            state = json.loads(raw)
+            return state["seq"], state["journal_first"]
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def _write_counters(self, seq: int, journal_first):
+        data = json.dumps({"seq": seq, "journal_first": journal_first}).encode()
+        os.pwrite(self._lock_fd, data, 0)
+        os.ftruncate(self._lock_fd, len(data))
+
+    def _open_journal(self):
+        """(Re)open the journal if another process moved it to an archive"""
+        try:
+            current = os.stat(self.journal_path).st_ino
+        except OSError:
+            current = None
+        if self._file is None or current != os.fstat(self._file.fileno()).st_ino:
+            if self._file is not None:
+                self._file.close()
+            self._file = open(self.journal_path, "a+", encoding="utf-8")   # readable: _commit checks the last byte
+
+    # ===== RECOVERY =====
+    def _read_disk(self) -> dict:
+        """Snapshot + journal replay (caller holds the lock)"""
+        seq, counts, tail = 0, {}, deque(maxlen=self.tail.maxlen)
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+            seq = snap.get("seq", 0)
+            counts = snap.get("counts", {})
+            tail.extend(snap.get("tail", []))
+        except (OSError, ValueError):
+            pass
+
+        snapshot_seq, first_seq, replayed = seq, None, 0
+        try:
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue    # torn line from a crash mid-write
+                    if entry.get("seq", 0) <= snapshot_seq:
+                        continue    # already folded into the snapshot
+                    seq = max(seq, entry.get("seq", 0))
+                    tail.append(entry)
+                    kind = entry.get("action_type", "unknown")
+                    counts[kind] = counts.get(kind, 0) + 1
+                    if first_seq is None:
+                        first_seq = entry["seq"]
+                    replayed += 1
+        except OSError:
+            pass
+        return {"seq": seq, "counts": counts, "tail": tail, "first_seq": first_seq, "replayed": replayed}
+
+    def _recover(self):
+        state = self._read_disk()
+        self.seq = state["seq"]
+        self.counts = state["counts"]
+        self.tail.extend(state["tail"])
+        self.stats["recovered"] = state["replayed"]
+        counters = self._read_counters()
+        if counters is None or counters[0] < state["seq"]:
+            self._write_counters(state["seq"], state["first_seq"])
+        self._open_journal()
+
+    def _apply(self, entry: dict):
+        self.tail.append(entry)
+        kind = entry.get("action_type", "unknown")
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    # ===== WRITE =====
+    def append(self, entry: dict):
+        """Record an action (durable within commit_interval_s; entry["seq"] is set at commit)"""
+        with self._cond:
+            self._apply(entry)
+            self._pending.append(entry)
+            self._appended += 1
+            self._cond.notify()
+
+    def _commit_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # Let concurrent appends pile up, then commit them together
+            time.sleep(self.commit_interval_s)
+            with self._cond:
+                batch, self._pending = self._pending, []
+            try:
+                with self._locked():
+                    self._commit(batch)
+            except OSError:
+                pass
+            with self._cond:
+                self._committed += len(batch)
+                self._cond.notify_all()
+
+    def _commit(self, batch: list):
+        """Caller holds the lock"""
+        self._open_journal()
+        counters = self._read_counters() or (self.seq, None)
+        last_seq, journal_first = counters
+        for entry in batch:
+            last_seq += 1
+            entry["seq"] = last_seq
+        lines = "".join(json.dumps(entry, default=str) + "\n" for entry in batch)
+        # A process that crashed mid-write can leave an unterminated line; don't glue onto it
+        size = os.fstat(self._file.fileno()).st_size
+        if size and os.pread(self._file.fileno(), 1, size - 1) != b"\n":
+            lines = "\n" + lines
+        self._file.write(lines)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        if journal_first is None:
+            journal_first = batch[0]["seq"]
+        self._write_counters(last_seq, journal_first)
+        self.seq = last_seq
+        self.stats["commits"] += 1
+        self.stats["committed"] += len(batch)
+        if last_seq - journal_first + 1 >= self.compact_every:
+            self._compact()
+
+    def _compact(self):
+        """
+        Fold the journal on disk into the snapshot, then archive it (caller
+        holds the lock). After a crash in between, replay skips what the
+        snapshot holds.
+        """
+        state = self._read_disk()
+        if state["first_seq"] is None:
+            return
+        snap = {"seq": state["seq"], "counts": state["counts"], "tail": list(state["tail"]),
+                "compacted_at": time.time()}
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snap, f, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        self._file.close()
+        self._file = None
+        os.replace(self.journal_path, f"{self.prefix}.{state['first_seq']}-{state['seq']}.ndjson")
+        self._open_journal()
+        self._write_counters(state["seq"], None)
+        self.stats["compactions"] += 1
+        self._prune_archives()
+
+    def _prune_archives(self):
+        directory = os.path.dirname(self.prefix)
+        base = os.path.basename(self.prefix) + "."
+        archives = []
+        for fname in os.listdir(directory):
+            if fname.startswith(base) and fname.endswith(".ndjson"):
+                try:
+                    archives.append((int(fname[len(base):].split("-")[0]), fname))
+                except ValueError:
+                    continue
+        for _, fname in sorted(archives)[:-self.keep_archives]:
+            try:
+                os.remove(os.path.join(directory, fname))
+            except OSError:
+                pass
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything appended so far is committed"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._appended
+            while self._committed < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def summary(self) -> dict:
+        counters = self._read_counters()
+        return {
+            "seq": self.seq,
+            "in_memory_tail": len(self.tail),
+            "counts": dict(self.counts),
+            "uncompacted": counters[0] - counters[1] + 1 if counters and counters[1] is not None else 0,
+            **self.stats
+        }
@@ -9,41 +9,70 @@
 
 import os
 import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from mcp_servers import startup_profile    # first: MCP_STARTUP_PROFILE times every import below
 import json
-import pandas as pd
-from docx import Document
-from docx.shared import Inches, Pt, RGBColor
 from datetime import datetime
 import asyncio
 from typing import Optional
 
 sys.path.append('.')
-from all_agents import ALL_AGENTS
-from agents import Agent, Runner
-from agents.mcp import MCPServerStdio
 from mcp.server.fastmcp import FastMCP
 
+from mcp_servers.tool_cache import ToolCache
+
 os.environ['MCP_CLIENT_TIMEOUT'] = '30'
 
 mcp = FastMCP("Enhanced Department Report Generation - BATCH")
+TOOL_CACHE = ToolCache("report_generation_mcp")
 
 
 def debug_log(msg):
     print(msg, file=sys.stderr, flush=True)
 
 
-# ===== MCP SERVERS =====
-orchestrator_mcp = MCPServerStdio(
-    params={"command": "python", "args": ["mcp_servers/orchestrator_mcp/agent_orchestrator_mcp.py"]},
-    cache_tools_list=True,
-    name="OrchestratorMCP_ReportGen"
-)
+# ===== LAZY IMPORTS =====
+# pandas, python-docx and the agents SDK (plus the department agents) cost
+# more than a second to import; tools load them on first use
+def get_pandas():
+    """Lazy pandas import"""
+    global pd
+    if 'pd' not in globals():
+        import pandas as pd
+    return pd
+
+
+def get_docx():
+    """Lazy python-docx imports"""
+    global Document, Inches, Pt, RGBColor
+    if 'Document' not in globals():
+        from docx import Document
+        from docx.shared import Inches, Pt, RGBColor
+    return Document, Inches, Pt, RGBColor
+
+
+def get_department_agents():
+    """Lazy agents SDK: department agents and the MCP servers they use"""
+    global ALL_AGENTS, Runner, orchestrator_mcp, agents_mcp
+    if 'ALL_AGENTS' not in globals():
+        from all_agents import ALL_AGENTS
+        from agents import Runner
+        from agents.mcp import MCPServerStdio
+
+        # ===== MCP SERVERS =====
+        orchestrator_mcp = MCPServerStdio(
+            params={"command": "python", "args": ["mcp_servers/orchestrator_mcp/agent_orchestrator_mcp.py"]},
+            cache_tools_list=True,
+            name="OrchestratorMCP_ReportGen"
+        )
+
+        agents_mcp = MCPServerStdio(
+            params={"command": "python", "args": ["mcp_servers/core_agents_mcp/agents_mcp.py"]},
+            cache_tools_list=True,
+            name="AgentsMCP_ReportGen"
+        )
+    return ALL_AGENTS, Runner
 
-agents_mcp = MCPServerStdio(
-    params={"command": "python", "args": ["mcp_servers/core_agents_mcp/agents_mcp.py"]},
-    cache_tools_list=True,
-    name="AgentsMCP_ReportGen"
-)
 
 _mcp_connected = False
 _mcp_initialized = False
@@ -59,6 +88,7 @@ async def get_or_create_lock():
 
 async def ensure_mcp_connected():
     global _mcp_connected, _mcp_initialized
+    get_department_agents()
     lock = await get_or_create_lock()
 
     async with lock:
@@ -150,6 +180,7 @@ DEPT_CONFIG = {
 # ===== UTILITY FUNCTIONS =====
 def load_focal_persons():
     try:
+        pd = get_pandas()
         df = pd.read_excel(FOCAL_PERSONS_FILE)
         focal_map = {}
         for _, row in df.iterrows():
@@ -343,6 +374,7 @@ async def get_ai_section_analysis(department: str, section_type: str, data: dict
     }
 
     agent_key = agent_key_mapping.get(department)
+    ALL_AGENTS, _ = get_department_agents()
     if not agent_key or agent_key not in ALL_AGENTS:
         return "Analysis unavailable - agent not configured."
 
@@ -627,6 +659,9 @@ async def generate_single_department_report(
         if not os.path.exists(csv_path):
             return {"status": "error", "message": f"CSV not found: {csv_path}"}
 
+        # Report helpers below use the module-level pd / docx names
+        pd = get_pandas()
+        get_docx()
         df = pd.read_csv(csv_path)
         df_filtered = df[(df['hospital'] == hospital) &
                          (df['report_year'] == year) &
@@ -917,6 +952,7 @@ def list_all_batches() -> dict:
 
 
 @mcp.tool()
+@TOOL_CACHE.cached(ttl_s=3600)
 def list_available_departments() -> dict:
     """List all 8 available departments"""
     return {
@@ -933,7 +969,14 @@ def list_available_departments() -> dict:
     }
 
 
+def _department_csv(department: str, **_) -> list:
+    """CSV behind a department's data (watched by the check_data_availability cache)"""
+    dept = DEPT_CONFIG.get(department)
+    return [os.path.join(CSV_DIR, dept['csv_file'])] if dept else []
+
+
 @mcp.tool()
+@TOOL_CACHE.cached(ttl_s=300, maxsize=256, watch=_department_csv)
 def check_data_availability(department: str, hospital: str, quarter: int, year: int) -> dict:
     """Check if data exists for a specific department/hospital/quarter"""
     try:
@@ -946,6 +989,7 @@ def check_data_availability(department: str, hospital: str, quarter: int, year:
         if not os.path.exists(csv_path):
             return {"status": "unavailable", "message": "CSV file not found"}
 
+        pd = get_pandas()
         df = pd.read_csv(csv_path)
         df_filtered = df[(df['hospital'] == hospital) &
                          (df['report_year'] == year) &
@@ -964,6 +1008,12 @@ def check_data_availability(department: str, hospital: str, quarter: int, year:
         return {"status": "error", "message": str(e)}
 
 
+@mcp.resource("metrics://cache")
+def cache_metrics():
+    """Cached tool results: size, hits, misses and evictions per tool"""
+    return json.dumps(TOOL_CACHE.snapshot())
+
+
 if __name__ == "__main__":
     print("🏥 Enhanced Report Generation MCP Server (BATCH PROCESSING) Starting...", file=sys.stderr)
     print(f"✅ {len(DEPT_CONFIG)} departments configured", file=sys.stderr)
@@ -975,4 +1025,5 @@ if __name__ == "__main__":
     print(f"  1. Call start_all_departments_batch() to begin", file=sys.stderr)
     print(f"  2. Call get_batch_status(batch_id) to check progress", file=sys.stderr)
     print(f"  3. All 8 reports will generate sequentially (no timeout)", file=sys.stderr)
+    startup_profile.mark_ready("report_generation_mcp")
     mcp.run()
\ No newline at end of file
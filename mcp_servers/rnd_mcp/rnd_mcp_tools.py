@@ -9,17 +9,20 @@ R&D-specific tools for:
 
 import os
 import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from mcp_servers import startup_profile    # first: MCP_STARTUP_PROFILE times every import below
 import json
 import time
 from datetime import datetime
 from functools import wraps
-from email.message import EmailMessage
-import smtplib
-import threading
-import requests
 
 from mcp.server.fastmcp import FastMCP
 
+from mcp_servers.tool_metrics import ToolMetrics
+from mcp_servers.tool_cache import ToolCache
+from mcp_servers.spans import SpanRecorder, start_span, incoming_traceparent
+from mcp_servers.trace_shipper import TraceShipper
+
 os.environ['MCP_CLIENT_TIMEOUT'] = '10'
 
 
@@ -53,6 +56,15 @@ def get_mongo():
     return mongo_client, db
 
 
+def get_email():
+    global EmailMessage, smtplib, threading
+    if 'EmailMessage' not in globals():
+        from email.message import EmailMessage
+        import smtplib
+        import threading
+    return EmailMessage, smtplib, threading
+
+
 def get_docx():
     global Document, Inches, Pt, RGBColor, WD_ALIGN_PARAGRAPH
     if 'Document' not in globals():
@@ -74,20 +86,12 @@ def get_plotting():
 
 
  #===== ADD BROADCAST FUNCTION =====
+TRACE_SHIPPER = TraceShipper(agent="rnd")
+
+
 def broadcast_trace_to_dashboard(action: str, details: dict):
-    """Broadcast trace to dashboard via API server"""
-    try:
-        requests.post(
-            'http://localhost:8000/api/internal/broadcast-trace',
-            json={
-                "agent": "rnd",
-                "action": action,
-                "details": details
-            },
-            timeout=2
-        )
-    except Exception as e:
-        debug_log(f"⚠️ Failed to broadcast trace: {e}")
+    """Queue a trace for the dashboard (sent in batches by a background thread)"""
+    TRACE_SHIPPER.ship(action, details)
 
 
 # ===== DIRECTORIES =====
@@ -104,6 +108,9 @@ APP_PASSWORD =   "djhi xaty geuj pvyy"
 
 # ===== TRACE LOG =====
 TRACE_LOG = []
+TOOL_METRICS = ToolMetrics("rnd_mcp")
+TOOL_CACHE = ToolCache("rnd_mcp")
+SPANS = SpanRecorder("rnd_mcp")
 
 
 def log_trace(action: str, details: dict):
@@ -119,15 +126,22 @@ def log_trace(action: str, details: dict):
 def traced_tool(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        call_id = f"{func.__name__}-{int(time.time() * 1000)}"
-        log_trace("tool_start", {"tool": func.__name__, "call_id": call_id})
-        try:
-            result = func(*args, **kwargs)
-            log_trace("tool_success", {"tool": func.__name__, "call_id": call_id})
-            return result
-        except Exception as e:
-            log_trace("tool_error", {"tool": func.__name__, "error": str(e)})
-            raise
+        # Continue the caller's trace when the request carries a traceparent
+        parent = incoming_traceparent()
+        with start_span(func.__name__, "rnd_mcp", SPANS if parent else None, traceparent=parent) as span:
+            call_id = f"{func.__name__}-{span.span_id}"
+            log_trace("tool_start", {"tool": func.__name__, "call_id": call_id, "trace_id": span.trace_id})
+            TOOL_METRICS.start(func.__name__)
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                TOOL_METRICS.finish(func.__name__, time.perf_counter() - started)
+                log_trace("tool_success", {"tool": func.__name__, "call_id": call_id})
+                return result
+            except Exception as e:
+                TOOL_METRICS.finish(func.__name__, time.perf_counter() - started, error=True)
+                log_trace("tool_error", {"tool": func.__name__, "error": str(e)})
+                raise
 
     return wrapper
 
@@ -148,9 +162,12 @@ DEPT_KEY_MAPPING = {
 # =============================================
 # FOCAL PERSONS MANAGEMENT
 # =============================================
+FOCAL_PERSONS_EXCEL = "focal_persons_excels/university_focal_persons.xlsx"
+
 
 @mcp.tool()
 @traced_tool
+@TOOL_CACHE.cached(ttl_s=600, watch=[FOCAL_PERSONS_EXCEL])
 def get_university_focal_persons() -> dict:
     """
     Load university focal persons from Excel file.
@@ -162,7 +179,7 @@ def get_university_focal_persons() -> dict:
     try:
         pd, _, _, _ = get_plotting()
 
-        excel_path = "focal_persons_excels/university_focal_persons.xlsx"
+        excel_path = FOCAL_PERSONS_EXCEL
 
         if not os.path.exists(excel_path):
             return {
@@ -386,6 +403,7 @@ def send_university_collaboration_emails(
     Send research collaboration emails to ALL universities from Excel.
     Uses threading for parallel sending.
     """
+    EmailMessage, smtplib, threading = get_email()
 
     # Broadcast START
     broadcast_trace_to_dashboard("university_email_campaign_started", {
@@ -1056,6 +1074,19 @@ def identify_research_priorities(national_data_all_depts: dict) -> dict:
 # RUN SERVER
 # =============================================
 
+@mcp.resource("metrics://tools")
+def tool_metrics():
+    """Per-tool latency histograms, error counts and in-flight calls"""
+    return json.dumps(TOOL_METRICS.snapshot())
+
+
+@mcp.resource("metrics://cache")
+def cache_metrics():
+    """Cached tool results: size, hits, misses and evictions per tool"""
+    return json.dumps(TOOL_CACHE.snapshot())
+
+
 if __name__ == "__main__":
     debug_log("🚀 Starting R&D MCP Tools Server...")
+    startup_profile.mark_ready("rnd_mcp")
     mcp.run()
\ No newline at end of file
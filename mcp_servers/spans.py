@@ -0,0 +1,172 @@
+# spans.py - Trace context propagation across the backend and MCP subprocesses
+"""
+W3C-style trace context (`traceparent: 00-<trace_id>-<span_id>-01`) carried
+from the FastAPI request, through the agent run, into every MCP tool call:
+
+    backend:  start_span(...)            -> contextvar holds the current span
+              instrument_session(...)    -> tools/call params._meta.traceparent
+    MCP side: incoming_traceparent()     -> read from the request being served
+              start_span(..., traceparent=...) in traced_tool
+
+Every process writes its finished spans to its own TraceLog in the shared
+trace directory; `waterfall()` joins them back into one timeline per
+trace id.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from mcp_servers.trace_log import TraceLog, DEFAULT_TRACE_DIR
+
+_current = ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "service", "start", "end", "status", "attrs")
+
+    def __init__(self, name, service, trace_id, parent_id=None, attrs=None):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.service = service
+        self.start = time.time()
+        self.end = None
+        self.status = "ok"
+        self.attrs = attrs or {}
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": self.service,
+            "start": self.start,
+            "end": self.end,
+            "duration_ms": round((self.end - self.start) * 1000, 3) if self.end else None,
+            "status": self.status,
+            "attrs": self.attrs
+        }
+
+
+def parse_traceparent(value):
+    """(trace_id, parent span_id) from a traceparent header, or None"""
+    if not value or not isinstance(value, str):
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+def current_span():
+    return _current.get()
+
+
+class SpanRecorder:
+    """Writes finished spans to a TraceLog (opened lazily on the first span)"""
+
+    def __init__(self, service: str, log: TraceLog = None, directory: str = DEFAULT_TRACE_DIR):
+        self.service = service
+        self.directory = directory
+        self._log = log
+
+    def record(self, span: Span):
+        if self._log is None:
+            self._log = TraceLog(self.directory, name=self.service)
+        self._log.append({"timestamp": span.start, "action": "span", "tool": span.name, "span": span.to_dict()})
+
+    def flush(self):
+        if self._log is not None:
+            self._log.flush()
+
+
+@contextmanager
+def start_span(name: str, service: str, recorder: SpanRecorder = None, traceparent: str = None, **attrs):
+    """
+    Child of `traceparent` if given, else of the current span, else a new
+    trace. Recorded on exit when a recorder is passed.
+    """
+    parent = parse_traceparent(traceparent)
+    if parent is None and _current.get() is not None:
+        outer = _current.get()
+        parent = (outer.trace_id, outer.span_id)
+    trace_id, parent_id = parent if parent else (os.urandom(16).hex(), None)
+
+    span = Span(name, service, trace_id, parent_id, attrs)
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = "error"
+        span.attrs["error"] = str(e)[:200]
+        raise
+    finally:
+        span.end = time.time()
+        _current.reset(token)
+        if recorder is not None:
+            recorder.record(span)
+
+
+# ===== MCP PROPAGATION =====
+def incoming_traceparent():
+    """traceparent sent with the MCP request currently being served, if any"""
+    try:
+        from mcp.server.lowlevel.server import request_ctx
+        meta = request_ctx.get().meta
+    except (ImportError, LookupError):
+        return None
+    if meta is None:
+        return None
+    return getattr(meta, "traceparent", None) or (meta.model_extra or {}).get("traceparent")
+
+
+def instrument_session(session, service: str, recorder: SpanRecorder, server_name: str = None):
+    """
+    Wrap a ClientSession's call_tool so every call opens a client span and
+    sends its traceparent in the request `_meta`. Safe to call twice.
+    """
+    if session is None or getattr(session, "_span_instrumented", False):
+        return session
+    original = session.call_tool
+
+    async def call_tool(name, arguments=None, *args, meta=None, **kwargs):
+        with start_span(f"mcp.call {name}", service, recorder, server=server_name, tool=name) as span:
+            meta = {**(meta or {}), "traceparent": span.traceparent()}
+            return await original(name, arguments, *args, meta=meta, **kwargs)
+
+    session.call_tool = call_tool
+    session._span_instrumented = True
+    return session
+
+
+# ===== ASSEMBLY =====
+def waterfall(trace_id: str, since: float, until: float, directory: str = DEFAULT_TRACE_DIR) -> list:
+    """
+    All spans of one trace from every process's log, ordered by start, with
+    depth in the call tree and offset from the first span.
+    """
+    spans = {}
+    for name in TraceLog.names(directory):
+        for event in TraceLog(directory, name=name).read(since=since, until=until):
+            span = event.get("span")
+            if event.get("action") == "span" and span and span.get("trace_id") == trace_id:
+                spans[span["span_id"]] = span
+    if not spans:
+        return []
+
+    t0 = min(span["start"] for span in spans.values())
+    for span in spans.values():
+        depth, parent = 0, span.get("parent_id")
+        while parent in spans and depth < 64:
+            depth += 1
+            parent = spans[parent].get("parent_id")
+        span["depth"] = depth
+        span["offset_ms"] = round((span["start"] - t0) * 1000, 3)
+    return sorted(spans.values(), key=lambda span: (span["start"], span["depth"]))
@@ -0,0 +1,80 @@
+# startup_profile.py - Import-time profile of an MCP server launch
+"""
+MCPServerStdio respawns tool servers often, so their import cost is paid
+on every start. Each server imports this module before anything heavy:
+
+    from mcp_servers import startup_profile
+    ...
+    startup_profile.mark_ready("agents_mcp")      # right before mcp.run()
+
+With MCP_STARTUP_PROFILE unset it does nothing. Set it to 1 to print the
+slowest imports to stderr at mark_ready(), or to a file path to also write
+the full profile there as JSON (scripts/startup_benchmark.py does this).
+
+Timings come from wrapping builtins.__import__: `cumulative_s` includes
+the module's own imports, `self_s` excludes them. Imports already in
+sys.modules are not timed.
+"""
+
+import builtins
+import json
+import os
+import sys
+import time
+
+SETTING = os.getenv("MCP_STARTUP_PROFILE", "")
+ENABLED = SETTING not in ("", "0")
+
+STARTED = time.perf_counter()
+TIMINGS = {}                   # module -> [cumulative_s, self_s]
+_stack = []                    # child time accumulated by each import in progress
+_real_import = builtins.__import__
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level == 0 and name in sys.modules and not fromlist:
+        return _real_import(name, globals, locals, fromlist, level)
+    start = time.perf_counter()
+    _stack.append(0.0)
+    try:
+        return _real_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - start
+        children = _stack.pop()
+        if _stack:
+            _stack[-1] += elapsed
+        if elapsed > 1e-4:
+            key = name if level == 0 else f"{(globals or {}).get('__package__') or ''}:{'.' * level}{name}"
+            entry = TIMINGS.setdefault(key, [0.0, 0.0])
+            entry[0] += elapsed
+            entry[1] += elapsed - children
+
+
+if ENABLED:
+    builtins.__import__ = _timed_import
+
+
+def report(top: int = 15) -> dict:
+    slowest = sorted(TIMINGS.items(), key=lambda item: item[1][0], reverse=True)
+    return {
+        "ready_s": round(time.perf_counter() - STARTED, 4),
+        "modules": len(sys.modules),
+        "imports": [{"module": name, "cumulative_s": round(cum, 4), "self_s": round(own, 4)}
+                    for name, (cum, own) in slowest[:top]]
+    }
+
+
+def mark_ready(server: str, top: int = 15):
+    """Stop timing and report (no-op unless MCP_STARTUP_PROFILE is set)"""
+    if not ENABLED:
+        return
+    builtins.__import__ = _real_import
+    profile = {"server": server, **report(top if SETTING == "1" else len(TIMINGS))}
+    print(f"⏱️ {server} ready in {profile['ready_s'] * 1000:.0f} ms ({profile['modules']} modules); slowest imports:",
+          file=sys.stderr, flush=True)
+    for entry in profile["imports"][:top]:
+        print(f"   {entry['cumulative_s'] * 1000:8.1f} ms  (self {entry['self_s'] * 1000:6.1f})  {entry['module']}",
+              file=sys.stderr, flush=True)
+    if SETTING != "1":
+        with open(SETTING, "w") as f:
+            json.dump(profile, f, indent=2)
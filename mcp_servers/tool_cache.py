@@ -0,0 +1,159 @@
+# tool_cache.py - TTL + LRU result cache for idempotent MCP tools
+"""
+Lookup tools (hospital/department lists, focal persons, agent
+capabilities, CSV availability) are called over and over in one
+workflow, and each call re-reads the same Excel/CSV file. Each server
+keeps one ToolCache and marks those tools:
+
+    TOOL_CACHE = ToolCache("rnd_mcp")
+
+    @mcp.tool()
+    @traced_tool
+    @TOOL_CACHE.cached(ttl_s=300, watch=[FOCAL_PERSONS_EXCEL])
+    def get_university_focal_persons() -> dict:
+
+    - entries are keyed by the bound arguments (defaults applied), so
+      f(1) and f(x=1) share an entry; each tool has its own LRU of at
+      most `maxsize` entries and its own ttl_s
+    - watch: file paths, or a function of the tool's arguments returning
+      paths. An entry remembers (mtime, size) of each path when it was
+      stored and is dropped on the next lookup if either changed (a file
+      appearing or disappearing counts), so editing the focal-persons
+      Excel or regenerating a CSV takes effect immediately
+    - results with status "error" and raised exceptions are not cached
+    - invalidate(tool) / invalidate() drop entries explicitly, for writes
+      that a file watch can't see
+
+Cached results are shared between callers, so they must not be mutated.
+A hit costs one dict lookup plus a stat() per watched path. Counters are
+exposed with snapshot() (the `metrics://cache` resource).
+"""
+
+import inspect
+import json
+import os
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+
+
+def _signature(paths) -> tuple:
+    """(mtime_ns, size) per path; None for a missing file"""
+    out = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            out.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append(None)
+    return tuple(out)
+
+
+class _ToolEntries:
+    __slots__ = ("ttl_s", "maxsize", "entries", "hits", "misses", "expired", "stale", "evictions", "invalidations")
+
+    def __init__(self, ttl_s: float, maxsize: int):
+        self.ttl_s = ttl_s
+        self.maxsize = maxsize
+        self.entries = OrderedDict()     # key -> (expires_at, paths, file signature, result)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0                 # dropped because ttl_s passed
+        self.stale = 0                   # dropped because a watched file changed
+        self.evictions = 0               # dropped to stay within maxsize
+        self.invalidations = 0           # dropped by invalidate()
+
+
+class ToolCache:
+    def __init__(self, server: str):
+        self.server = server
+        self._tools = {}
+        self._lock = Lock()
+
+    def cached(self, ttl_s: float, maxsize: int = 128, watch=None, cache_errors: bool = False):
+        """Decorator: cache the tool's result per arguments for ttl_s seconds"""
+        def decorator(func):
+            tool = func.__name__
+            sig = inspect.signature(func)
+            store = self._tools[tool] = _ToolEntries(ttl_s, maxsize)
+
+            def watched(bound) -> tuple:
+                if watch is None:
+                    return ()
+                paths = watch(**bound.arguments) if callable(watch) else watch
+                if isinstance(paths, str):
+                    paths = (paths,)
+                return tuple(p for p in paths if p)
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                bound = sig.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = json.dumps(bound.arguments, sort_keys=True, default=str)
+                now = time.monotonic()
+
+                with self._lock:
+                    entry = store.entries.get(key)
+                    if entry is not None:
+                        expires_at, paths, files, result = entry
+                        if now >= expires_at:
+                            store.expired += 1
+                        elif paths and _signature(paths) != files:
+                            store.stale += 1
+                        else:
+                            store.entries.move_to_end(key)
+                            store.hits += 1
+                            return result
+                        del store.entries[key]
+                    store.misses += 1
+
+                # Signature before the call: a write racing the read leaves a stale
+                # signature, so the entry is dropped instead of served
+                paths = watched(bound)
+                files = _signature(paths)
+                result = func(*bound.args, **bound.kwargs)
+                if not cache_errors and isinstance(result, dict) and result.get("status") == "error":
+                    return result
+
+                with self._lock:
+                    store.entries[key] = (time.monotonic() + ttl_s, paths, files, result)
+                    store.entries.move_to_end(key)
+                    while len(store.entries) > store.maxsize:
+                        store.entries.popitem(last=False)
+                        store.evictions += 1
+                return result
+
+            wrapper.cache_invalidate = lambda: self.invalidate(tool)
+            return wrapper
+        return decorator
+
+    def invalidate(self, tool: str = None) -> int:
+        """Drop the cached results of one tool (or of every tool); returns how many"""
+        with self._lock:
+            stores = [self._tools[tool]] if tool is not None else list(self._tools.values())
+            dropped = 0
+            for store in stores:
+                dropped += len(store.entries)
+                store.invalidations += len(store.entries)
+                store.entries.clear()
+        return dropped
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            tools = {}
+            for tool, store in self._tools.items():
+                lookups = store.hits + store.misses
+                tools[tool] = {
+                    "ttl_s": store.ttl_s,
+                    "maxsize": store.maxsize,
+                    "size": len(store.entries),
+                    "hits": store.hits,
+                    "misses": store.misses,
+                    "hit_ratio": round(store.hits / lookups, 4) if lookups else None,
+                    "expired": store.expired,
+                    "stale": store.stale,
+                    "evictions": store.evictions,
+                    "invalidations": store.invalidations
+                }
+        return {"server": self.server, "tools": tools}
@@ -0,0 +1,184 @@
+# tool_metrics.py - Per-tool latency histograms for MCP servers
+"""
+HDR-style log-linear histograms: every power of two of microseconds is
+split into 2**SUB_BITS linear sub-buckets, so any recorded latency is kept
+to within ~3% in a fixed array of counters. Recording is a bit_length(),
+a shift and an increment; nothing is allocated per call.
+
+Each MCP server keeps one ToolMetrics, fed by its traced_tool decorator
+and exposed as the `metrics://tools` resource. The FastAPI servers read
+that resource from their connected MCP sessions and serve it as
+Prometheus text (render_prometheus / collect_tool_metrics).
+"""
+
+import asyncio
+import json
+import time
+from array import array
+from threading import Lock
+
+SUB_BITS = 5
+SUB_BUCKETS = 1 << SUB_BITS
+MAX_EXPONENT = 37                 # 2**37 us ~ 38 hours, anything longer is clamped
+PROM_BUCKETS_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                  0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _bucket_index(us: int) -> int:
+    if us < SUB_BUCKETS:
+        return us
+    shift = us.bit_length() - SUB_BITS - 1
+    if shift >= MAX_EXPONENT - SUB_BITS:
+        return (MAX_EXPONENT - SUB_BITS + 1) * SUB_BUCKETS - 1
+    return (shift + 1) * SUB_BUCKETS + ((us >> shift) - SUB_BUCKETS)
+
+
+def _bucket_bounds(idx: int):
+    """[low, high) of a bucket in microseconds"""
+    if idx < SUB_BUCKETS:
+        return idx, idx + 1
+    shift = idx // SUB_BUCKETS - 1
+    low = (SUB_BUCKETS + idx % SUB_BUCKETS) << shift
+    return low, low + (1 << shift)
+
+
+class LatencyHistogram:
+    """Fixed-size log-linear latency histogram (microsecond resolution)"""
+
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * (MAX_EXPONENT - SUB_BITS + 1) * SUB_BUCKETS))
+        self.count = 0
+        self.sum_s = 0.0
+        self.max_s = 0.0
+
+    def record(self, seconds: float):
+        self.counts[_bucket_index(int(seconds * 1_000_000))] += 1
+        self.count += 1
+        self.sum_s += seconds
+        if seconds > self.max_s:
+            self.max_s = seconds
+
+    def percentile(self, q: float) -> float:
+        """Latency in seconds at quantile q (0-100), bucket midpoint"""
+        if not self.count:
+            return 0.0
+        rank = max(1, round(self.count * q / 100))
+        seen = 0
+        for idx, n in enumerate(self.counts):
+            if n:
+                seen += n
+                if seen >= rank:
+                    low, high = _bucket_bounds(idx)
+                    return min((low + high) / 2 / 1_000_000, self.max_s)
+        return self.max_s
+
+    def cumulative(self, bounds_s=PROM_BUCKETS_S) -> list:
+        """[(le_seconds, calls <= le)] for Prometheus-style buckets"""
+        out, seen, idx = [], 0, 0
+        size = len(self.counts)
+        for bound in bounds_s:
+            bound_us = bound * 1_000_000
+            # A bucket straddling the bound counts as below it (within ~3%)
+            while idx < size and _bucket_bounds(idx)[0] <= bound_us:
+                seen += self.counts[idx]
+                idx += 1
+            out.append((bound, seen))
+        return out
+
+
+class ToolMetrics:
+    """Latency histogram, error count and in-flight gauge per tool"""
+
+    def __init__(self, server: str):
+        self.server = server
+        self.started = time.time()
+        self._tools = {}      # tool -> [histogram, errors, in_flight]
+        self._lock = Lock()
+
+    def _entry(self, tool):
+        entry = self._tools.get(tool)
+        if entry is None:
+            entry = self._tools.setdefault(tool, [LatencyHistogram(), 0, 0])
+        return entry
+
+    def start(self, tool: str):
+        with self._lock:
+            self._entry(tool)[2] += 1
+
+    def finish(self, tool: str, seconds: float, error: bool = False):
+        with self._lock:
+            entry = self._entry(tool)
+            entry[0].record(seconds)
+            entry[2] -= 1
+            if error:
+                entry[1] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            tools = {}
+            for tool, (hist, errors, in_flight) in self._tools.items():
+                tools[tool] = {
+                    "calls": hist.count,
+                    "errors": errors,
+                    "in_flight": in_flight,
+                    "sum_s": round(hist.sum_s, 6),
+                    "mean_ms": round(hist.sum_s / hist.count * 1000, 3) if hist.count else 0.0,
+                    "p50_ms": round(hist.percentile(50) * 1000, 3),
+                    "p90_ms": round(hist.percentile(90) * 1000, 3),
+                    "p99_ms": round(hist.percentile(99) * 1000, 3),
+                    "max_ms": round(hist.max_s * 1000, 3),
+                    "buckets": hist.cumulative()
+                }
+        return {"server": self.server, "uptime_s": round(time.time() - self.started, 1), "tools": tools}
+
+
+# ===== PROMETHEUS EXPOSITION =====
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(snapshots: list) -> str:
+    """Prometheus text format for a list of ToolMetrics snapshots"""
+    lines = [
+        "# HELP mcp_tool_duration_seconds MCP tool call latency",
+        "# TYPE mcp_tool_duration_seconds histogram",
+    ]
+    errors = ["# HELP mcp_tool_errors_total MCP tool calls that raised",
+              "# TYPE mcp_tool_errors_total counter"]
+    in_flight = ["# HELP mcp_tool_in_flight MCP tool calls currently running",
+                 "# TYPE mcp_tool_in_flight gauge"]
+    for snap in snapshots:
+        instance = f'instance="{_label(snap["instance"])}",' if snap.get("instance") else ""
+        for tool, stats in sorted(snap.get("tools", {}).items()):
+            labels = f'{instance}server="{_label(snap.get("server"))}",tool="{_label(tool)}"'
+            for le, n in stats["buckets"]:
+                lines.append(f'mcp_tool_duration_seconds_bucket{{{labels},le="{le}"}} {n}')
+            lines.append(f'mcp_tool_duration_seconds_bucket{{{labels},le="+Inf"}} {stats["calls"]}')
+            lines.append(f'mcp_tool_duration_seconds_sum{{{labels}}} {stats["sum_s"]}')
+            lines.append(f'mcp_tool_duration_seconds_count{{{labels}}} {stats["calls"]}')
+            errors.append(f"mcp_tool_errors_total{{{labels}}} {stats['errors']}")
+            in_flight.append(f"mcp_tool_in_flight{{{labels}}} {stats['in_flight']}")
+    return "\n".join(lines + errors + in_flight) + "\n"
+
+
+async def collect_tool_metrics(servers: dict, timeout: float = 2.0) -> list:
+    """
+    Read `metrics://tools` from connected MCP servers, {instance: server}
+    where server is an agents SDK MCPServerStdio or a bare ClientSession.
+    The instance label keeps per-agent subprocesses of one script apart.
+    Unreachable servers are skipped.
+    """
+    async def read(instance, server):
+        session = getattr(server, "session", server)
+        if session is None or not hasattr(session, "read_resource"):
+            return None
+        try:
+            result = await asyncio.wait_for(session.read_resource("metrics://tools"), timeout)
+            snap = json.loads(result.contents[0].text)
+        except Exception:
+            return None
+        snap["instance"] = instance
+        return snap
+
+    snapshots = await asyncio.gather(*(read(name, server) for name, server in servers.items()))
+    return [snap for snap in snapshots if snap]
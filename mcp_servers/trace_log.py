@@ -0,0 +1,300 @@
+# trace_log.py - Append-only NDJSON trace log with a seekable sidecar index
+"""
+Trace events are written one JSON object per line into rotating segment
+files `<name>-<start_ms>-<pid>.ndjson`. Every record also gets a fixed-size
+entry in the sidecar `<segment>.idx`:
+
+    struct "<ddQI": running-max timestamp, event timestamp, byte offset, crc32(tool)
+
+The running max is non-decreasing, so a time-range read binary-searches
+the index, seeks straight to the first candidate record and filters by
+the real timestamp (events may arrive up to MAX_SKEW_S out of order).
+Tool filters compare the 4-byte hash in the index before touching the
+data file.
+
+Writes go through one open, buffered file handle. Data is flushed and
+fsync'd in batches (every `fsync_every` records or `fsync_interval_s`,
+whichever comes first), data before index, so the index never points past
+the end of the data. Segments rotate on size or age.
+
+Several processes write the same name into one directory (one agents_mcp
+per agent, plus replicas); the pid in the segment name keeps their files
+apart, and reads cover every process's segments. A process only prunes
+segments it closed itself (keeping its newest `keep_segments`) and other
+processes' segments older than keep_segments * max_age_s; nothing writes
+to a segment older than max_age_s, so those are never open for writing.
+"""
+
+import bisect
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+INDEX_ENTRY = struct.Struct("<ddQI")
+MAX_SKEW_S = 60.0
+# Shared by every process of a deployment so traces can be joined across them
+DEFAULT_TRACE_DIR = os.getenv(
+    "TRACE_LOG_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "traces"))
+)
+
+
+def parse_segment(fname: str):
+    """(name, start_ms, pid or None) of a segment file name, or None"""
+    if not fname.endswith(".ndjson"):
+        return None
+    parts = fname[:-len(".ndjson")].rsplit("-", 2)
+    if len(parts) == 3 and parts[1].isdigit() and parts[2].isdigit():
+        return parts[0], int(parts[1]), int(parts[2])
+    parts = fname[:-len(".ndjson")].rsplit("-", 1)
+    if len(parts) == 2 and parts[1].isdigit():
+        return parts[0], int(parts[1]), None    # written before segments carried the pid
+    return None
+
+
+def tool_hash(tool) -> int:
+    return zlib.crc32(str(tool).encode()) if tool else 0
+
+
+def event_tool(event: dict):
+    """Tool name of a trace event, wherever the caller put it"""
+    details = event.get("details")
+    if isinstance(details, dict) and details.get("tool"):
+        return details["tool"]
+    return event.get("tool") or event.get("action")
+
+
+class TraceLog:
+    """Buffered, rotating, indexed NDJSON writer + range reader"""
+
+    def __init__(self, directory: str, name: str = "traces",
+                 max_bytes: int = 64 * 1024 * 1024, max_age_s: float = 24 * 3600,
+                 keep_segments: int = 14, fsync_every: int = 256,
+                 fsync_interval_s: float = 1.0):
+        self.directory = directory
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.keep_segments = keep_segments
+        self.fsync_every = fsync_every
+        self.fsync_interval_s = fsync_interval_s
+
+        self._lock = threading.Lock()
+        self._data = None
+        self._index = None
+        self._segment_started = 0.0
+        self._offset = 0
+        self._max_ts = 0.0
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._flusher = None
+        self._closed = False
+        self._closed_segments = []      # paths this process wrote and closed, oldest first
+
+    @staticmethod
+    def names(directory: str = DEFAULT_TRACE_DIR) -> list:
+        """Log names with at least one segment in a directory"""
+        try:
+            files = os.listdir(directory)
+        except OSError:
+            return []
+        return sorted({parsed[0] for parsed in map(parse_segment, files) if parsed})
+
+    # ===== SEGMENTS =====
+    def segments(self) -> list:
+        """[(created_ts, data_path)] of every process's segments, oldest first"""
+        found = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        for fname in names:
+            parsed = parse_segment(fname)
+            if parsed and parsed[0] == self.name:
+                found.append((parsed[1] / 1000, os.path.join(self.directory, fname)))
+        return sorted(found)
+
+    def _open_segment(self, now: float):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{self.name}-{int(now * 1000)}-{os.getpid()}.ndjson")
+        self._data = open(path, "ab", buffering=1024 * 1024)
+        self._index = open(path[:-len(".ndjson")] + ".idx", "ab", buffering=64 * 1024)
+        self._offset = self._data.tell()
+        self._segment_started = now
+        self._prune(now)
+
+    def _close_segment(self):
+        if self._data is not None:
+            self._sync()
+            self._data.close()
+            self._index.close()
+            self._closed_segments.append(self._data.name)
+            self._data = self._index = None
+
+    def _prune(self, now: float):
+        """Own closed segments beyond keep_segments, and anyone's past retention"""
+        keep = max(0, self.keep_segments - 1)      # the segment just opened counts too
+        cut = max(0, len(self._closed_segments) - keep)
+        victims, self._closed_segments = self._closed_segments[:cut], self._closed_segments[cut:]
+        retention_s = self.keep_segments * self.max_age_s
+        for started, path in self.segments():
+            if now - started > retention_s and path != self._data.name and path not in victims:
+                victims.append(path)
+        for path in victims:
+            for victim in (path, path[:-len(".ndjson")] + ".idx"):
+                try:
+                    os.remove(victim)
+                except OSError:
+                    pass
+
+    # ===== WRITE =====
+    def append(self, event: dict):
+        """Append one event (best effort: trace I/O never fails a tool call)"""
+        event.setdefault("timestamp", time.time())
+        try:
+            line = (json.dumps(event, default=str, separators=(",", ":")) + "\n").encode()
+        except (TypeError, ValueError):
+            return
+        ts = event["timestamp"]
+        if not isinstance(ts, (int, float)):
+            ts = time.time()
+
+        with self._lock:
+            if self._closed:
+                return
+            try:
+                now = time.time()
+                if self._data is None:
+                    self._open_segment(now)
+                elif self._offset >= self.max_bytes or now - self._segment_started >= self.max_age_s:
+                    self._close_segment()
+                    self._open_segment(now)
+
+                self._max_ts = max(self._max_ts, ts)
+                self._data.write(line)
+                self._index.write(INDEX_ENTRY.pack(self._max_ts, ts, self._offset, tool_hash(event_tool(event))))
+                self._offset += len(line)
+                self._pending += 1
+                if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval_s:
+                    self._sync()
+            except OSError:
+                return
+        self._ensure_flusher()
+
+    def _sync(self):
+        """Flush + fsync data, then the index. Caller holds the lock"""
+        if self._data is None or not self._pending:
+            return
+        self._data.flush()
+        os.fsync(self._data.fileno())
+        self._index.flush()
+        os.fsync(self._index.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            try:
+                self._sync()
+            except OSError:
+                pass
+
+    def _ensure_flusher(self):
+        # Idle tails still reach disk within fsync_interval_s
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name=f"{self.name}-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._closed:
+            time.sleep(self.fsync_interval_s)
+            self.flush()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            try:
+                self._close_segment()
+            except OSError:
+                pass
+
+    # ===== READ =====
+    def read(self, since: float = None, until: float = None, tool: str = None, limit: int = None):
+        """Yield events with since <= timestamp <= until (optionally for one tool), in write order"""
+        self.flush()
+        since = since if since is not None else float("-inf")
+        until = until if until is not None else float("inf")
+        want_hash = tool_hash(tool) if tool else None
+
+        emitted = 0
+        for _, path in self.segments():
+            bounds = self._segment_bounds(path)
+            if bounds is None or bounds[1] < since or bounds[0] - MAX_SKEW_S > until:
+                continue
+            for event in self._read_segment(path, since, until, tool, want_hash):
+                yield event
+                emitted += 1
+                if limit is not None and emitted >= limit:
+                    return
+
+    def _segment_bounds(self, path):
+        """(first, last) running-max timestamps of a segment, from its index ends"""
+        try:
+            with open(path[:-len(".ndjson")] + ".idx", "rb") as f:
+                head = f.read(INDEX_ENTRY.size)
+                size = f.seek(0, os.SEEK_END)
+                if len(head) < INDEX_ENTRY.size:
+                    return None
+                f.seek((size // INDEX_ENTRY.size - 1) * INDEX_ENTRY.size)
+                tail = f.read(INDEX_ENTRY.size)
+        except OSError:
+            return None
+        return INDEX_ENTRY.unpack(head)[0], INDEX_ENTRY.unpack(tail)[0]
+
+    def _read_segment(self, path, since, until, tool, want_hash):
+        try:
+            idx = open(path[:-len(".ndjson")] + ".idx", "rb")
+        except OSError:
+            return
+        with idx, open(path, "rb") as data:
+            # Binary search with one positioned read per probe, then read
+            # only the matching slice of the index
+            keys = _IndexColumn(idx)
+            first = bisect.bisect_left(keys, since)
+            last = bisect.bisect_right(keys, until + MAX_SKEW_S)
+            if first >= last:
+                return
+            idx.seek(first * INDEX_ENTRY.size)
+            raw = idx.read((last - first) * INDEX_ENTRY.size)
+
+            for _, ts, offset, hashed in INDEX_ENTRY.iter_unpack(raw):
+                if ts < since or ts > until:
+                    continue
+                if want_hash is not None and hashed != want_hash:
+                    continue
+                data.seek(offset)
+                line = data.readline()
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue    # torn write at the tail after a crash
+                if tool is not None and event_tool(event) != tool:
+                    continue
+                yield event
+
+
+class _IndexColumn:
+    """Sequence view over the running-max column of an index file, for bisect"""
+
+    def __init__(self, f):
+        self.f = f
+        self.count = f.seek(0, os.SEEK_END) // INDEX_ENTRY.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, n):
+        self.f.seek(n * INDEX_ENTRY.size)
+        return INDEX_ENTRY.unpack(self.f.read(INDEX_ENTRY.size))[0]
@@ -0,0 +1,153 @@
+# trace_shipper.py - Batched, non-blocking trace delivery to the dashboard
+"""
+ship() only appends to a bounded in-memory queue; a background thread
+sends whatever has accumulated as one POST to the batch ingest endpoint
+(`/api/internal/broadcast-traces`) over a keep-alive requests.Session.
+
+When the dashboard is slow or down the queue fills and the oldest events
+are dropped (the live panel cares about recent activity). Failed batches
+are retried ahead of newer events, space permitting, after a backoff
+(0.5 s doubling to max_backoff_s) that holds however full the queue is.
+Only a 2xx counts as delivered. 5xx, 429 and network errors are retried;
+any other status (a 404 from a dashboard without the endpoint, a bad
+URL) means retrying won't help, so the batch is counted as dropped.
+Delivery warnings go to stderr at most once per warn_interval_s.
+"""
+
+import atexit
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+DEFAULT_DASHBOARD_URL = os.getenv("DASHBOARD_TRACE_URL", "http://localhost:8000/api/internal/broadcast-traces")
+
+
+class TraceShipper:
+    def __init__(self, url: str = DEFAULT_DASHBOARD_URL, agent: str = "system",
+                 max_queue: int = 5000, batch_size: int = 200, flush_interval_s: float = 0.25,
+                 timeout_s: float = 2.0, max_backoff_s: float = 10.0, warn_interval_s: float = 30.0):
+        self.url = url
+        self.agent = agent
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.timeout_s = timeout_s
+        self.max_backoff_s = max_backoff_s
+        self.warn_interval_s = warn_interval_s
+        self.stats = {"shipped": 0, "dropped": 0, "batches": 0, "failures": 0, "rejected": 0}
+
+        self._queue = deque(maxlen=max_queue)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._session = None
+        self._worker = None
+        self._last_warning = None
+        self._unreported_failures = 0
+
+    # ===== PRODUCER SIDE =====
+    def ship(self, action: str, details: dict, agent: str = None):
+        """Queue one trace event; never blocks on the network"""
+        event = {
+            "timestamp": datetime.now().isoformat(),
+            "agent": agent or self.agent,
+            "action": action,
+            "details": details
+        }
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.stats["dropped"] += 1      # deque evicts the oldest
+            self._queue.append(event)
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+        self._ensure_worker()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until the queue is delivered (or dropped); False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify()
+            while self._queue or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, self.flush_interval_s))
+        return True
+
+    # ===== WORKER =====
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._cond:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="trace-shipper", daemon=True)
+                    self._worker.start()
+                    atexit.register(self.flush, 2.0)
+
+    def _run(self):
+        backoff = 0.0
+        next_attempt = 0.0
+        while True:
+            with self._cond:
+                if backoff:
+                    # After a failure nothing is sent before the backoff ends, full queue or not
+                    while (remaining := next_attempt - time.monotonic()) > 0:
+                        self._cond.wait(remaining)
+                elif len(self._queue) < self.batch_size:
+                    self._cond.wait(self.flush_interval_s)
+                if not self._queue:
+                    continue
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._in_flight = len(batch)
+
+            outcome = self._send(batch)
+            with self._cond:
+                self._in_flight = 0
+                if outcome == "shipped":
+                    self.stats["shipped"] += len(batch)
+                    self.stats["batches"] += 1
+                    backoff = 0.0
+                elif outcome == "rejected":
+                    # The endpoint refused the batch; sending it again won't change that
+                    self.stats["rejected"] += 1
+                    self.stats["dropped"] += len(batch)
+                    backoff = 0.0
+                else:
+                    self.stats["failures"] += 1
+                    backoff = min(self.max_backoff_s, max(0.5, backoff * 2))
+                    next_attempt = time.monotonic() + backoff
+                    # Retry ahead of newer events; whatever doesn't fit is the oldest, so drop it
+                    room = self._queue.maxlen - len(self._queue)
+                    keep = batch[-room:] if room else []
+                    self.stats["dropped"] += len(batch) - len(keep)
+                    self._queue.extendleft(reversed(keep))
+                self._cond.notify_all()
+
+    def _send(self, batch: list) -> str:
+        """shipped (2xx), rejected (any other 3xx/4xx: drop the batch) or retry"""
+        import requests     # imported by the worker thread, off the server's startup path
+        if self._session is None:
+            self._session = requests.Session()
+        try:
+            response = self._session.post(self.url, json={"traces": batch}, timeout=self.timeout_s)
+        except requests.RequestException as e:
+            self._warn(f"{len(batch)} traces not delivered: {e}")
+            return "retry"
+        status = response.status_code
+        if 200 <= status < 300:
+            return "shipped"
+        if status >= 500 or status == 429:
+            self._warn(f"{len(batch)} traces not delivered: HTTP {status} from {self.url}")
+            return "retry"
+        self._warn(f"{len(batch)} traces dropped: HTTP {status} from {self.url}")
+        return "rejected"
+
+    def _warn(self, message: str):
+        """stderr warning, at most one per warn_interval_s (the rest are counted)"""
+        now = time.monotonic()
+        if self._last_warning is not None and now - self._last_warning < self.warn_interval_s:
+            self._unreported_failures += 1
+            return
+        suppressed = f" ({self._unreported_failures} more failures since the last warning)" if self._unreported_failures else ""
+        self._last_warning, self._unreported_failures = now, 0
+        print(f"⚠️ Trace shipper: {message}{suppressed}", file=sys.stderr, flush=True)
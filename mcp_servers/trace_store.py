@@ -0,0 +1,169 @@
+# trace_store.py - In-memory per-agent trace rings for the dashboard APIs
+"""
+Each agent gets a fixed-capacity ring (oldest overwritten). Every trace is
+stamped with a store-wide `seq`, and the ring keeps seq and epoch time in
+parallel arrays, both non-decreasing, so range bounds are binary searches.
+
+The time indexed is the trace's own `timestamp` (batched shippers deliver
+events a little after they happened), or the arrival time if it has none.
+A trace older than the newest one already in its ring is indexed at that
+newest time, which keeps the column sorted: since/until match an
+out-of-order trace as slightly later than its timestamp, never earlier.
+
+    query(agent=..., since=..., until=..., cursor=..., limit=...)
+
+returns the newest `limit` traces older than `cursor` (a seq from a
+previous page's next_cursor), merging the per-agent slices with a k-way
+heap merge on seq. Cost is O(agents * log capacity + limit * log agents),
+independent of how much history is retained.
+"""
+
+import heapq
+import math
+import time
+from array import array
+from datetime import datetime
+from itertools import islice
+
+
+def _epoch(value):
+    """Epoch seconds from a float, an ISO string or a datetime (None passes through)"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        epoch = float(value)
+    except (TypeError, ValueError):
+        try:
+            epoch = datetime.fromisoformat(value).timestamp()
+        except (TypeError, ValueError):
+            raise ValueError(f"not epoch seconds or an ISO time: {value!r}") from None
+    if not math.isfinite(epoch):
+        raise ValueError(f"not a finite time: {value!r}")
+    return epoch
+
+
+def parse_time(value, name: str = "time"):
+    """_epoch() for request parameters: ValueError names the parameter"""
+    try:
+        return _epoch(value)
+    except ValueError as e:
+        raise ValueError(f"{name}: {e}") from None
+
+
+class _Ring:
+    __slots__ = ("capacity", "items", "seqs", "times", "head", "count")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.items = [None] * capacity
+        self.seqs = array("q", bytes(8 * capacity))
+        self.times = array("d", bytes(8 * capacity))
+        self.head = 0         # next slot to write
+        self.count = 0
+
+    def append(self, seq: int, ts: float, item: dict):
+        if self.count:
+            # Keep the time column sorted even if the wall clock steps back
+            ts = max(ts, self.times[(self.head - 1) % self.capacity])
+        self.items[self.head] = item
+        self.seqs[self.head] = seq
+        self.times[self.head] = ts
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def _slot(self, i: int) -> int:
+        """Physical slot of the i-th oldest entry"""
+        return (self.head - self.count + i) % self.capacity
+
+    def _bisect(self, column, value, right: bool) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            v = column[self._slot(mid)]
+            if v < value or (right and v == value):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def window(self, since, until, before_seq):
+        """[lo, hi) logical range matching since <= ts <= until and seq < before_seq"""
+        lo = self._bisect(self.times, since, right=False) if since is not None else 0
+        hi = self._bisect(self.times, until, right=True) if until is not None else self.count
+        if before_seq is not None:
+            hi = min(hi, self._bisect(self.seqs, before_seq, right=False))
+        return lo, hi
+
+    def iter_newest(self, lo: int, hi: int):
+        for i in range(hi - 1, lo - 1, -1):
+            slot = self._slot(i)
+            yield self.seqs[slot], self.items[slot]
+
+    def latest(self, n: int) -> list:
+        """Last n items, oldest first"""
+        return [item for _, item in self.iter_newest(max(0, self.count - n), self.count)][::-1]
+
+
+class TraceStore:
+    def __init__(self, capacity_per_agent: int = 1000):
+        self.capacity_per_agent = capacity_per_agent
+        self.seq = 0
+        self._rings = {}
+
+    def add(self, agent: str, trace: dict) -> int:
+        """Store a trace (stamps trace["seq"]), indexed by its timestamp; O(1)"""
+        ring = self._rings.get(agent)
+        if ring is None:
+            ring = self._rings[agent] = _Ring(self.capacity_per_agent)
+        try:
+            ts = _epoch(trace.get("timestamp"))
+        except ValueError:
+            ts = None
+        self.seq += 1
+        trace["seq"] = self.seq
+        ring.append(self.seq, ts if ts is not None else time.time(), trace)
+        return self.seq
+
+    def query(self, agent: str = None, since=None, until=None, cursor: int = None,
+              limit: int = 100, oldest_first: bool = False) -> dict:
+        """
+        Newest `limit` traces (of one agent or all) with timestamp in
+        [since, until] and older than `cursor`. Pass next_cursor back to page
+        further into history. oldest_first only flips the order of the
+        returned page. ValueError on a since/until that isn't a time.
+        """
+        since, until = parse_time(since, "since"), parse_time(until, "until")
+        rings = [self._rings[agent]] if agent in self._rings else [] if agent else list(self._rings.values())
+        streams = []
+        for ring in rings:
+            lo, hi = ring.window(since, until, cursor)
+            if lo < hi:
+                streams.append(ring.iter_newest(lo, hi))
+
+        if len(streams) == 1:
+            merged = streams[0]
+        else:
+            merged = heapq.merge(*streams, key=lambda entry: entry[0], reverse=True)
+        page = [item for _, item in islice(merged, max(0, limit))]
+        next_cursor = page[-1]["seq"] if len(page) == limit and page else None
+        if oldest_first:
+            page.reverse()
+        return {"traces": page, "next_cursor": next_cursor}
+
+    def latest(self, agent: str, n: int = 1) -> list:
+        ring = self._rings.get(agent)
+        return ring.latest(n) if ring else []
+
+    def agents(self) -> list:
+        return list(self._rings)
+
+    def count(self, agent: str = None) -> int:
+        if agent is not None:
+            ring = self._rings.get(agent)
+            return ring.count if ring else 0
+        return sum(ring.count for ring in self._rings.values())
+
+    def clear(self, agent: str):
+        self._rings.pop(agent, None)
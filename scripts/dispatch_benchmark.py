@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# dispatch_benchmark.py - Dispatch latency / assignment quality benchmark
+"""
+Benchmarks the tracking tools in agents_mcp.py against a synthetic fleet.
+
+    python scripts/dispatch_benchmark.py batch --stations 2000 --incidents 40
+    python scripts/dispatch_benchmark.py replay --rate 20 --duration 600 --mode both
+
+`batch` compares dispatch_batch against N sequential dispatch_nearest_ambulance
+calls on the same fleet and the same incidents. Both run in-process, so the
+sequential timing leaves out the N tool round-trips it costs through MCP.
+
+`replay` generates a synthetic incident stream (Poisson arrivals, most of
+them clustered around hotspot stations) and replays it, with each unit
+released after a simulated mission time, either in-process or through the
+agents_mcp.py stdio server. Events run back to back in simulated-time order,
+so the run measures tool cost, not the simulated clock. Reports
+p50/p95/p99 latency, throughput, and mean dispatch distance.
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import random
+import asyncio
+import argparse
+import math
+import tempfile
+import contextlib
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BASE_DIR)
+
+# Lahore centre and a rough Punjab bounding box for synthetic stations
+LAHORE = (31.5204, 74.3587)
+PUNJAB_BOX = (29.0, 33.5, 70.5, 75.5)
+
+
+def load_agents_mcp():
+    """Import agents_mcp quietly (its trace logging goes to stderr)"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stderr(devnull):
+        from mcp_servers.core_agents_mcp import agents_mcp
+    return agents_mcp
+
+
+def synthetic_fleet(stations: int, seed: int = 42, city_share: float = 0.6):
+    """Stations clustered around Lahore with the rest spread over Punjab"""
+    rng = random.Random(seed)
+    lat_lo, lat_hi, lon_lo, lon_hi = PUNJAB_BOX
+    fleet = []
+    amb_no = 0
+    for i in range(stations):
+        if rng.random() < city_share:
+            lat = rng.gauss(LAHORE[0], 0.08)
+            lon = rng.gauss(LAHORE[1], 0.08)
+        else:
+            lat = rng.uniform(lat_lo, lat_hi)
+            lon = rng.uniform(lon_lo, lon_hi)
+        ambulances = []
+        for _ in range(rng.randint(1, 4)):
+            amb_no += 1
+            ambulances.append({"id": f"AMB-{amb_no:05d}", "status": "available"})
+        fleet.append({
+            "name": f"Station {i + 1}",
+            "contact": "1122",
+            "lat": round(lat, 5),
+            "lon": round(lon, 5),
+            "ambulances": ambulances
+        })
+    return fleet
+
+
+def install_fleet(agents_mcp, fleet):
+    """Swap the fleet loaded from hospitals_lhr.json for a synthetic one"""
+    agents_mcp.HOSPITALS[:] = fleet
+    agents_mcp.RESCUE_ORGS[:] = []
+    agents_mcp.FLEET.build([agents_mcp.HOSPITALS, agents_mcp.RESCUE_ORGS])
+    agents_mcp.LAST_DISPATCH_LOG.clear()
+
+
+def hotspot_incidents(fleet, count: int, seed: int = 7, spread_deg: float = 0.02):
+    """Incidents scattered around a single mass-casualty site near a station"""
+    rng = random.Random(seed)
+    site = rng.choice(fleet)
+    return [
+        {
+            "incident_id": f"INC-{i + 1}",
+            "lat": rng.gauss(site["lat"], spread_deg),
+            "lon": rng.gauss(site["lon"], spread_deg)
+        }
+        for i in range(count)
+    ]
+
+
+def load_fleet(args):
+    """hospitals_lhr.json when it has data, otherwise a synthetic Punjab fleet"""
+    data_file = os.path.join(BASE_DIR, "mcp_servers/core_agents_mcp/hospitals_lhr.json")
+    if not args.synthetic:
+        try:
+            with open(data_file, "r") as f:
+                data = json.load(f)
+            fleet = data["hospitals"] + data["rescue_orgs"]
+            if fleet:
+                return fleet, "hospitals_lhr.json"
+        except (OSError, ValueError, KeyError):
+            pass
+    return synthetic_fleet(args.stations, seed=args.seed), f"synthetic ({args.stations} stations)"
+
+
+def incident_stream(fleet, rate: float, duration_s: float, hotspots: int = 5,
+                    hotspot_share: float = 0.7, mission_mean_s: float = 1800, seed: int = 11):
+    """
+    Poisson arrivals at `rate` incidents/s for `duration_s` simulated seconds.
+    Returns [(arrival_s, lat, lon, mission_s)]
+    """
+    rng = random.Random(seed)
+    centres = rng.sample(fleet, min(hotspots, len(fleet)))
+    lat_lo = min(u["lat"] for u in fleet)
+    lat_hi = max(u["lat"] for u in fleet)
+    lon_lo = min(u["lon"] for u in fleet)
+    lon_hi = max(u["lon"] for u in fleet)
+
+    events = []
+    t = rng.expovariate(rate)
+    while t < duration_s:
+        if rng.random() < hotspot_share:
+            centre = rng.choice(centres)
+            lat, lon = rng.gauss(centre["lat"], 0.015), rng.gauss(centre["lon"], 0.015)
+        else:
+            lat, lon = rng.uniform(lat_lo, lat_hi), rng.uniform(lon_lo, lon_hi)
+        events.append((t, lat, lon, rng.expovariate(1 / mission_mean_s)))
+        t += rng.expovariate(rate)
+    return events
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+async def replay(events, dispatch, release):
+    """
+    Run dispatches and their releases in simulated-time order.
+    dispatch(lat, lon) -> dict, release(ambulance_id) -> dict (both async)
+    """
+    queue = [(t, 0, i) for i, (t, _, _, _) in enumerate(events)]
+    heapq.heapify(queue)
+    dispatch_ms, release_ms, distances = [], [], []
+    failed = 0
+
+    started = time.perf_counter()
+    while queue:
+        t, kind, payload = heapq.heappop(queue)
+        if kind == 0:
+            _, lat, lon, mission_s = events[payload]
+            op_start = time.perf_counter()
+            result = await dispatch(lat, lon)
+            dispatch_ms.append((time.perf_counter() - op_start) * 1000)
+            if result.get("ambulance_id"):
+                distances.append(result["distance_km"])
+                heapq.heappush(queue, (t + mission_s, 1, result["ambulance_id"]))
+            else:
+                failed += 1
+        else:
+            op_start = time.perf_counter()
+            await release(payload)
+            release_ms.append((time.perf_counter() - op_start) * 1000)
+    wall_s = time.perf_counter() - started
+
+    return {
+        "dispatch_ms": sorted(dispatch_ms),
+        "release_ms": sorted(release_ms),
+        "distances": distances,
+        "failed": failed,
+        "wall_s": wall_s
+    }
+
+
+async def replay_in_process(fleet, events):
+    agents_mcp = load_agents_mcp()
+
+    async def dispatch(lat, lon):
+        return agents_mcp.dispatch_nearest_ambulance(lat, lon)
+
+    async def release(ambulance_id):
+        return agents_mcp.release_ambulance(ambulance_id)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stderr(devnull):
+        install_fleet(agents_mcp, fleet)
+        return await replay(events, dispatch, release)
+
+
+async def replay_stdio(fleet, events):
+    """Same replay through a real agents_mcp.py subprocess over MCP stdio"""
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"hospitals": fleet, "rescue_orgs": []}, f)
+        data_file = f.name
+    catchment_file = data_file + ".catchment"
+
+    server = StdioServerParameters(
+        command=sys.executable,
+        args=[os.path.join(BASE_DIR, "mcp_servers/core_agents_mcp/agents_mcp.py")],
+        env={**os.environ, "HOSPITALS_DATA_FILE": data_file, "HOSPITAL_CATCHMENT_FILE": catchment_file},
+        cwd=BASE_DIR
+    )
+    try:
+        with open(os.devnull, "w") as devnull:
+            async with stdio_client(server, errlog=devnull) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+
+                    async def call(tool, arguments):
+                        result = await session.call_tool(tool, arguments)
+                        if result.isError:
+                            raise RuntimeError(result.content[0].text if result.content else tool)
+                        return json.loads(result.content[0].text)
+
+                    async def dispatch(lat, lon):
+                        return await call("dispatch_nearest_ambulance", {"lat": lat, "lon": lon})
+
+                    async def release(ambulance_id):
+                        return await call("release_ambulance", {"ambulance_id": ambulance_id})
+
+                    return await replay(events, dispatch, release)
+    finally:
+        for path in (data_file, catchment_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def print_replay_report(mode, stats):
+    ops = len(stats["dispatch_ms"]) + len(stats["release_ms"])
+    mean_km = sum(stats["distances"]) / len(stats["distances"]) if stats["distances"] else 0.0
+    print(f"\n[{mode}] {len(stats['dispatch_ms'])} dispatches, {len(stats['release_ms'])} releases, "
+          f"{stats['failed']} failed, {stats['wall_s']:.2f}s wall")
+    print(f"  throughput: {ops / stats['wall_s']:.1f} ops/s" if stats["wall_s"] else "  throughput: n/a")
+    print(f"  mean dispatch distance: {mean_km:.2f} km")
+    print(f"  {'op':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for op in ("dispatch", "release"):
+        values = stats[f"{op}_ms"]
+        print(f"  {op:<10}" + "".join(
+            f"{percentile(values, p):>10.3f}" for p in (50, 95, 99, 100)
+        ))
+
+
+def run_replay(args):
+    fleet, source = load_fleet(args)
+    events = incident_stream(fleet, args.rate, args.duration, hotspots=args.hotspots,
+                             mission_mean_s=args.mission, seed=args.seed + 1)
+    print(f"Fleet: {source}, {sum(len(u['ambulances']) for u in fleet)} ambulances")
+    print(f"Stream: {len(events)} incidents at {args.rate}/s over {args.duration:.0f}s simulated")
+
+    modes = ["inproc", "stdio"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        runner = replay_in_process if mode == "inproc" else replay_stdio
+        stats = asyncio.run(runner(json.loads(json.dumps(fleet)), events))
+        print_replay_report(mode, stats)
+
+
+def run_batch_comparison(args):
+    agents_mcp = load_agents_mcp()
+    fleet = synthetic_fleet(args.stations, seed=args.seed)
+    incidents = hotspot_incidents(fleet, args.incidents, seed=args.seed + 1)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stderr(devnull):
+        install_fleet(agents_mcp, fleet)
+        start = time.perf_counter()
+        sequential = [agents_mcp.dispatch_nearest_ambulance(i["lat"], i["lon"]) for i in incidents]
+        sequential_s = time.perf_counter() - start
+
+        install_fleet(agents_mcp, synthetic_fleet(args.stations, seed=args.seed))
+        agents_mcp.get_assignment()  # keep the one-off numpy/scipy import out of the timing
+        start = time.perf_counter()
+        batch = agents_mcp.dispatch_batch(incidents)
+        batch_s = time.perf_counter() - start
+
+    sequential_km = sum(d.get("distance_km", 0) for d in sequential)
+    sequential_max = max((d.get("distance_km", 0) for d in sequential), default=0)
+    batch_max = max((d["distance_km"] for d in batch.get("dispatches", [])), default=0)
+
+    print(f"Fleet: {args.stations} stations, incidents: {len(incidents)}")
+    print(f"{'mode':<12}{'time (ms)':>12}{'total km':>12}{'max km':>10}")
+    print(f"{'sequential':<12}{sequential_s * 1000:>12.2f}{sequential_km:>12.2f}{sequential_max:>10.2f}")
+    print(f"{'batch':<12}{batch_s * 1000:>12.2f}{batch['total_distance_km']:>12.2f}{batch_max:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HealthLink360 dispatch benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    batch = sub.add_parser("batch", help="dispatch_batch vs sequential dispatches")
+    batch.add_argument("--stations", type=int, default=2000)
+    batch.add_argument("--incidents", type=int, default=40)
+    batch.add_argument("--seed", type=int, default=42)
+    batch.set_defaults(func=run_batch_comparison)
+
+    rep = sub.add_parser("replay", help="replay a synthetic incident stream")
+    rep.add_argument("--mode", choices=["inproc", "stdio", "both"], default="inproc")
+    rep.add_argument("--rate", type=float, default=5.0, help="incidents per simulated second")
+    rep.add_argument("--duration", type=float, default=120.0, help="simulated seconds")
+    rep.add_argument("--mission", type=float, default=600.0, help="mean mission time (s)")
+    rep.add_argument("--hotspots", type=int, default=5)
+    rep.add_argument("--stations", type=int, default=2000)
+    rep.add_argument("--synthetic", action="store_true", help="ignore hospitals_lhr.json")
+    rep.add_argument("--seed", type=int, default=42)
+    rep.set_defaults(func=run_replay)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,55 @@
 # local_trace.py
+"""
+Local trace log (NDJSON segments + time/tool index, see mcp_servers/trace_log.py)
+
+Query:
+    python scripts/local_trace.py --since 2025-01-01T10:00 --tool dispatch_nearest_ambulance
+    python scripts/local_trace.py --dir data/traces --name agents_mcp --last 300
+"""
+import argparse
 import json
+import os
+import sys
 import time
-from threading import Lock
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from mcp_servers.trace_log import TraceLog
+
+TRACE_DIR = os.getenv("TRACE_LOG_DIR", "local_traces")
+_writer = TraceLog(TRACE_DIR, name="local")
 
-TRACE_FILE = "local_traces.json"
-_lock = Lock()
 
 def append_trace(event: dict):
-    event.setdefault("timestamp", time.time())
-    with _lock:
-        try:
-            with open(TRACE_FILE, "a") as f:
-                f.write(json.dumps(event, indent=2) + ",\n")
-        except Exception:
-            # best-effort logging
-            pass
+    # Buffered append, fsync'd in batches; best-effort like before
+    _writer.append(event)
+
+
+def _parse_time(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the local trace log")
+    parser.add_argument("--dir", default=TRACE_DIR)
+    parser.add_argument("--name", default="local", help="log name (e.g. agents_mcp)")
+    parser.add_argument("--since", help="epoch seconds or ISO time")
+    parser.add_argument("--until", help="epoch seconds or ISO time")
+    parser.add_argument("--last", type=float, help="only the last N seconds")
+    parser.add_argument("--tool")
+    parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    since = time.time() - args.last if args.last else _parse_time(args.since)
+    log = TraceLog(args.dir, name=args.name)
+    for event in log.read(since=since, until=_parse_time(args.until), tool=args.tool, limit=args.limit):
+        print(json.dumps(event, default=str))
+
+
+if __name__ == "__main__":
+    main()
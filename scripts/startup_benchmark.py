@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# startup_benchmark.py - Cold-start time of the MCP tool servers against a budget
+"""
+MCPServerStdio respawns the tool servers often, so their startup is paid
+again and again. This spawns each server the way the agents do (python
+<script> over MCP stdio) and measures
+
+    spawn -> initialize answered -> tools/list answered (ready)
+
+over several runs, then prints the slowest imports of the last run (from
+the server's own MCP_STARTUP_PROFILE report, see mcp_servers/startup_profile.py).
+
+    python scripts/startup_benchmark.py
+    python scripts/startup_benchmark.py --servers agents_mcp rnd_mcp --runs 10 --budget-ms 800
+
+Exits 1 when a server's median ready time is over the budget. Servers run
+in a scratch working directory so the files they create stay out of the repo.
+"""
+
+import os
+import sys
+import json
+import time
+import math
+import asyncio
+import argparse
+import tempfile
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BASE_DIR)
+
+SERVERS = {
+    "agents_mcp": "mcp_servers/core_agents_mcp/agents_mcp.py",
+    "nih_mcp": "mcp_servers/nih_mcp/nih_mcp.py",
+    "rnd_mcp": "mcp_servers/rnd_mcp/rnd_mcp_tools.py",
+    "report_generation_mcp": "mcp_servers/report_generation_mcp/report_generation_mcp_tool.py",
+    "orchestrator_mcp": "mcp_servers/orchestrator_mcp/agent_orchestrator_mcp.py",
+}
+DEFAULT_BUDGET_MS = 1000.0
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+async def time_startup(script: str, workdir: str, profile_file: str) -> dict:
+    """One cold start: ms until initialize and until the first tools/list round-trip"""
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    server = StdioServerParameters(
+        command=sys.executable,
+        args=[os.path.join(BASE_DIR, script)],
+        env={**os.environ, "MCP_STARTUP_PROFILE": profile_file,
+             "ORCHESTRATOR_QUEUE_DB": os.path.join(workdir, "orchestrator_queue.db")},
+        cwd=workdir
+    )
+    with open(os.devnull, "w") as devnull:
+        started = time.perf_counter()
+        async with stdio_client(server, errlog=devnull) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                initialized = time.perf_counter()
+                tools = await session.list_tools()
+                ready = time.perf_counter()
+    return {
+        "initialize_ms": (initialized - started) * 1000,
+        "ready_ms": (ready - started) * 1000,
+        "tools": len(tools.tools)
+    }
+
+
+def run_server(name: str, script: str, runs: int, workdir: str) -> dict:
+    profile_file = os.path.join(workdir, f"{name}.profile.json")
+    samples = [asyncio.run(time_startup(script, workdir, profile_file)) for _ in range(runs)]
+    profile = None
+    if os.path.exists(profile_file):
+        with open(profile_file) as f:
+            profile = json.load(f)
+    return {"samples": samples, "profile": profile}
+
+
+def print_report(name, result, budget_ms, top):
+    ready = sorted(s["ready_ms"] for s in result["samples"])
+    init = sorted(s["initialize_ms"] for s in result["samples"])
+    p50 = percentile(ready, 50)
+    verdict = "OK  " if p50 <= budget_ms else "OVER"
+    print(f"{verdict} {name:<24}{percentile(init, 50):>10.0f}{p50:>10.0f}{ready[-1]:>10.0f}"
+          f"{result['samples'][-1]['tools']:>8}")
+    profile = result["profile"]
+    if top and profile:
+        print(f"       in-process: ready {profile['ready_s'] * 1000:.0f} ms after startup_profile import, "
+              f"{profile['modules']} modules")
+        for entry in profile["imports"][:top]:
+            print(f"       {entry['cumulative_s'] * 1000:8.1f} ms  (self {entry['self_s'] * 1000:6.1f})  {entry['module']}")
+    return p50 <= budget_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HealthLink360 MCP server startup benchmark")
+    parser.add_argument("--servers", nargs="+", choices=sorted(SERVERS), default=list(SERVERS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="max median spawn-to-ready time per server")
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to list per server (0 = none)")
+    args = parser.parse_args()
+
+    print(f"{args.runs} cold starts per server, budget {args.budget_ms:.0f} ms (median spawn -> tools/list)")
+    print(f"     {'server':<24}{'init p50':>10}{'ready p50':>10}{'max':>10}{'tools':>8}")
+    within_budget = True
+    with tempfile.TemporaryDirectory(prefix="mcp-startup-") as workdir:
+        for name in args.servers:
+            try:
+                result = run_server(name, SERVERS[name], args.runs, workdir)
+            except Exception as e:
+                print(f"FAIL {name:<24} {e}")
+                within_budget = False
+                continue
+            within_budget &= print_report(name, result, args.budget_ms, args.top)
+    sys.exit(0 if within_budget else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# transport_benchmark.py - Per-call overhead of stdio vs in-process MCP transport
+"""
+Calls the same cheap tool through three paths and reports per-call latency:
+
+    stdio       ClientSession -> JSON-RPC over a pipe -> server subprocess
+    inprocess   ClientSession -> memory streams -> the server's FastMCP in
+                this process (mcp_servers/inprocess.py, what
+                MCP_TRANSPORT=inprocess selects in mcp_pool)
+    direct      FastMCP.call_tool() with no session at all (the floor)
+
+Before timing it checks that stdio and inprocess agree: same tools/list
+(names, input and output schemas) and the same error result for a call
+with a missing argument and for an unknown tool.
+
+    python scripts/transport_benchmark.py
+    python scripts/transport_benchmark.py --servers agents_mcp orchestrator_mcp --calls 2000
+
+Exits 1 when the transports disagree. Both servers run in a scratch
+working directory so the files they create stay out of the repo.
+"""
+
+import os
+import sys
+import time
+import math
+import asyncio
+import argparse
+import tempfile
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BASE_DIR)
+
+# name -> (script, cheap tool, arguments)
+SERVERS = {
+    "agents_mcp": ("mcp_servers/core_agents_mcp/agents_mcp.py", "assess_stress_level",
+                   {"symptoms": "poor sleep", "duration_days": 5}),
+    "nih_mcp": ("mcp_servers/nih_mcp/nih_mcp.py", "list_nih_departments", {}),
+    "orchestrator_mcp": ("mcp_servers/orchestrator_mcp/agent_orchestrator_mcp.py", "query_agent_capabilities",
+                         {"agent_name": "tracking"}),
+}
+WARMUP = 20
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+async def time_calls(call, calls: int) -> list:
+    for _ in range(WARMUP):
+        await call()
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        await call()
+        samples.append((time.perf_counter() - started) * 1_000_000)
+    return sorted(samples)
+
+
+def tool_schemas(listed) -> dict:
+    return {t.name: (t.inputSchema, t.outputSchema) for t in listed.tools}
+
+
+def error_text(result) -> tuple:
+    return result.isError, [getattr(c, "text", None) for c in result.content]
+
+
+async def probe(session) -> dict:
+    """What parity compares: tools/list and two error results"""
+    listed = await session.list_tools()
+    strict = next(t.name for t in listed.tools if t.inputSchema.get("required"))
+    return {
+        "tools": tool_schemas(listed),
+        "missing_argument": error_text(await session.call_tool(strict, {})),
+        "unknown_tool": error_text(await session.call_tool("no_such_tool", {})),
+    }
+
+
+async def bench_server(name: str, calls: int, workdir: str) -> bool:
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+    from mcp_servers.inprocess import load_server, memory_transport
+
+    script, tool, arguments = SERVERS[name]
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=[os.path.join(BASE_DIR, script)],
+        env={**os.environ, "ORCHESTRATOR_QUEUE_DB": os.path.join(workdir, f"{name}-stdio.db")},
+        cwd=workdir
+    )
+    os.environ["ORCHESTRATOR_QUEUE_DB"] = os.path.join(workdir, f"{name}-inprocess.db")
+    server = load_server(script)
+
+    results = {}
+    with open(os.devnull, "w") as devnull:
+        async with stdio_client(params, errlog=devnull) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                stdio_probe = await probe(session)
+                results["stdio"] = await time_calls(lambda: session.call_tool(tool, arguments), calls)
+
+    async with memory_transport(server) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            inprocess_probe = await probe(session)
+            results["inprocess"] = await time_calls(lambda: session.call_tool(tool, arguments), calls)
+
+    results["direct"] = await time_calls(lambda: server.call_tool(tool, arguments), calls)
+
+    same = stdio_probe == inprocess_probe
+    print(f"\n{name}: {tool}({', '.join(arguments)}) x {calls}, "
+          f"{len(stdio_probe['tools'])} tools, parity {'OK' if same else 'MISMATCH'}")
+    if not same:
+        for key in stdio_probe:
+            if stdio_probe[key] != inprocess_probe[key]:
+                print(f"   {key} differs")
+    print(f"   {'transport':<12}{'p50 us':>10}{'p99 us':>10}{'mean us':>10}")
+    for transport, samples in results.items():
+        print(f"   {transport:<12}{percentile(samples, 50):>10.0f}{percentile(samples, 99):>10.0f}"
+              f"{sum(samples) / len(samples):>10.0f}")
+    saved = percentile(results["stdio"], 50) - percentile(results["inprocess"], 50)
+    print(f"   inprocess saves {saved:.0f} us per call at p50 "
+          f"({percentile(results['stdio'], 50) / max(percentile(results['inprocess'], 50), 1e-9):.1f}x)")
+    return same
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HealthLink360 MCP transport benchmark")
+    parser.add_argument("--servers", nargs="+", choices=sorted(SERVERS), default=["agents_mcp"])
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args()
+
+    consistent = True
+    with tempfile.TemporaryDirectory(prefix="mcp-transport-") as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for name in args.servers:
+                consistent &= asyncio.run(bench_server(name, args.calls, workdir))
+        finally:
+            os.chdir(cwd)
+    sys.exit(0 if consistent else 1)
+
+
+if __name__ == "__main__":
+    main()